@@ -0,0 +1,216 @@
+import sys
+import os
+import glob
+import json
+import time
+import queue
+import argparse
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from kraken_engine import KrakenEngine, default_line_workers
+from kraken_cache import ResultCache, CachedEngine, DEFAULT_CACHE_SIZE_BYTES
+from kraken_trace import tracer
+from kraken_document import expand_pages, page_label, page_stem
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+DOCUMENT_EXTENSIONS = IMAGE_EXTENSIONS + ('.pdf',) # ملفات TIFF و PDF قد تحوي عدة صفحات
+
+# ===================================================================================
+# Shared Helpers
+# ===================================================================================
+def error_summary(error):
+    """آخر سطر غير فارغ من رسالة الخطأ هو عادة السبب الفعلي الذي طبعه kraken."""
+    error_lines = [line for line in str(error).splitlines() if line.strip()]
+    return error_lines[-1] if error_lines else type(error).__name__
+
+def collect_images(source):
+    """يعيد قائمة مرتبة بملفات الصور والمستندات (PDF) من مجلد أو من نمط glob (مثل 'codex/*.tif')."""
+    if os.path.isdir(source):
+        candidates = [os.path.join(source, name) for name in os.listdir(source)]
+    else:
+        candidates = glob.glob(source, recursive=True)
+    return sorted(path for path in candidates
+                  if os.path.isfile(path) and path.lower().endswith(DOCUMENT_EXTENSIONS))
+
+# ===================================================================================
+# Engine Pool
+# ===================================================================================
+class EnginePool:
+    """
+    مجموعة من محركات kraken المقيمة يتشاركها عدة خيوط: كل خيط يستعير محركًا خاملاً ثم يعيده،
+    فيبقى كل محرك بنماذجه المحمّلة طوال عمر المجموعة. تُشغل العمليات عند أول استعارة فقط.
+    الأنوية تُقسم بين المحركات، فيتعرف كل محرك على أسطر صفحته بخيوط بقدر نصيبه منها.
+    """
+
+    def __init__(self, size, kraken_dir="", cache=None, line_workers=None):
+        size = max(1, size)
+        line_workers = line_workers or default_line_workers(size)
+        self.engines = [KrakenEngine(kraken_dir, line_workers=line_workers) for _ in range(size)]
+        if cache is not None:
+            self.engines = [CachedEngine(engine, cache) for engine in self.engines]
+        self.idle_engines = queue.Queue()
+        for engine in self.engines:
+            self.idle_engines.put(engine)
+
+    @contextlib.contextmanager
+    def engine(self):
+        engine = self.idle_engines.get()
+        try:
+            yield engine
+        finally:
+            self.idle_engines.put(engine)
+
+    def warm_up(self, model_name=None):
+        """يحمّل النماذج في كل المحركات بالتوازي حتى لا يدفع أول طلب ثمن التحميل."""
+        with ThreadPoolExecutor(max_workers=len(self.engines)) as executor:
+            list(executor.map(lambda engine: engine.warm_up(model_name), self.engines))
+
+    def close(self):
+        for engine in self.engines:
+            engine.close()
+
+# ===================================================================================
+# Batch Processing
+# ===================================================================================
+def process_page(engine, image_path, output_dir, model_name, page=None, overlay_renderer=None, exporter=None):
+    """
+    يجزئ صفحة واحدة ثم يتعرف على نصها، ويكتب <اسم الصفحة>.json و <اسم الصفحة>.txt في مجلد الإخراج.
+    لصفحات المستندات متعددة الصفحات يصبح الاسم <اسم الملف>_p0001.
+    عند تمرير overlay_renderer تُحفظ أيضًا صورة مصغرة بطبقات التجزئة <اسم الصفحة>.overlay.jpg للمراجعة.
+    عند تمرير exporter (ExportWriter) تُضاف الصفحة إلى التصدير المنظم (ALTO، PAGE XML، hOCR، JSONL) من نفس النتيجة.
+    """
+    stem = page_stem(image_path, page)
+    json_path = os.path.join(output_dir, f"{stem}.json")
+    text_path = os.path.join(output_dir, f"{stem}.txt")
+
+    result = engine.segment_and_recognize(image_path, model_name, page=page)
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(result['segmentation'], f, ensure_ascii=False)
+    with open(text_path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(line['text'] for line in result['lines']))
+    if overlay_renderer is not None:
+        from kraken_overlay import render_thumbnail
+        render_thumbnail(image_path, result['segmentation'], os.path.join(output_dir, f"{stem}.overlay.jpg"),
+                         page=page, renderer=overlay_renderer)
+    if exporter is not None:
+        from kraken_export import page_record
+        exporter.write(page_record(image_path, page, result['segmentation'], result['lines']))
+
+    return text_path
+
+def run_batch(progress_callback, image_paths, output_dir, model_name, workers, kraken_dir="", cache=None,
+              thumbnails=False, cancel_event=None, exports=(), export_target=None):
+    """
+    يوزع الصفحات على مجموعة من محركات kraken المقيمة (عملية مستقلة لكل عامل تحمّل النماذج مرة واحدة)
+    ويرسل سطر حالة لكل صفحة عند انتهائها مع معدل الصفحات في الثانية.
+    إذا مُررت ذاكرة مؤقتة (ResultCache) تُخدم الصفحات المعالجة سابقًا منها دون تشغيل kraken.
+    thumbnails يحفظ صورة مصغرة بطبقات التجزئة لكل صفحة (مُرسِم واحد لكل خيط يعيد استخدام مخازنه).
+    exports: صيغ التصدير المنظم، تُكتب إلى export_target (مجلد أو أرشيف zip/tar، افتراضيًا مجلد الإخراج).
+    عند ضبط cancel_event تُلغى الصفحات التي لم تبدأ وتكتمل الصفحات الجارية فقط.
+    ملفات TIFF/PDF متعددة الصفحات تُقسم إلى صفحات تُعالج كل منها على حدة، فلا يُفك المستند كاملاً أبدًا.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    unreadable = []
+    pages = expand_pages(image_paths, on_error=lambda path, error: unreadable.append((path, error)))
+    total = len(pages) + len(unreadable)
+    workers = max(1, min(workers, len(pages)))
+    failed = []
+    done = 0
+    start_time = time.perf_counter()
+
+    def report(image_path, page, status):
+        rate = done / max(time.perf_counter() - start_time, 1e-9)
+        progress_callback(f"[{done}/{total}] {page_label(image_path, page)}: {status} — {rate:.2f} صفحة/ث")
+
+    # الملف التالف (TIFF لا تُقرأ رؤوسه، أو PDF دون pypdfium2) يُعد صفحة فاشلة ولا يوقف الدفعة
+    for image_path, error in unreadable:
+        done += 1
+        failed.append(image_path)
+        report(image_path, None, f"فشل: {error_summary(error)}")
+
+    pool = EnginePool(workers, kraken_dir, cache)
+    exporter = None
+    if exports:
+        from kraken_export import ExportWriter # xml.sax يُحمّل عند طلب التصدير فقط
+        exporter = ExportWriter(export_target or output_dir, exports)
+    renderers = threading.local()
+    if thumbnails:
+        from kraken_overlay import OverlayRenderer # numpy و Pillow لا يُحمّلان إلا عند طلب الصور المصغرة
+
+    def process_with_idle_engine(image_path, page):
+        renderer = None
+        if thumbnails:
+            if not hasattr(renderers, 'renderer'):
+                renderers.renderer = OverlayRenderer()
+            renderer = renderers.renderer
+        with pool.engine() as engine:
+            return process_page(engine, image_path, output_dir, model_name, page, renderer, exporter)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(process_with_idle_engine, path, page): (path, page) for path, page in pages}
+            for future in as_completed(futures):
+                image_path, page = futures[future]
+                done += 1
+                try:
+                    future.result()
+                    status = "تم"
+                except Exception as e:
+                    failed.append(image_path if page is None else f"{image_path}#{page + 1}")
+                    status = f"فشل: {error_summary(e)}"
+                report(image_path, page, status)
+                if cancel_event is not None and cancel_event.is_set():
+                    for pending in futures:
+                        pending.cancel()
+                    break
+    finally:
+        pool.close()
+        if exporter is not None:
+            exporter.close()
+
+    elapsed = time.perf_counter() - start_time
+    return {
+        'total': total,
+        'done': done,
+        'failed': failed,
+        'elapsed': elapsed,
+        'pages_per_second': done / elapsed if elapsed > 0 else 0.0,
+    }
+
+# ===================================================================================
+# Headless Entry Point
+# ===================================================================================
+def main(argv=None):
+    from kraken_export import EXPORT_FORMATS
+    parser = argparse.ArgumentParser(description="Run Kraken segmentation + OCR over a folder of page images (multi-page TIFF/PDF are split into pages).")
+    parser.add_argument("source", help="Directory of page images/documents or a glob pattern (e.g. 'codex/*.tif').")
+    parser.add_argument("-o", "--output-dir", required=True, help="Directory for per-page .json and .txt output.")
+    parser.add_argument("-m", "--model", default="arabic_best.mlmodel", help="Recognition model.")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="Number of resident kraken engine processes.")
+    parser.add_argument("--kraken-path", default="", help="Directory containing the kraken executable.")
+    parser.add_argument("--cache-dir", default=None, help="Result cache directory (default: per-user cache directory).")
+    parser.add_argument("--cache-size-mb", type=int, default=DEFAULT_CACHE_SIZE_BYTES // (1024 * 1024), help="Result cache size cap in MB.")
+    parser.add_argument("--no-cache", action="store_true", help="Always re-run segmentation and recognition.")
+    parser.add_argument("--thumbnails", action="store_true", help="Also write <page>.overlay.jpg with baselines, line boundaries and regions drawn.")
+    parser.add_argument("--export", action="append", default=[], choices=EXPORT_FORMATS, help="Also export each page as ALTO, PAGE XML, hOCR or JSON lines (repeatable).")
+    parser.add_argument("--export-to", default=None, help="Export directory or .zip/.tar/.tar.gz archive (default: the output directory).")
+    args = parser.parse_args(argv)
+    tracer.enable_from_environment()
+
+    image_paths = collect_images(args.source)
+    if not image_paths:
+        print(f"No images found in: {args.source}", file=sys.stderr)
+        return 2
+
+    cache = None if args.no_cache else ResultCache(args.cache_dir, args.cache_size_mb * 1024 * 1024)
+    summary = run_batch(lambda line: print(line, flush=True), image_paths, args.output_dir,
+                        args.model, args.workers, args.kraken_path, cache, args.thumbnails,
+                        exports=args.export, export_target=args.export_to)
+    print(f"Processed {summary['total']} pages in {summary['elapsed']:.1f}s "
+          f"({summary['pages_per_second']:.2f} pages/sec), {len(summary['failed'])} failed.")
+    return 1 if summary['failed'] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,322 @@
+import sys
+import os
+import json
+import math
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+from PIL import Image, ImageDraw
+
+from kraken_engine import KrakenEngine, default_line_workers, installed_kraken_version
+from kraken_preview import build_preview
+from kraken_overlay import OverlayRenderer, LAYERS
+from kraken_training import collect_training_pairs, dataset_key
+
+ENGINE_STAGES = ('segment', 'recognize', 'segment_and_recognize')
+LOCAL_STAGES = ('preview', 'overlay_render', 'training_pairs')
+GUI_STAGES = ('startup', 'display', 'overlay', 'training_pairs_display')
+ALL_STAGES = LOCAL_STAGES + ENGINE_STAGES + GUI_STAGES
+
+DEFAULT_PAGE_SIZE = (2480, 3508) # A4 بدقة 300 نقطة/بوصة
+DEFAULT_LINE_IMAGES = 500
+STARTUP_RUNS = 5
+
+# يقيس في عملية جديدة الزمن من بداية الاستيراد حتى أول رسم للنافذة (بدون زمن تشغيل المفسر نفسه)
+STARTUP_SCRIPT = """
+import os, time
+start = time.perf_counter()
+from PySide6.QtWidgets import QApplication
+import kraken_gui
+app = QApplication([])
+window = kraken_gui.KrakenPySideApp()
+window.show()
+app.processEvents()
+print(time.perf_counter() - start, flush=True)
+os._exit(0)
+"""
+
+# ===================================================================================
+# Synthetic Page Set
+# ===================================================================================
+def synthetic_page(path, seed, size=DEFAULT_PAGE_SIZE):
+    """
+    يرسم صفحة ثابتة المحتوى (نفس البذرة = نفس الصفحة) تشبه مخطوطة: أسطر من "كلمات" داكنة على خلفية فاتحة.
+    يعيد تجزئة مرجعية بنفس بنية نتيجة kraken حتى تعمل مراحل الرسم دون kraken.
+    """
+    rng = random.Random(seed)
+    width, height = size
+    image = Image.new('L', size, 235)
+    draw = ImageDraw.Draw(image)
+    margin = width // 12
+    line_height = max(24, height // 40)
+    lines = []
+    for top in range(margin, height - margin - line_height, int(line_height * 1.6)):
+        x = width - margin # من اليمين إلى اليسار كالنص العربي
+        while x > margin + line_height:
+            word = rng.randint(line_height, line_height * 5)
+            draw.rectangle((x - word, top + line_height // 4, x, top + line_height), fill=rng.randint(10, 70))
+            x -= word + rng.randint(line_height // 3, line_height)
+        baseline_y = top + line_height
+        lines.append({'baseline': [[width - margin, baseline_y], [x, baseline_y]],
+                      'boundary': [[width - margin, top], [x, top], [x, baseline_y + 4], [width - margin, baseline_y + 4]]})
+    image.save(path)
+    return {'type': 'baselines', 'text_direction': 'horizontal-rl', 'lines': lines}
+
+def make_page_set(directory, count, size=DEFAULT_PAGE_SIZE):
+    pages = []
+    for index in range(count):
+        path = os.path.join(directory, f"page_{index:03d}.png")
+        pages.append((path, synthetic_page(path, index, size)))
+    return pages
+
+def make_line_images(directory, count):
+    """صور أسطر صغيرة مع ملفات .gt.txt لقياس تحميل أزواج التدريب."""
+    os.makedirs(directory, exist_ok=True)
+    for index in range(count):
+        stem = os.path.join(directory, f"line_{index:05d}")
+        synthetic_page(f"{stem}.png", 100000 + index, (1200, 64))
+        with open(f"{stem}.gt.txt", 'w', encoding='utf-8') as f:
+            f.write(f"سطر {index}")
+    return os.path.join(directory, "*.png")
+
+# ===================================================================================
+# Measurement
+# ===================================================================================
+def peak_rss_bytes():
+    """أعلى استهلاك ذاكرة (RSS) للعملية الحالية ولعملياتها الفرعية المنتهية، أو None إن تعذر القياس."""
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset, None
+        except (ImportError, AttributeError):
+            return None, None
+    unit = 1 if sys.platform == "darwin" else 1024 # ru_maxrss بالبايت على macOS وبالكيلوبايت على Linux
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit)
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+def _growth(after, before):
+    return None if after is None or before is None else after - before
+
+def summarize(durations, wall_seconds, rss_before=(None, None)):
+    """
+    ملخص أزمنة المرحلة؛ قيم الأزمنة None إذا لم تُقس أي عناصر. ru_maxrss ذروة تراكمية منذ بدء العملية،
+    فتُسجل كذروة العملية حتى نهاية المرحلة (process_peak_rss_bytes) ومعها ما رفعته هذه المرحلة منها
+    مقارنة بالقياس rss_before قبلها (peak_rss_growth_bytes).
+    """
+    ordered = sorted(durations)
+    self_rss, children_rss = peak_rss_bytes()
+    return {
+        'items': len(durations),
+        'wall_seconds': wall_seconds,
+        'first_seconds': durations[0] if durations else None, # يشمل تشغيل العمليات وتحميل النماذج في مراحل المحرك
+        'mean_seconds': sum(durations) / len(durations) if durations else None,
+        'p50_seconds': _percentile(ordered, 0.50) if durations else None,
+        'p95_seconds': _percentile(ordered, 0.95) if durations else None,
+        'items_per_second': len(durations) / wall_seconds if wall_seconds > 0 else 0.0,
+        'process_peak_rss_bytes': self_rss,
+        'children_process_peak_rss_bytes': children_rss,
+        'peak_rss_growth_bytes': _growth(self_rss, rss_before[0]),
+        'children_peak_rss_growth_bytes': _growth(children_rss, rss_before[1]),
+    }
+
+def measure(items, function):
+    """يطبق function على كل عنصر ويعيد (ملخص الأزمنة، النتائج)."""
+    results, durations = [], []
+    rss_before = peak_rss_bytes()
+    start = time.perf_counter()
+    for item in items:
+        item_start = time.perf_counter()
+        results.append(function(item))
+        durations.append(time.perf_counter() - item_start)
+    return summarize(durations, time.perf_counter() - start, rss_before), results
+
+# ===================================================================================
+# Stages
+# ===================================================================================
+def _engine_stages(report, pages, stages, model_name, kraken_dir):
+    engine = KrakenEngine(kraken_dir, line_workers=default_line_workers())
+    try:
+        segmentations = None
+        if 'segment' in stages or 'recognize' in stages:
+            report['segment'], segmentations = measure(pages, lambda page: engine.segment(page[0]))
+        if 'recognize' in stages:
+            report['recognize'], _ = measure(list(zip(pages, segmentations)),
+                                             lambda item: engine.recognize(item[0][0], item[1], model_name))
+        if 'segment_and_recognize' in stages:
+            # محرك جديد حتى يشمل زمن الصفحة الأولى التشغيل وتحميل النماذج كما في الواجهة
+            engine.close()
+            report['segment_and_recognize'], _ = measure(
+                pages, lambda page: engine.segment_and_recognize(page[0], model_name))
+    finally:
+        engine.close()
+
+def _startup_seconds():
+    completed = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT], capture_output=True, text=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    if completed.returncode != 0:
+        raise ImportError(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "startup failed")
+    return float(completed.stdout.strip().splitlines()[-1])
+
+def _gui_stages(report, pages, stages, training_pairs):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    if 'startup' in stages:
+        rss_before = peak_rss_bytes()
+        durations = [_startup_seconds() for _ in range(STARTUP_RUNS)]
+        report['startup'] = summarize(durations, sum(durations), rss_before)
+
+    from PySide6.QtWidgets import QApplication
+    import kraken_gui
+
+    app = QApplication.instance() or QApplication([])
+    window = kraken_gui.KrakenPySideApp()
+    window.resize(1400, 900)
+    window.show()
+    app.processEvents()
+    previews = [build_preview(path) for path, _ in pages]
+
+    if 'display' in stages:
+        report['display'], _ = measure(previews, lambda preview: window.display_image(
+            window.ocr_original_image_label, preview.proxy))
+
+    if 'overlay' in stages:
+        def draw_overlay(item):
+            preview, (_, segmentation) = item
+            # نفس مسار الواجهة: تحليل JSON للتجزئة ثم رسم الخطوط الأساسية وإبراز سطر
+            window.segmentation_data_ocr = json.loads(json.dumps(segmentation))
+            window.preview_ocr = preview
+            window.show_segmentation_overlay(highlight_index=0)
+        report['overlay'], _ = measure(list(zip(previews, pages)), draw_overlay)
+
+    if 'training_pairs_display' in stages:
+        window.ensure_tab(window.training_tab)
+
+        def show_pairs(pairs):
+            window.training_pairs_model.clear()
+            window.training_pairs_model.add_pairs(pairs)
+            window.update_training_pairs_count()
+            app.processEvents()
+        report['training_pairs_display'], _ = measure([training_pairs], show_pairs)
+
+    window.close()
+
+def run_benchmarks(pages, stages, model_name="", kraken_dir="", line_images_glob=None):
+    report = {}
+    stages = set(stages)
+
+    if 'preview' in stages:
+        report['preview'], _ = measure(pages, lambda page: build_preview(page[0]))
+
+    if 'overlay_render' in stages:
+        # كل الطبقات على صورة بحجم العرض، بمُرسِم واحد لكل الصفحات كما في الدفعات
+        renderer = OverlayRenderer()
+        previews = [build_preview(path) for path, _ in pages]
+        report['overlay_render'], _ = measure(list(zip(previews, pages)), lambda item: renderer.render(
+            item[0].proxy, item[1][1], item[0].original_size[0], layers=LAYERS))
+
+    training_pairs = collect_training_pairs(line_images_glob) if line_images_glob else []
+    if 'training_pairs' in stages and training_pairs:
+        kraken_version = installed_kraken_version(kraken_dir)
+        report['training_pairs'], _ = measure(
+            [line_images_glob], lambda source: dataset_key(collect_training_pairs(source), kraken_version))
+
+    if stages & set(ENGINE_STAGES):
+        try:
+            _engine_stages(report, pages, stages, model_name, kraken_dir)
+        except Exception as e:
+            report['engine_error'] = str(e).splitlines()[0] if str(e) else type(e).__name__
+
+    if stages & set(GUI_STAGES):
+        try:
+            _gui_stages(report, pages, stages, training_pairs)
+        except ImportError as e:
+            report['gui_error'] = str(e)
+
+    return report
+
+# ===================================================================================
+# Regression Check
+# ===================================================================================
+def compare(report, baseline, threshold=0.10, metric='p50_seconds'):
+    """المراحل التي زاد زمنها (metric) عن خط الأساس بأكثر من threshold (0.10 = 10%)."""
+    regressions = []
+    for stage, result in report['stages'].items():
+        previous = baseline.get('stages', {}).get(stage)
+        if (not isinstance(result, dict) or not isinstance(previous, dict) or not previous.get(metric)
+                or result.get(metric) is None):
+            continue
+        change = result[metric] / previous[metric] - 1
+        if change > threshold:
+            regressions.append({'stage': stage, 'metric': metric, 'baseline': previous[metric],
+                                'current': result[metric], 'change': change})
+    return regressions
+
+# ===================================================================================
+# Entry Point
+# ===================================================================================
+def _parse_size(value):
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Kraken GUI pipeline on a fixed synthetic page set and print JSON.")
+    parser.add_argument("--pages", type=int, default=10, help="Number of synthetic pages.")
+    parser.add_argument("--page-size", type=_parse_size, default=DEFAULT_PAGE_SIZE, help="Page size as WIDTHxHEIGHT pixels.")
+    parser.add_argument("--line-images", type=int, default=DEFAULT_LINE_IMAGES, help="Number of synthetic training line images.")
+    parser.add_argument("--stages", nargs="+", choices=ALL_STAGES, default=list(ALL_STAGES), help="Stages to run.")
+    parser.add_argument("-m", "--model", default="arabic_best.mlmodel", help="Recognition model for the engine stages.")
+    parser.add_argument("--kraken-path", default="", help="Directory containing the kraken environment's python.")
+    parser.add_argument("-o", "--output", default=None, help="Write the JSON report here instead of stdout.")
+    parser.add_argument("--baseline", default=None, help="Earlier JSON report to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed p50 slowdown vs. the baseline (0.10 = 10%%).")
+    parser.add_argument("--keep-pages", default=None, help="Write the synthetic page set to this directory and keep it.")
+    args = parser.parse_args(argv)
+
+    work_dir = args.keep_pages or tempfile.mkdtemp(prefix="kraken_benchmark_")
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        pages = make_page_set(work_dir, args.pages, args.page_size)
+        line_images_glob = None
+        if 'training_pairs' in args.stages or 'training_pairs_display' in args.stages:
+            line_images_glob = make_line_images(os.path.join(work_dir, "lines"), args.line_images)
+        stages = run_benchmarks(pages, args.stages, args.model, args.kraken_path, line_images_glob)
+    finally:
+        if not args.keep_pages:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'kraken': installed_kraken_version(args.kraken_path),
+        'model': args.model,
+        'pages': args.pages,
+        'page_size': list(args.page_size),
+        'line_images': args.line_images,
+        'stages': stages,
+    }
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            report['regressions'] = compare(report, json.load(f), args.threshold)
+        exit_code = 1 if report['regressions'] else 0
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+    return exit_code
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+import sys
+import os
+import json
+import hashlib
+import threading
+import tempfile
+from collections import OrderedDict
+
+from kraken_engine import installed_kraken_version, resolve_model_path
+
+DEFAULT_CACHE_SIZE_BYTES = 1024 * 1024 * 1024 # 1 GB
+CACHE_LOW_WATER_FRACTION = 0.8 # الإزالة تنزل بالحجم إلى هذه النسبة من الحد حتى لا يُفحص المجلد مع كل كتابة
+FILE_HASH_MEMO_SIZE = 4096 # بصمات الملفات المحفوظة في الذاكرة (الخدمة ترى مسارًا مؤقتًا جديدًا لكل طلب)
+
+def default_cache_dir():
+    """مجلد الذاكرة المؤقتة للمستخدم (لا نستخدم مجلد التطبيق لأنه مؤقت داخل ملف exe المجمع)."""
+    if sys.platform == "win32":
+        root = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    elif sys.platform == "darwin":
+        root = os.path.expanduser("~/Library/Caches")
+    else:
+        root = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(root, "kraken_gui")
+
+# ===================================================================================
+# Content Hashing
+# ===================================================================================
+_file_hash_memo = OrderedDict() # LRU: آخر بصمة مستخدمة في النهاية
+_file_hash_lock = threading.Lock()
+
+def file_hash(path):
+    """
+    بصمة sha256 لمحتوى الملف. تُحفظ النتيجة حسب (المسار، الحجم، وقت التعديل)
+    حتى لا يُعاد قراءة ملف صورة أو نموذج كبير عند كل طلب.
+    """
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _file_hash_lock:
+        if memo_key in _file_hash_memo:
+            _file_hash_memo.move_to_end(memo_key)
+            return _file_hash_memo[memo_key]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+
+    content_hash = digest.hexdigest()
+    with _file_hash_lock:
+        _file_hash_memo[memo_key] = content_hash
+        while len(_file_hash_memo) > FILE_HASH_MEMO_SIZE:
+            _file_hash_memo.popitem(last=False)
+    return content_hash
+
+def data_hash(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+# ===================================================================================
+# On-Disk LRU Cache
+# ===================================================================================
+class ResultCache:
+    """
+    ذاكرة مؤقتة على القرص مفهرسة بالمحتوى: ملف JSON لكل مفتاح، مع حد أقصى للحجم
+    وإزالة الأقدم استخدامًا (LRU) حسب وقت آخر وصول.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_CACHE_SIZE_BYTES):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.total_bytes = None # يُحسب عند أول كتابة حتى لا يبطئ فحص المجلد بدء التطبيق
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _entries(self):
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, stat.st_mtime, stat.st_size
+
+    def get(self, key):
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+            os.utime(path) # تحديث وقت آخر استخدام لسياسة LRU
+            return value
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, value):
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # الكتابة في ملف مؤقت ثم استبداله حتى لا يقرأ عامل آخر ملفًا نصف مكتوب
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(value, f, ensure_ascii=False)
+        size = os.path.getsize(temp_path)
+
+        with self.lock:
+            if self.total_bytes is None:
+                self.total_bytes = sum(entry_size for _, _, entry_size in self._entries())
+            if os.path.exists(path):
+                self.total_bytes -= os.path.getsize(path)
+            os.replace(temp_path, path)
+            self.total_bytes += size
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """يزيل الأقدم استخدامًا حتى ينزل الحجم إلى CACHE_LOW_WATER_FRACTION من الحد، فتتسع الكتابات التالية دون فحص."""
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        self.total_bytes = sum(size for _, _, size in entries)
+        low_water = self.max_bytes * CACHE_LOW_WATER_FRACTION
+        for path, _, size in entries:
+            if self.total_bytes <= low_water:
+                break
+            try:
+                os.remove(path)
+                self.total_bytes -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        with self.lock:
+            for path, _, _ in list(self._entries()):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self.total_bytes = 0
+
+# ===================================================================================
+# Cached Engine
+# ===================================================================================
+class CachedEngine:
+    """
+    يغلف KrakenEngine بنفس الواجهة ويخدم التجزئة والتعرف من الذاكرة المؤقتة عند الإمكان.
+    مفتاح التجزئة: بصمة الصورة + إصدار kraken (الذي يحدد نموذج التجزئة الافتراضي).
+    مفتاح التعرف: بصمة الصورة + بصمة ملف النموذج + بصمة أسطر التجزئة المستخدمة + إصدار kraken
+    (تغير kraken قد يغير قص الأسطر أو فك الترميز، فلا تُخدم نتائج الإصدار السابق بعد الترقية).
+    """
+
+    def __init__(self, engine, cache):
+        self.engine = engine
+        self.cache = cache
+        self.kraken_dir = engine.kraken_dir
+        self.kraken_version = installed_kraken_version(engine.kraken_dir)
+
+    @staticmethod
+    def _image_identity(image_path, page):
+        # صفحات المستند الواحد تتشارك بصمة الملف، فيُضاف رقم الصفحة (الصور المفردة تبقى مفاتيحها كما هي)
+        content_hash = file_hash(image_path)
+        return content_hash if page is None else f"{content_hash}#{page}"
+
+    def _segmentation_key(self, image_path, page=None):
+        return data_hash({'stage': 'segment', 'image': self._image_identity(image_path, page),
+                          'model': 'blla-default', 'kraken': self.kraken_version})
+
+    def _recognition_key(self, image_path, segmentation, model_name, page=None):
+        model_path = resolve_model_path(model_name)
+        if model_path is None:
+            return None # لا يمكن تحديد هوية النموذج، فلا نخاطر بإعادة نتيجة نموذج آخر
+        return data_hash({'stage': 'recognize', 'image': self._image_identity(image_path, page),
+                          'model': file_hash(model_path),
+                          'lines': data_hash(segmentation.get('lines', [])), 'kraken': self.kraken_version})
+
+    def segment(self, image_path, page=None):
+        key = self._segmentation_key(image_path, page)
+        segmentation = self.cache.get(key)
+        if segmentation is None:
+            segmentation = self.engine.segment(image_path, page)
+            self.cache.put(key, segmentation)
+        return segmentation
+
+    def recognize(self, image_path, segmentation, model_name, on_event=None, page=None):
+        key = self._recognition_key(image_path, segmentation, model_name, page)
+        lines = self.cache.get(key) if key else None
+        if lines is None:
+            lines = self.engine.recognize(image_path, segmentation, model_name, on_event, page)
+            if key:
+                self.cache.put(key, lines)
+        elif on_event is not None:
+            # إعادة بث الأحداث حتى تعامل الواجهة النتيجة المحفوظة كأي نتيجة متدفقة
+            for index, line in enumerate(lines):
+                on_event({'event': 'line', 'index': index, 'total': len(lines), 'line': line})
+        return lines
+
+    def segment_and_recognize(self, image_path, model_name, on_event=None, page=None):
+        segmentation_key = self._segmentation_key(image_path, page)
+        segmentation = self.cache.get(segmentation_key)
+        if segmentation is not None:
+            if on_event is not None:
+                on_event({'event': 'segmentation', 'segmentation': segmentation})
+            return {'segmentation': segmentation,
+                    'lines': self.recognize(image_path, segmentation, model_name, on_event, page)}
+
+        result = self.engine.segment_and_recognize(image_path, model_name, on_event, page)
+        self.cache.put(segmentation_key, result['segmentation'])
+        recognition_key = self._recognition_key(image_path, result['segmentation'], model_name, page)
+        if recognition_key:
+            self.cache.put(recognition_key, result['lines'])
+        return result
+
+    def compare_models(self, image_path, segmentation, model_names, on_event=None, page=None):
+        """النماذج التي لها نتيجة محفوظة لهذه الأسطر تُخدم من الذاكرة، والباقي يُرسل إلى المحرك في طلب واحد."""
+        results, missing = {}, []
+        for model_name in model_names:
+            key = self._recognition_key(image_path, segmentation, model_name, page)
+            lines = self.cache.get(key) if key else None
+            if lines is None:
+                missing.append(model_name)
+                continue
+            results[model_name] = lines
+            if on_event is not None:
+                on_event({'event': 'model', 'model_name': model_name, 'lines': lines})
+        if missing:
+            computed = self.engine.compare_models(image_path, segmentation, missing, on_event, page)
+            for model_name, lines in computed.items():
+                key = self._recognition_key(image_path, segmentation, model_name, page)
+                if key:
+                    self.cache.put(key, lines)
+            results.update(computed)
+        return {model_name: results[model_name] for model_name in model_names}
+
+    def warm_up(self, model_name=None):
+        return self.engine.warm_up(model_name)
+
+    def preload_models(self, model_names):
+        return self.engine.preload_models(model_names)
+
+    def describe_model(self, model_name):
+        return self.engine.describe_model(model_name)
+
+    def close(self):
+        self.engine.close()
@@ -0,0 +1,208 @@
+import sys
+import os
+import json
+import argparse
+import importlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import kraken_training
+from kraken_batch import EnginePool, collect_images, error_summary, DOCUMENT_EXTENSIONS
+from kraken_cache import ResultCache, DEFAULT_CACHE_SIZE_BYTES
+from kraken_document import expand_pages, page_label
+from kraken_trace import tracer
+
+# أوامر لها واجهة سطر أوامر كاملة في وحدتها، تُمرر معاملاتها كما هي.
+# الوحدات تُستورد عند تشغيل الأمر فقط، فلا يدفع 'ocr' أو 'segment' ثمن numpy و Pillow (benchmark) وغيرها.
+DELEGATED_COMMANDS = {
+    'batch': 'kraken_batch',
+    'sweep': 'kraken_sweep',
+    'benchmark': 'kraken_benchmark',
+    'models': 'kraken_models',
+    'export': 'kraken_export',
+    'serve': 'kraken_service',
+}
+
+# ===================================================================================
+# Commands
+# ===================================================================================
+def _expand_sources(sources):
+    images = []
+    for source in sources:
+        if os.path.isfile(source) and source.lower().endswith(DOCUMENT_EXTENSIONS):
+            images.append(source)
+        else:
+            images.extend(collect_images(source))
+    return images
+
+def _make_pool(args, workers):
+    cache = None if args.no_cache else ResultCache(args.cache_dir, args.cache_size_mb * 1024 * 1024)
+    return EnginePool(workers, args.kraken_path, cache)
+
+def _run_pages(args, function, failed):
+    """
+    يطبق function(engine, image_path, page) على كل صفحة بالتوازي ويعيد (المسار، الصفحة، النتيجة)
+    فور اكتمال كل صفحة. صفحات ملفات TIFF/PDF متعددة الصفحات تُعالج واحدة واحدة.
+    الصفحة التي تفشل تُكتب رسالتها في stderr وتُضاف إلى failed، وتكمل باقي الصفحات.
+    """
+    def unreadable(image_path, error):
+        failed.append(image_path)
+        print(f"{page_label(image_path, None)}: {error_summary(error)}", file=sys.stderr, flush=True)
+
+    pages = expand_pages(_expand_sources(args.images), on_error=unreadable)
+    if not pages:
+        if failed:
+            return
+        print("No images found.", file=sys.stderr)
+        return
+
+    # محركات بعدد الصفحات على الأكثر، فتأخذ الصفحة الواحدة كل الأنوية للتعرف على أسطرها
+    workers = max(1, min(args.workers, len(pages)))
+    pool = _make_pool(args, workers)
+
+    def run_one(item):
+        with pool.engine() as engine:
+            return function(engine, *item)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(run_one, item): item for item in pages}
+            for future in as_completed(futures):
+                image_path, page = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    failed.append(image_path if page is None else f"{image_path}#{page + 1}")
+                    print(f"{page_label(image_path, page)}: {error_summary(e)}", file=sys.stderr, flush=True)
+                    continue
+                yield image_path, page, result
+    finally:
+        pool.close()
+
+def _page_fields(image_path, page):
+    return {'image': image_path} if page is None else {'image': image_path, 'page': page + 1}
+
+def command_ocr(args):
+    failed = []
+    for index, (image_path, page, result) in enumerate(_run_pages(
+            args, lambda engine, image_path, page: engine.segment_and_recognize(image_path, args.model, page=page),
+            failed)):
+        text = "\n".join(line['text'] for line in result['lines'])
+        if args.format == 'json':
+            print(json.dumps({**_page_fields(image_path, page), 'text': text, **result}, ensure_ascii=False), flush=True)
+        else:
+            if len(args.images) > 1 or os.path.isdir(args.images[0]) or page is not None:
+                header = image_path if page is None else f"{image_path} [page {page + 1}]"
+                print(f"{'' if index == 0 else chr(10)}==> {header} <==")
+            print(text, flush=True)
+    return 1 if failed else 0
+
+def command_segment(args):
+    failed = []
+    for image_path, page, segmentation in _run_pages(
+            args, lambda engine, image_path, page: engine.segment(image_path, page), failed):
+        print(json.dumps({**_page_fields(image_path, page), **segmentation}, ensure_ascii=False), flush=True)
+    return 1 if failed else 0
+
+def command_train(args):
+    training_pairs = kraken_training.collect_training_pairs(args.source)
+    if not training_pairs:
+        print(f"No image/.gt.txt pairs found for: {args.source}", file=sys.stderr)
+        return 2
+
+    epochs, resume_args = args.epochs, ()
+    if args.resume or args.resume_from:
+        try:
+            plan = kraken_training.resume_plan(args.output, args.epochs, args.resume_from)
+        except Exception as e:
+            print(f"{e}\nChoose one with --resume-from.", file=sys.stderr)
+            return 2
+        if plan is None:
+            print(f"No checkpoint to resume for: {args.output}", file=sys.stderr)
+            return 2
+        resume_args, epochs, description = plan
+        print(description, flush=True)
+
+    # ketos يعمل في مجموعة عمليات مستقلة، فنحول Ctrl+C إلى إيقاف لطيف يحفظ نقطة الحفظ
+    cancel_event = threading.Event()
+    outcome = {}
+
+    def train():
+        try:
+            outcome['result'] = kraken_training.run_training(lambda line: print(line, end='', flush=True),
+                                                             training_pairs, args.output, epochs, resume_args,
+                                                             args.kraken_path, cancel_event)
+        except Exception as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=train)
+    thread.start()
+    while thread.is_alive():
+        try:
+            thread.join(0.5)
+        except KeyboardInterrupt:
+            cancel_event.set()
+
+    if 'error' in outcome:
+        print(outcome['error'], file=sys.stderr)
+        return 1
+    if outcome['result']['cancelled']:
+        print("\nTraining stopped. Resume with --resume.", file=sys.stderr)
+        return 130
+    return 0
+
+# ===================================================================================
+# Entry Point
+# ===================================================================================
+def _add_engine_arguments(parser):
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="Number of resident kraken engine processes.")
+    parser.add_argument("--kraken-path", default="", help="Directory containing the kraken environment's python.")
+    parser.add_argument("--cache-dir", default=None, help="Result cache directory (default: per-user cache directory).")
+    parser.add_argument("--cache-size-mb", type=int, default=DEFAULT_CACHE_SIZE_BYTES // (1024 * 1024), help="Result cache size cap in MB.")
+    parser.add_argument("--no-cache", action="store_true", help="Always re-run segmentation and recognition.")
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m kraken_cli",
+                                     description="Headless Kraken OCR: the same pipeline as the GUI, without a display.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ocr = commands.add_parser("ocr", help="Segment and recognize images; print text or JSON lines to stdout.")
+    ocr.add_argument("images", nargs="+", help="Image/PDF files, directories or glob patterns.")
+    ocr.add_argument("-m", "--model", default="arabic_best.mlmodel", help="Recognition model.")
+    ocr.add_argument("-f", "--format", choices=("text", "json"), default="text", help="Output format (json = one object per line).")
+    _add_engine_arguments(ocr)
+    ocr.set_defaults(handler=command_ocr)
+
+    segment = commands.add_parser("segment", help="Segment images; print one JSON object per image.")
+    segment.add_argument("images", nargs="+", help="Image/PDF files, directories or glob patterns.")
+    _add_engine_arguments(segment)
+    segment.set_defaults(handler=command_segment)
+
+    train = commands.add_parser("train", help="Train a recognition model with ketos (Ctrl+C stops at a checkpoint).")
+    train.add_argument("source", help="Glob of line images; each needs a <image>.gt.txt next to it.")
+    train.add_argument("-o", "--output", default="my_arabic_model.mlmodel", help="Output model name.")
+    train.add_argument("--epochs", type=int, default=100, help="Number of epochs.")
+    train.add_argument("--resume", action="store_true", help="Continue from the last checkpoint of --output.")
+    train.add_argument("--resume-from", default=None, help="Checkpoint to resume from when several runs of --output left checkpoints (implies --resume).")
+    train.add_argument("--kraken-path", default="", help="Directory containing the ketos executable.")
+    train.set_defaults(handler=command_train)
+
+    commands.add_parser("serve", add_help=False, help="Run the local HTTP OCR service (see 'serve --help').")
+
+    commands.add_parser("batch", add_help=False, help="Batch OCR a folder to per-page files (see 'batch --help').")
+    commands.add_parser("sweep", add_help=False, help="Hyperparameter sweep for ketos train (see 'sweep --help').")
+    commands.add_parser("benchmark", add_help=False, help="Pipeline benchmark with JSON report (see 'benchmark --help').")
+    commands.add_parser("models", add_help=False, help="List registered recognition models as JSON lines (see 'models --help').")
+    commands.add_parser("export", add_help=False, help="Convert saved JSON line results to ALTO/PAGE XML/hOCR, optionally into a zip/tar (see 'export --help').")
+    return parser
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    tracer.enable_from_environment() # KRAKEN_GUI_TRACE=<ملف> لتسجيل أزمنة المراحل
+    if argv and argv[0] in DELEGATED_COMMANDS:
+        return importlib.import_module(DELEGATED_COMMANDS[argv[0]]).main(argv[1:])
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+import os
+import contextlib
+
+MULTIPAGE_EXTENSIONS = ('.tif', '.tiff', '.pdf')
+DEFAULT_PDF_DPI = 300 # دقة تحويل صفحات PDF إلى صور للتجزئة والتعرف
+PDF_POINTS_PER_INCH = 72
+
+# ===================================================================================
+# Format Detection
+# ===================================================================================
+def is_pdf(path):
+    """يتعرف على PDF من بداية الملف لا من امتداده (الملفات المرفوعة إلى الخدمة بلا امتداد)."""
+    with open(path, 'rb') as f:
+        return f.read(5) == b"%PDF-"
+
+def _pdfium():
+    try:
+        import pypdfium2
+    except ImportError:
+        raise Exception("قراءة ملفات PDF تتطلب مكتبة pypdfium2 (pip install pypdfium2).")
+    return pypdfium2
+
+@contextlib.contextmanager
+def _pdf_page(path, page):
+    # pdfium يقرأ من الملف عند الحاجة فقط، فلا يُحمّل المستند كاملاً إلى الذاكرة
+    document = _pdfium().PdfDocument(path)
+    try:
+        pdf_page = document[page or 0]
+        try:
+            yield pdf_page
+        finally:
+            pdf_page.close()
+    finally:
+        document.close()
+
+def page_count(path):
+    """عدد صفحات المستند: إطارات TIFF (تُقرأ رؤوسها فقط) أو صفحات PDF، و1 لأي صورة أخرى."""
+    if is_pdf(path):
+        document = _pdfium().PdfDocument(path)
+        try:
+            return len(document)
+        finally:
+            document.close()
+    from PIL import Image # يُستورد عند أول صورة فقط حتى لا يبطئ بدء الواجهة والمحرك
+    with Image.open(path) as im:
+        return getattr(im, 'n_frames', 1)
+
+def expand_pages(paths, on_error=None):
+    """
+    يحول قائمة ملفات إلى قائمة صفحات (المسار، رقم الصفحة) دون فك أي صفحة.
+    رقم الصفحة None للصور ذات الصفحة الواحدة حتى تبقى مخرجاتها ومفاتيحها كما كانت.
+    إذا مُرر on_error(path, error) يُستدعى للملف الذي تتعذر قراءة صفحاته ويُتخطى بدل إيقاف القائمة كلها.
+    """
+    pages = []
+    for path in paths:
+        try:
+            count = page_count(path) if path.lower().endswith(MULTIPAGE_EXTENSIONS) else 1
+        except Exception as e:
+            if on_error is None:
+                raise
+            on_error(path, e)
+            continue
+        pages.extend([(path, None)] if count == 1 else [(path, page) for page in range(count)])
+    return pages
+
+def page_label(path, page):
+    name = os.path.basename(path)
+    return name if page is None else f"{name} [ص {page + 1}]"
+
+def page_stem(path, page):
+    """اسم ملفات الإخراج للصفحة: <الاسم> أو <الاسم>_p0001 لصفحات المستندات متعددة الصفحات."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return stem if page is None else f"{stem}_p{page + 1:04d}"
+
+# ===================================================================================
+# Page Access
+# ===================================================================================
+@contextlib.contextmanager
+def open_page(path, page=None, dpi=DEFAULT_PDF_DPI):
+    """
+    يفتح صفحة واحدة فقط من المستند. لإطارات TIFF تُعاد الصورة دون فك (seek يقرأ رأس الإطار فقط)
+    فيمكن فك مناطق منها؛ صفحات PDF تُرسم بالدقة dpi. تُغلق الصفحة وتُحرر ذاكرتها عند الخروج.
+    """
+    if is_pdf(path):
+        image = render_pdf_page(path, page, dpi)
+        try:
+            yield image
+        finally:
+            image.close()
+        return
+
+    from PIL import Image
+    im = Image.open(path)
+    try:
+        if page:
+            im.seek(page)
+        yield im
+    finally:
+        im.close()
+
+def pdf_page_size(path, page, dpi=DEFAULT_PDF_DPI):
+    with _pdf_page(path, page) as pdf_page:
+        width, height = pdf_page.get_size()
+    scale = dpi / PDF_POINTS_PER_INCH
+    return round(width * scale), round(height * scale)
+
+def page_size(path, page=None, dpi=DEFAULT_PDF_DPI):
+    """(العرض، الارتفاع) بالبكسل للصفحة كما تراها التجزئة، من رأس الصورة فقط دون فكها."""
+    if is_pdf(path):
+        return pdf_page_size(path, page, dpi)
+    with open_page(path, page) as im:
+        return im.size
+
+def render_pdf_page(path, page, dpi=DEFAULT_PDF_DPI, max_size=None, box=None):
+    """
+    يرسم صفحة PDF كصورة RGB: كاملة بحجم لا يتجاوز max_size (للمعاينة)، أو المنطقة box فقط
+    بإحداثيات الصفحة بدقة dpi (للتكبير)، فلا تُرسم الصفحة كاملة بالدقة العالية إلا عند الحاجة.
+    """
+    with _pdf_page(path, page) as pdf_page:
+        width, height = pdf_page.get_size()
+        scale = dpi / PDF_POINTS_PER_INCH
+        crop = (0, 0, 0, 0)
+        if max_size is not None:
+            scale = min(scale, max_size[0] / width, max_size[1] / height)
+        if box is not None:
+            # مقدار القص من كل جهة (يسار، أسفل، يمين، أعلى) بوحدات PDF
+            crop = (box[0] / scale, height - box[3] / scale, width - box[2] / scale, box[1] / scale)
+            crop = tuple(max(0.0, value) for value in crop)
+        image = pdf_page.render(scale=scale, crop=crop).to_pil()
+    return image.convert('RGB')
@@ -0,0 +1,549 @@
+import sys
+import os
+import glob
+import json
+import copy
+import math
+import shutil
+import time
+import threading
+import subprocess
+import traceback
+import argparse
+import contextlib
+from collections import deque, OrderedDict, Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from kraken_trace import tracer, resource_snapshot, resource_delta
+from kraken_document import open_page
+
+DEFAULT_MODEL_POOL_SIZE = 3 # عدد نماذج التعرف التي يبقيها المحرك محمّلة (الأقدم استخدامًا يُحرر أولاً)
+MIN_SHARD_LINES = 4 # أقل عدد أسطر في المجموعة الواحدة عند التعرف المتوازي داخل الصفحة
+SHARDS_PER_WORKER = 2 # مجموعات أصغر توزع الحمل بشكل أفضل وتبدأ إرسال الأسطر الأولى أبكر
+
+# ===================================================================================
+# Shared Helpers
+# ===================================================================================
+def build_subprocess_env(kraken_dir=None):
+    """يُعد بيئة التشغيل للعمليات الفرعية مع إضافة مسار kraken المحدد."""
+    sub_env = os.environ.copy()
+    sub_env["PYTHONIOENCODING"] = "utf-8"
+    sub_env["PYTHONUTF8"] = "1"
+
+    if kraken_dir and os.path.isdir(kraken_dir):
+        # إضافة المسار المحدد إلى بداية متغير PATH
+        sub_env["PATH"] = f"{kraken_dir}{os.pathsep}{sub_env.get('PATH', '')}"
+
+    return sub_env
+
+def find_engine_python(kraken_dir=None):
+    """
+    يحدد مفسر Python الذي يملك مكتبة kraken: المفسر الموجود بجانب ملف kraken التنفيذي
+    في المجلد المحدد إن وجد، وإلا المفسر الحالي.
+    """
+    if kraken_dir and os.path.isdir(kraken_dir):
+        for name in ("python.exe", "python3", "python"):
+            candidate = os.path.join(kraken_dir, name)
+            if os.path.isfile(candidate):
+                return candidate
+    if getattr(sys, 'frozen', False):
+        # داخل ملف exe المجمع لا يمكن استخدام sys.executable كمفسر
+        return "python"
+    return sys.executable
+
+def default_line_workers(engines=1):
+    """خيوط التعرف داخل الصفحة لكل محرك: الأنوية مقسومة على عدد المحركات التي تعمل في نفس الوقت."""
+    return max(1, (os.cpu_count() or 1) // max(1, engines))
+
+def missing_kraken_tools(kraken_dir=None):
+    """أسماء أدوات kraken و ketos التنفيذية التي لا توجد في المجلد المحدد ولا في PATH."""
+    search_path = build_subprocess_env(kraken_dir)["PATH"]
+    return [tool for tool in ("kraken", "ketos") if shutil.which(tool, path=search_path) is None]
+
+def kraken_app_dirs():
+    """مجلدات بيانات kraken التي يبحث فيها 'kraken ocr --model' (نفس قواعد click.get_app_dir)."""
+    for app_name in ("kraken", "htrmopo"):
+        if sys.platform == "win32":
+            yield os.path.join(os.environ.get("APPDATA") or os.path.expanduser("~"), app_name)
+        elif sys.platform == "darwin":
+            yield os.path.join(os.path.expanduser("~/Library/Application Support"), app_name)
+        else:
+            yield os.path.join(os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config"), app_name)
+
+def resolve_model_path(model_name):
+    """يبحث عن النموذج كما يفعل 'kraken ocr --model': مسار مباشر ثم مجلد بيانات kraken. يعيد None إن لم يوجد."""
+    if os.path.exists(model_name):
+        return model_name
+    for app_dir in kraken_app_dirs():
+        candidate = os.path.join(app_dir, model_name)
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+def installed_kraken_version(kraken_dir=None):
+    """يقرأ إصدار kraken المثبت من بيانات الحزمة دون استيراده (الاستيراد يحمّل torch)."""
+    if kraken_dir and os.path.isdir(kraken_dir):
+        env_roots = (kraken_dir, os.path.dirname(os.path.abspath(kraken_dir)))
+        for env_root in env_roots:
+            for pattern in (os.path.join(env_root, "Lib", "site-packages", "kraken-*.dist-info"),
+                            os.path.join(env_root, "lib", "python*", "site-packages", "kraken-*.dist-info")):
+                matches = sorted(glob.glob(pattern))
+                if matches:
+                    return os.path.basename(matches[-1])[len("kraken-"):-len(".dist-info")]
+        return f"unknown:{os.path.abspath(kraken_dir)}"
+    try:
+        from importlib.metadata import version
+        return version("kraken")
+    except Exception:
+        return "unknown"
+
+# ===================================================================================
+# Engine Client (runs inside the GUI / batch process)
+# ===================================================================================
+class KrakenEngine:
+    """
+    عملية kraken طويلة العمر تُحمّل نموذج التجزئة ونماذج التعرف مرة واحدة وتبقيها في الذاكرة.
+    تُرسل الطلبات وتُستقبل الردود عبر أنبوب (سطر JSON لكل رسالة)، فلا يُدفع ثمن تشغيل المفسر
+    واستيراد kraken/torch وتحميل النموذج إلا عند أول طلب.
+    """
+
+    def __init__(self, kraken_dir="", max_models=DEFAULT_MODEL_POOL_SIZE, line_workers=1):
+        self.kraken_dir = kraken_dir
+        self.max_models = max_models
+        self.line_workers = line_workers
+        self.process = None
+        self.lock = threading.Lock()
+        self.stderr_tail = deque(maxlen=50)
+        self.stderr_thread = None
+
+    def start(self):
+        if self.process is not None and self.process.poll() is None:
+            return
+        self.stderr_tail.clear()
+        command = [find_engine_python(self.kraken_dir), "-u", os.path.abspath(__file__), "--serve",
+                   "--max-models", str(self.max_models), "--line-workers", str(self.line_workers)]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE, text=True, encoding='utf-8',
+                                        errors='replace', env=build_subprocess_env(self.kraken_dir),
+                                        bufsize=1)
+        # تفريغ stderr باستمرار حتى لا تمتلئ الأنبوبة بتحذيرات torch وتتوقف العملية
+        self.stderr_thread = threading.Thread(target=self._drain_stderr, args=(self.process,), daemon=True)
+        self.stderr_thread.start()
+
+    def _drain_stderr(self, process):
+        for line in iter(process.stderr.readline, ''):
+            self.stderr_tail.append(line)
+
+    def request(self, command, on_event=None, **params):
+        """
+        يرسل طلبًا وينتظر الرد النهائي. الرسائل الوسيطة (التي تحمل المفتاح 'event')
+        تُمرر إلى on_event فور وصولها، مثل كل سطر يُتعرف عليه أثناء التعرف.
+        """
+        callback_error = None
+        with self.lock:
+            start = time.perf_counter()
+            starting = self.process is None or self.process.poll() is not None
+            self.start()
+            startup_seconds = time.perf_counter() - start if starting else 0.0
+            reply = None
+            try:
+                self.process.stdin.write(json.dumps({'command': command, **params}) + "\n")
+                self.process.stdin.flush()
+                for message_line in iter(self.process.stdout.readline, ''):
+                    message = json.loads(message_line)
+                    if 'event' not in message:
+                        reply = message
+                        break
+                    if on_event is not None and callback_error is None:
+                        # نكمل قراءة الرسائل حتى الرد النهائي كي لا يختل تزامن البروتوكول
+                        try:
+                            on_event(message)
+                        except Exception as e:
+                            callback_error = e
+            except (BrokenPipeError, OSError, ValueError):
+                # سطر لا يُقرأ كـ JSON يعني أن تزامن البروتوكول اختل والرد الفعلي ما زال في الأنبوب،
+                # فلا يُعاد استخدام العملية حتى لا يقرأ الطلب التالي رد هذا الطلب
+                reply = None
+
+            if reply is None:
+                if self.process.poll() is None:
+                    self.process.kill()
+                self.process.wait()
+                self.stderr_thread.join(timeout=1)
+                stderr = ''.join(self.stderr_tail)
+                self.process = None
+                raise Exception(f"توقف محرك Kraken بشكل غير متوقع.\nStderr:\n{stderr}")
+
+        self._trace(command, time.perf_counter() - start, startup_seconds, reply.get('stats') or {})
+        if callback_error is not None:
+            raise callback_error
+        if not reply['ok']:
+            raise Exception(reply['error'])
+        return reply['result']
+
+    def _trace(self, command, seconds, startup_seconds, stats):
+        """
+        يسجل زمن الطلب مفصلاً: تشغيل العملية، والمراحل التي قاسها المحرك نفسه (تحميل النموذج، فك الصورة،
+        التجزئة، التعرف)، والباقي زمن النقل عبر الأنبوب. موارد عملية المحرك تُسجل في الحقل 'engine'.
+        """
+        breakdown = dict(stats.get('stages', {}))
+        breakdown['startup'] = breakdown.get('startup', 0.0) + startup_seconds
+        breakdown['ipc'] = max(0.0, seconds - startup_seconds - stats.get('seconds', 0.0))
+        tracer.record(f"engine.{command}", seconds=seconds, breakdown=breakdown,
+                      engine={key: value for key, value in stats.items() if key != 'stages'})
+
+    def segment(self, image_path, page=None):
+        """
+        يعيد نتيجة التجزئة بنفس بنية ملف JSON الذي ينتجه 'kraken segment'.
+        page يحدد إطار TIFF أو صفحة PDF (من 0)؛ المحرك يفك تلك الصفحة وحدها ثم يحررها.
+        """
+        return self.request('segment', image_path=image_path, page=page)
+
+    def recognize(self, image_path, segmentation, model_name, on_event=None, page=None):
+        """
+        يعيد قائمة بالأسطر المتعرف عليها: {'text', 'baseline', 'boundary'} بترتيب القراءة.
+        إذا مُرر on_event يُستدعى مع {'event': 'line', 'index', 'total', 'line'} لكل سطر فور التعرف عليه.
+        """
+        return self.request('recognize', on_event=on_event, stream=on_event is not None, image_path=image_path,
+                            page=page, segmentation=segmentation, model_name=model_name)
+
+    def segment_and_recognize(self, image_path, model_name, on_event=None, page=None):
+        """
+        يجزئ الصفحة ويتعرف عليها في طلب واحد: {'segmentation': ..., 'lines': [...]}.
+        مع on_event يصل حدث {'event': 'segmentation', 'segmentation'} أولاً ثم حدث لكل سطر.
+        """
+        return self.request('segment_and_recognize', on_event=on_event, stream=on_event is not None,
+                            image_path=image_path, page=page, model_name=model_name)
+
+    def warm_up(self, model_name=None):
+        """يشغل العملية ويحمّل نموذج التجزئة (ونموذج التعرف إن حُدد) قبل أول طلب فعلي."""
+        return self.request('warm_up', model_name=model_name)
+
+    def preload_models(self, model_names):
+        """يحمّل نماذج التعرف في مجموعة النماذج المقيمة (حتى max_models) ويعيد مساراتها المحمّلة بالترتيب."""
+        return self.request('preload_models', model_names=list(model_names))
+
+    def describe_model(self, model_name):
+        """بيانات النموذج من المحرك: {'script', 'alphabet_size', 'model_type'} (دون إدخاله في المجموعة المقيمة)."""
+        return self.request('describe_model', model_name=model_name)
+
+    def compare_models(self, image_path, segmentation, model_names, on_event=None, page=None):
+        """
+        يتعرف على نفس التجزئة بعدة نماذج في طلب واحد (تُفك الصفحة وتُحسب حدود الأسطر مرة واحدة)،
+        ويعيد {اسم النموذج: الأسطر}. مع on_event يصل حدث {'event': 'model', 'model_name', 'lines'} لكل نموذج.
+        """
+        return self.request('compare_models', on_event=on_event, stream=on_event is not None, image_path=image_path,
+                            page=page, segmentation=segmentation, model_names=list(model_names))
+
+    def terminate(self):
+        """
+        يوقف العملية فورًا دون انتظار القفل، فلا يتجمد المستدعي خلف طلب جارٍ (عند إغلاق التطبيق).
+        الطلب الجاري إن وُجد يفشل برسالة توقف المحرك.
+        """
+        process = self.process
+        if process is not None and process.poll() is None:
+            process.kill()
+
+    def close(self):
+        with self.lock:
+            if self.process is None:
+                return
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+            self.process = None
+
+# ===================================================================================
+# Engine Server (runs inside the kraken environment)
+# ===================================================================================
+def _segmentation_to_dict(result):
+    import dataclasses
+    if dataclasses.is_dataclass(result):
+        result = dataclasses.asdict(result)
+    # تحويل المجموعات (tuples) والقيم غير القياسية إلى بنية JSON صافية
+    return json.loads(json.dumps(result, default=str))
+
+def _segmentation_from_dict(segmentation, image_path):
+    """kraken 5 يتطلب كائن Segmentation، بينما kraken 4 يقبل القاموس مباشرة."""
+    try:
+        from kraken.containers import Segmentation, BaselineLine
+    except ImportError:
+        return segmentation
+
+    lines = [BaselineLine(id=line.get('id') or f"line_{index}",
+                          baseline=line['baseline'],
+                          boundary=line['boundary'],
+                          tags=line.get('tags'))
+             for index, line in enumerate(segmentation.get('lines', []))]
+    return Segmentation(type='baselines', imagename=image_path,
+                        text_direction=segmentation.get('text_direction', 'horizontal-lr'),
+                        script_detection=False, lines=lines, regions={})
+
+ENGINE_COMMANDS = ('segment', 'recognize', 'segment_and_recognize', 'warm_up', 'preload_models', 'describe_model',
+                   'compare_models')
+
+def _model_script(network):
+    """الكتابة الغالبة على أبجدية النموذج (Arabic، Latin، ...) من أسماء محارف Unicode في مُرمِّزه."""
+    import unicodedata
+    codec = getattr(network, 'codec', None) or getattr(getattr(network, 'nn', None), 'codec', None)
+    alphabet = [label for label in getattr(codec, 'c2l', {}) if isinstance(label, str)]
+    scripts = Counter(unicodedata.name(char, "").split(" ")[0] for label in alphabet for char in label if char.isalpha())
+    script = scripts.most_common(1)[0][0].title() if scripts else None
+    return script, len(alphabet)
+
+class _EngineState:
+    def __init__(self, emit, max_models=DEFAULT_MODEL_POOL_SIZE, line_workers=1):
+        self.emit = emit
+        self.line_workers = max(1, line_workers)
+        self.segmentation_model = None
+        self.recognition_models = OrderedDict() # مجموعة LRU: آخر نموذج مستخدم في النهاية
+        self.max_models = max(1, max_models)
+        self.kraken_imported = False
+        self.timings = {} # أزمنة مراحل الطلب الحالي، تُرسل مع الرد
+
+    @contextlib.contextmanager
+    def _timed(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] = self.timings.get(stage, 0.0) + time.perf_counter() - start
+
+    def _import_kraken(self):
+        # استيراد kraken/torch هو الجزء الأكبر من زمن تشغيل المحرك، فيُحسب ضمن 'startup'
+        if not self.kraken_imported:
+            with self._timed('startup'):
+                from kraken import blla, rpred
+                from kraken.lib import vgsl, models
+            self.kraken_imported = True
+
+    @contextlib.contextmanager
+    def _open_image(self, image_path, page=None):
+        # تُفك الصفحة المطلوبة وحدها (إطار TIFF أو صفحة PDF) وتُحرر عند انتهاء الطلب
+        with contextlib.ExitStack() as stack:
+            with self._timed('decode'):
+                im = stack.enter_context(open_page(image_path, page))
+                im.load()
+            yield im
+
+    def segment(self, image_path, page=None):
+        with self._open_image(image_path, page) as im:
+            return self._segment_image(im)
+
+    def recognize(self, image_path, segmentation, model_name, stream=False, page=None):
+        with self._open_image(image_path, page) as im:
+            return self._recognize_image(im, image_path, segmentation, model_name, stream)
+
+    def segment_and_recognize(self, image_path, model_name, stream=False, page=None):
+        """مرور واحد: تُفك الصورة مرة واحدة وتُمرر نتيجة التجزئة إلى التعرف في الذاكرة."""
+        with self._open_image(image_path, page) as im:
+            segmentation = self._segment_image(im)
+            if stream:
+                self.emit({'event': 'segmentation', 'segmentation': segmentation})
+            lines = self._recognize_image(im, image_path, segmentation, model_name, stream)
+        return {'segmentation': segmentation, 'lines': lines}
+
+    def warm_up(self, model_name=None):
+        self._segmentation_network()
+        if model_name:
+            self._recognition_network(model_name)
+        return True
+
+    def preload_models(self, model_names):
+        # أكثر من max_models نموذجًا يُخرج أولها من المجموعة فور تحميله، فلا يُحمّل إلا آخرها
+        model_names = model_names[-self.max_models:]
+        for model_name in model_names:
+            self._recognition_network(model_name)
+        return [resolve_model_path(model_name) for model_name in model_names]
+
+    def describe_model(self, model_name):
+        model_path = resolve_model_path(model_name)
+        network = self.recognition_models.get(model_path)
+        if network is None:
+            self._import_kraken()
+            from kraken.lib import models
+            if model_path is None:
+                raise FileNotFoundError(f"لم يتم العثور على نموذج التعرف: {model_name}")
+            with self._timed('model_load'):
+                network = models.load_any(model_path)
+        script, alphabet_size = _model_script(network)
+        return {'script': script, 'alphabet_size': alphabet_size, 'model_type': type(network).__name__}
+
+    def compare_models(self, image_path, segmentation, model_names, stream=False, page=None):
+        results = {}
+        with self._open_image(image_path, page) as im:
+            segmentation = self._with_boundaries(im, segmentation)
+            for model_name in model_names:
+                results[model_name] = self._recognize_image(im, image_path, segmentation, model_name)
+                if stream:
+                    self.emit({'event': 'model', 'model_name': model_name, 'lines': results[model_name]})
+        return results
+
+    def _segmentation_network(self):
+        self._import_kraken()
+        from kraken.lib import vgsl
+
+        if self.segmentation_model is None:
+            import importlib.resources
+            with self._timed('model_load'):
+                default_model = importlib.resources.files('kraken').joinpath('blla.mlmodel')
+                self.segmentation_model = vgsl.TorchVGSLModel.load_model(str(default_model))
+        return self.segmentation_model
+
+    def _recognition_network(self, model_name):
+        self._import_kraken()
+        from kraken.lib import models
+
+        model_path = resolve_model_path(model_name)
+        if model_path is None:
+            raise FileNotFoundError(f"لم يتم العثور على نموذج التعرف: {model_name}")
+        if model_path in self.recognition_models:
+            self.recognition_models.move_to_end(model_path)
+            return self.recognition_models[model_path]
+        while len(self.recognition_models) >= self.max_models:
+            self.recognition_models.popitem(last=False)
+        with self._timed('model_load'):
+            self.recognition_models[model_path] = models.load_any(model_path)
+        return self.recognition_models[model_path]
+
+    def _segment_image(self, im):
+        network = self._segmentation_network()
+        from kraken import blla
+        with self._timed('segment'):
+            return _segmentation_to_dict(blla.segment(im, model=network))
+
+    def _with_boundaries(self, im, segmentation):
+        """
+        الخطوط الأساسية المضافة أو المعدلة يدويًا تصل بلا حدود، فتُحسب حدودها من الصورة قبل التعرف.
+        خطوط الأسطر الباقية تُمرر كعوائق (suppl_obj) حتى لا يمتد المضلع الجديد فوق الأسطر المجاورة.
+        """
+        lines = segmentation.get('lines', [])
+        missing = [index for index, line in enumerate(lines) if not line.get('boundary')]
+        if not missing:
+            return segmentation
+        from kraken.lib.segmentation import calculate_polygonal_environment
+        kept = [line['baseline'] for line in lines if line.get('boundary') and line.get('baseline')]
+        with self._timed('segment'):
+            boundaries = calculate_polygonal_environment(im, [lines[index]['baseline'] for index in missing],
+                                                         suppl_obj=kept)
+        lines = list(lines)
+        for index, boundary in zip(missing, boundaries):
+            if boundary is None:
+                raise ValueError(f"تعذر حساب حدود السطر {index + 1} من خطه الأساسي.")
+            lines[index] = {**lines[index], 'boundary': [[int(x), int(y)] for x, y in boundary]}
+        return {**segmentation, 'lines': lines}
+
+    def _recognize_image(self, im, image_path, segmentation, model_name, stream=False):
+        network = self._recognition_network(model_name)
+        segmentation = self._with_boundaries(im, segmentation)
+        source_lines = segmentation.get('lines', [])
+        lines = []
+        predictions = self._predictions(network, im, image_path, segmentation)
+        # النتائج تصل بترتيب القراءة، فيُرسل كل سطر فور توفره
+        for index, line in enumerate(source_lines):
+            record = next(predictions, None)
+            if record is None:
+                break
+            recognized = {'text': record.prediction,
+                          'baseline': line.get('baseline'),
+                          'boundary': line.get('boundary')}
+            lines.append(recognized)
+            if stream:
+                self.emit({'event': 'line', 'index': index, 'total': len(source_lines), 'line': recognized})
+        return lines
+
+    def _predictions(self, network, im, image_path, segmentation):
+        """
+        يولّد نتائج rpred بترتيب الأسطر. مع أكثر من خيط تُقسم الأسطر إلى مجموعات متتالية تُتعرف بالتوازي
+        بنفس النموذج المحمّل (torch يحرر GIL أثناء الحساب)، وتُعاد المجموعات بترتيبها فور اكتمال كل منها.
+        كل خيط يستخدم نسخة سطحية من المُعرِّف تشترك في الشبكة (nn): rpred يقرأ net.outputs بعد predict
+        لحساب مواضع المحارف، فلا تُحسب مواضع مجموعة من مخرجات مجموعة أخرى.
+        """
+        from kraken import rpred
+
+        lines = segmentation.get('lines', [])
+        if self.line_workers == 1 or len(lines) < 2 * MIN_SHARD_LINES:
+            predictions = rpred.rpred(network, im, _segmentation_from_dict(segmentation, image_path))
+            while True:
+                with self._timed('recognize'):
+                    record = next(predictions, None)
+                if record is None:
+                    return
+                yield record
+
+        shard_size = max(MIN_SHARD_LINES, math.ceil(len(lines) / (self.line_workers * SHARDS_PER_WORKER)))
+
+        recognizers = threading.local()
+
+        def recognize_shard(start):
+            if not hasattr(recognizers, 'network'):
+                recognizers.network = copy.copy(network)
+            shard = {**segmentation, 'lines': lines[start:start + shard_size]}
+            return list(rpred.rpred(recognizers.network, im, _segmentation_from_dict(shard, image_path)))
+
+        with _torch_threads(max(1, (os.cpu_count() or 1) // self.line_workers)), \
+                ThreadPoolExecutor(max_workers=self.line_workers) as executor:
+            futures = [executor.submit(recognize_shard, start) for start in range(0, len(lines), shard_size)]
+            for future in futures:
+                with self._timed('recognize'):
+                    records = future.result()
+                yield from records
+
+@contextlib.contextmanager
+def _torch_threads(count):
+    """يحد خيوط torch الداخلية أثناء التعرف المتوازي حتى لا تتزاحم الخيوط على نفس الأنوية."""
+    try:
+        import torch
+    except ImportError:
+        yield
+        return
+    previous = torch.get_num_threads()
+    torch.set_num_threads(count)
+    try:
+        yield
+    finally:
+        torch.set_num_threads(previous)
+
+def serve(max_models=DEFAULT_MODEL_POOL_SIZE, line_workers=1):
+    # البروتوكول يُكتب إلى نسخة خاصة من الواصف 1، ثم يُوجه الواصف 1 نفسه إلى stderr، فلا تصل إلى الأنبوب
+    # أي طباعة من kraken ولا ما تكتبه المكتبات الأصلية (torch، OpenMP) مباشرة إلى الواصف 1
+    sys.stdout.flush()
+    protocol_out = os.fdopen(os.dup(1), 'w', encoding='utf-8')
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+
+    def emit(message):
+        protocol_out.write(json.dumps(message) + "\n")
+        protocol_out.flush()
+
+    state = _EngineState(emit, max_models, line_workers)
+    for request_line in sys.stdin:
+        if not request_line.strip():
+            continue
+        request = json.loads(request_line)
+        command = request.pop('command')
+        state.timings = {}
+        before = resource_snapshot()
+        start = time.perf_counter()
+        try:
+            if command not in ENGINE_COMMANDS:
+                raise ValueError(f"Unknown engine command: {command}")
+            result = getattr(state, command)(**request)
+            reply = {'ok': True, 'result': result}
+        except Exception as e:
+            reply = {'ok': False, 'error': f"{str(e)}\n{traceback.format_exc()}"}
+        # أزمنة المراحل وموارد عملية المحرك (المعالج، الذاكرة، البايتات المقروءة) لهذا الطلب
+        reply['stats'] = {'seconds': time.perf_counter() - start, 'stages': state.timings,
+                          **resource_delta(before, resource_snapshot())}
+        emit(reply)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resident kraken engine speaking JSON lines on stdin/stdout.")
+    parser.add_argument("--serve", action="store_true", help="Serve engine requests until stdin closes.")
+    parser.add_argument("--max-models", type=int, default=DEFAULT_MODEL_POOL_SIZE, help="Recognition models kept loaded.")
+    parser.add_argument("--line-workers", type=int, default=1, help="Threads recognizing line shards of one page.")
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.max_models, args.line_workers)
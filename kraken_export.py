@@ -0,0 +1,378 @@
+import sys
+import os
+import io
+import json
+import time
+import re
+import glob
+import argparse
+import tarfile
+import zipfile
+import tempfile
+import threading
+from xml.sax.saxutils import escape, quoteattr
+
+from kraken_document import page_size, page_stem
+
+# الصيغ التي تُكتب ملفًا لكل صفحة، وامتداد كل منها
+PAGE_FORMATS = {
+    'alto': '.alto.xml',
+    'page': '.page.xml',
+    'hocr': '.hocr',
+}
+EXPORT_FORMATS = tuple(PAGE_FORMATS) + ('jsonl',) # jsonl: ملف واحد للمجموعة، صفحة في كل سطر
+COLLECTION_NAME = "results.jsonl"
+ARCHIVE_MODES = {'.zip': None, '.tar': 'w', '.tar.gz': 'w:gz', '.tgz': 'w:gz'}
+FLUSH_BYTES = 8 * 1024 * 1024 # حجم الملفات المنتظرة في الذاكرة قبل كتابتها دفعة واحدة
+
+ALTO_NAMESPACE = "http://www.loc.gov/standards/alto/ns-v4#"
+PAGE_NAMESPACE = "http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15"
+# محارف خارج نطاق Char في XML 1.0 (محارف التحكم عدا الجدولة ونهاية السطر، والبدائل المنفردة، FFFE/FFFF)
+# قد يخرجها التعرف في نص السطر، ولا تُهرب بل تجعل الملف غير صالح، فتُحذف قبل الكتابة
+XML_INVALID_CHARS = re.compile('[^\t\n\r\x20-\ud7ff\ue000-\ufffd\U00010000-\U0010ffff]')
+
+# ===================================================================================
+# Page Records
+# ===================================================================================
+def page_record(image_path, page, segmentation, lines, size=None):
+    """
+    سجل الصفحة الذي تُبنى منه كل الصيغ، بنفس شكل مخرجات 'kraken_cli ocr --format json':
+    {'image', 'page' (يبدأ من 1، لصفحات المستندات فقط), 'width', 'height', 'text', 'segmentation', 'lines'}.
+    الحجم يُقرأ من رأس الصورة إن لم يُمرر.
+    """
+    width, height = size or page_size(image_path, page)
+    record = {'image': image_path}
+    if page is not None:
+        record['page'] = page + 1
+    record.update({'width': width, 'height': height, 'text': "\n".join(line['text'] for line in lines),
+                   'segmentation': segmentation, 'lines': lines})
+    return record
+
+def _complete_record(record):
+    """السجلات المحفوظة قبل إضافة الحجم (أو من الواجهة) تُكمل من الصورة، أو من أبعد نقطة في الأسطر."""
+    if record.get('width') and record.get('height'):
+        return record
+    page = record['page'] - 1 if record.get('page') else None
+    try:
+        width, height = page_size(record['image'], page)
+    except Exception:
+        points = [point for line in record['lines'] for point in (line.get('boundary') or line.get('baseline') or [])]
+        width = max((point[0] for point in points), default=0)
+        height = max((point[1] for point in points), default=0)
+    return {**record, 'width': width, 'height': height}
+
+def record_stem(record):
+    page = record.get('page')
+    return page_stem(record['image'], None if page is None else page - 1)
+
+# ===================================================================================
+# Geometry Helpers
+# ===================================================================================
+def _line_polygon(line):
+    return line.get('boundary') or line.get('baseline') or []
+
+def _bbox(points):
+    if not points:
+        return 0, 0, 0, 0
+    xs = [point[0] for point in points]
+    ys = [point[1] for point in points]
+    return int(min(xs)), int(min(ys)), int(max(xs)), int(max(ys))
+
+def _blocks(record):
+    """
+    يجمع الأسطر في كتل بترتيب القراءة: حسب منطقة kraken 5 التي ينتمي إليها السطر ('regions')،
+    وكل الأسطر بلا منطقة في كتلة واحدة. يعيد [(معرف المنطقة أو None، حدودها أو None، [(الفهرس، السطر)])].
+    """
+    regions = {}
+    for items in ((record.get('segmentation') or {}).get('regions') or {}).values():
+        for region in items:
+            if isinstance(region, dict) and region.get('id'):
+                regions[region['id']] = region.get('boundary')
+
+    source_lines = (record.get('segmentation') or {}).get('lines') or []
+    blocks = {}
+    for index, line in enumerate(record['lines']):
+        source = source_lines[index] if index < len(source_lines) else {}
+        region_id = next((region for region in source.get('regions') or [] if region in regions), None)
+        blocks.setdefault(region_id, []).append((index, line))
+    return [(region_id, regions.get(region_id), lines) for region_id, lines in blocks.items()]
+
+def _block_polygon(boundary, lines):
+    if boundary:
+        return boundary
+    x0, y0, x1, y1 = _bbox([point for _, line in lines for point in _line_polygon(line)])
+    return [[x0, y0], [x1, y0], [x1, y1], [x0, y1]]
+
+def _alto_points(points):
+    return " ".join(f"{int(x)} {int(y)}" for x, y in points)
+
+def _page_points(points):
+    return " ".join(f"{int(x)},{int(y)}" for x, y in points)
+
+def _box_attributes(points):
+    x0, y0, x1, y1 = _bbox(points)
+    return f'HPOS="{x0}" VPOS="{y0}" WIDTH="{x1 - x0}" HEIGHT="{y1 - y0}"'
+
+def _xml_text(text):
+    return escape(XML_INVALID_CHARS.sub('', text))
+
+def _xml_attribute(text):
+    return quoteattr(XML_INVALID_CHARS.sub('', text))
+
+# ===================================================================================
+# Serializers
+# ===================================================================================
+def to_alto(record):
+    """ALTO v4: كتلة نصية لكل منطقة، وسطر بحدوده وخطه الأساسي ونصه لكل سطر."""
+    record = _complete_record(record)
+    width, height = record['width'], record['height']
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n',
+             f'<alto xmlns="{ALTO_NAMESPACE}">\n',
+             '  <Description>\n    <MeasurementUnit>pixel</MeasurementUnit>\n',
+             f'    <sourceImageInformation><fileName>{_xml_text(os.path.basename(record["image"]))}</fileName></sourceImageInformation>\n',
+             '  </Description>\n  <Layout>\n',
+             f'    <Page ID="page_{record.get("page", 1)}" PHYSICAL_IMG_NR="{record.get("page", 1)}" WIDTH="{width}" HEIGHT="{height}">\n',
+             f'      <PrintSpace HPOS="0" VPOS="0" WIDTH="{width}" HEIGHT="{height}">\n']
+    for block_index, (_, boundary, lines) in enumerate(_blocks(record)):
+        polygon = _block_polygon(boundary, lines)
+        parts.append(f'        <TextBlock ID="block_{block_index}" {_box_attributes(polygon)}>\n'
+                     f'          <Shape><Polygon POINTS="{_alto_points(polygon)}"/></Shape>\n')
+        for index, line in lines:
+            polygon = _line_polygon(line)
+            box = _box_attributes(polygon)
+            parts.append(f'          <TextLine ID="line_{index}" {box} BASELINE="{_alto_points(line.get("baseline") or [])}">\n'
+                         f'            <Shape><Polygon POINTS="{_alto_points(polygon)}"/></Shape>\n'
+                         f'            <String CONTENT={_xml_attribute(line["text"])} {box}/>\n'
+                         '          </TextLine>\n')
+        parts.append('        </TextBlock>\n')
+    parts.append('      </PrintSpace>\n    </Page>\n  </Layout>\n</alto>\n')
+    return "".join(parts)
+
+def to_page_xml(record):
+    """PAGE XML (2019-07-15): منطقة نصية لكل كتلة مع ترتيب القراءة، وحدود كل سطر وخطه الأساسي ونصه."""
+    record = _complete_record(record)
+    now = time.strftime("%Y-%m-%dT%H:%M:%S")
+    blocks = _blocks(record)
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n',
+             f'<PcGts xmlns="{PAGE_NAMESPACE}">\n',
+             f'  <Metadata><Creator>kraken_gui</Creator><Created>{now}</Created><LastChange>{now}</LastChange></Metadata>\n',
+             f'  <Page imageFilename={_xml_attribute(os.path.basename(record["image"]))} '
+             f'imageWidth="{record["width"]}" imageHeight="{record["height"]}">\n',
+             '    <ReadingOrder><OrderedGroup id="reading_order">\n']
+    parts.extend(f'      <RegionRefIndexed index="{block_index}" regionRef="region_{block_index}"/>\n'
+                 for block_index in range(len(blocks)))
+    parts.append('    </OrderedGroup></ReadingOrder>\n')
+    for block_index, (_, boundary, lines) in enumerate(blocks):
+        parts.append(f'    <TextRegion id="region_{block_index}">\n'
+                     f'      <Coords points="{_page_points(_block_polygon(boundary, lines))}"/>\n')
+        for index, line in lines:
+            parts.append(f'      <TextLine id="line_{index}">\n'
+                         f'        <Coords points="{_page_points(_line_polygon(line))}"/>\n')
+            if line.get('baseline'):
+                parts.append(f'        <Baseline points="{_page_points(line["baseline"])}"/>\n')
+            parts.append(f'        <TextEquiv><Unicode>{_xml_text(line["text"])}</Unicode></TextEquiv>\n'
+                         '      </TextLine>\n')
+        parts.append('    </TextRegion>\n')
+    parts.append('  </Page>\n</PcGts>\n')
+    return "".join(parts)
+
+def to_hocr(record):
+    """hOCR: صفحة ocr_page، ومنطقة ocr_carea لكل كتلة، وسطر ocr_line بمستطيله المحيط."""
+    record = _complete_record(record)
+    page_number = record.get('page', 1)
+    image_name = json.dumps(os.path.basename(record['image']), ensure_ascii=False)
+    page_title = f"image {image_name}; bbox 0 0 {record['width']} {record['height']}; ppageno {page_number - 1}"
+    parts = ['<!DOCTYPE html>\n<html>\n<head>\n  <meta charset="utf-8"/>\n',
+             f'  <title>{_xml_text(os.path.basename(record["image"]))}</title>\n',
+             '  <meta name="ocr-system" content="kraken"/>\n',
+             '  <meta name="ocr-capabilities" content="ocr_page ocr_carea ocr_line"/>\n</head>\n<body>\n',
+             f'  <div class="ocr_page" id="page_{page_number}" title={_xml_attribute(page_title)}>\n']
+    for block_index, (_, boundary, lines) in enumerate(_blocks(record)):
+        x0, y0, x1, y1 = _bbox(_block_polygon(boundary, lines))
+        parts.append(f'    <div class="ocr_carea" id="block_{block_index}" title="bbox {x0} {y0} {x1} {y1}">\n')
+        for index, line in lines:
+            x0, y0, x1, y1 = _bbox(_line_polygon(line))
+            parts.append(f'      <span class="ocr_line" id="line_{index}" title="bbox {x0} {y0} {x1} {y1}">'
+                         f'{_xml_text(line["text"])}</span>\n')
+        parts.append('    </div>\n')
+    parts.append('  </div>\n</body>\n</html>\n')
+    return "".join(parts)
+
+def to_jsonl(record):
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+SERIALIZERS = {
+    'alto': to_alto,
+    'page': to_page_xml,
+    'hocr': to_hocr,
+    'jsonl': to_jsonl,
+}
+
+# ===================================================================================
+# Bulk Writer
+# ===================================================================================
+def archive_mode(target):
+    """امتداد الأرشيف المطابق لمسار الإخراج (.zip، .tar، .tar.gz، .tgz) أو None لمجلد."""
+    lowered = target.lower()
+    return next((suffix for suffix in sorted(ARCHIVE_MODES, key=len, reverse=True) if lowered.endswith(suffix)), None)
+
+class ExportWriter:
+    """
+    يكتب سجلات الصفحات بالصيغ المطلوبة فور توفرها إلى مجلد أو إلى أرشيف zip/tar، دون إعادة التعرف.
+    تحويل الصفحة إلى الصيغ يحدث في خيط المستدعي (فتتوازى صفحات الدفعة)، ثم تنتظر الملفات في الذاكرة
+    وتُكتب دفعة واحدة كل FLUSH_BYTES. سجلات jsonl تُجمع في ملف واحد (results.jsonl) يُضاف إلى الأرشيف عند الإغلاق.
+    """
+
+    def __init__(self, target, formats=('jsonl',), flush_bytes=FLUSH_BYTES):
+        unknown = [name for name in formats if name not in SERIALIZERS]
+        if unknown or not formats:
+            raise Exception(f"صيغة تصدير غير معروفة: {', '.join(unknown) or '(لا شيء)'}. الصيغ المتاحة: {', '.join(EXPORT_FORMATS)}")
+        self.target = target
+        self.formats = tuple(formats)
+        self.flush_bytes = flush_bytes
+        self.lock = threading.Lock()
+        self.pending = []
+        self.pending_bytes = 0
+        self.count = 0
+        self.archive = None
+        self.collection = None
+
+        mode = archive_mode(target)
+        if mode is None:
+            os.makedirs(target, exist_ok=True)
+            if 'jsonl' in self.formats:
+                self.collection = open(os.path.join(target, COLLECTION_NAME), 'wb', buffering=1024 * 1024)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+            if mode == '.zip':
+                self.archive = zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED)
+            else:
+                self.archive = tarfile.open(target, ARCHIVE_MODES[mode])
+            if 'jsonl' in self.formats:
+                # الأرشيف يكتب عضوًا واحدًا في كل مرة، فيُجمع ملف المجموعة جانبًا ويُضاف في النهاية
+                self.collection = tempfile.TemporaryFile()
+
+    def write(self, record):
+        """يضيف صفحة واحدة. آمن للاستدعاء من عدة خيوط."""
+        stem = record_stem(record)
+        members = [(stem + PAGE_FORMATS[name], SERIALIZERS[name](record).encode('utf-8'))
+                   for name in self.formats if name in PAGE_FORMATS]
+        collection_line = to_jsonl(record).encode('utf-8') if self.collection is not None else None
+        with self.lock:
+            if collection_line is not None:
+                self.collection.write(collection_line)
+            self.pending.extend(members)
+            self.pending_bytes += sum(len(data) for _, data in members)
+            self.count += 1
+            if self.pending_bytes >= self.flush_bytes:
+                self._flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        for name, data in self.pending:
+            self._write_member(name, data)
+        self.pending = []
+        self.pending_bytes = 0
+
+    def _write_member(self, name, data):
+        if self.archive is None:
+            with open(os.path.join(self.target, name), 'wb') as f:
+                f.write(data)
+        elif isinstance(self.archive, zipfile.ZipFile):
+            self.archive.writestr(name, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self.archive.addfile(info, io.BytesIO(data))
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            if self.archive is None:
+                if self.collection is not None:
+                    self.collection.close()
+                return
+            try:
+                if self.collection is not None:
+                    size = self.collection.tell()
+                    self.collection.seek(0)
+                    if isinstance(self.archive, zipfile.ZipFile):
+                        with self.archive.open(COLLECTION_NAME, 'w', force_zip64=True) as member:
+                            while chunk := self.collection.read(1024 * 1024):
+                                member.write(chunk)
+                    else:
+                        info = tarfile.TarInfo(COLLECTION_NAME)
+                        info.size = size
+                        info.mtime = int(time.time())
+                        self.archive.addfile(info, self.collection)
+                    self.collection.close()
+            finally:
+                self.archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def write_page(record, path, format_name):
+    """يحفظ صفحة واحدة بصيغة واحدة في الملف path."""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(SERIALIZERS[format_name](record))
+    return path
+
+# ===================================================================================
+# Re-export
+# ===================================================================================
+def read_records(sources):
+    """
+    يقرأ سجلات الصفحات المحفوظة: ملفات .jsonl (من --export jsonl أو 'kraken_cli ocr --format json')
+    وملفات .json التي حفظتها الواجهة. الملفات بلا أسطر متعرف عليها (مثل تجزئة الدفعات) تُتجاهل.
+    """
+    for source in sources:
+        paths = sorted(glob.glob(os.path.join(source, "*.json*"))) if os.path.isdir(source) else [source]
+        for path in paths:
+            if path.endswith(".jsonl"):
+                with open(path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        if line.strip():
+                            yield json.loads(line)
+            elif path.endswith(".json"):
+                with open(path, 'r', encoding='utf-8') as f:
+                    record = json.load(f)
+                if isinstance(record, dict) and 'lines' in record and 'image' in record:
+                    if record.get('page') is None:
+                        record.pop('page', None)
+                    yield record
+
+def export_records(progress_callback, records, target, formats):
+    """يكتب سجلات محفوظة بصيغ أخرى دون تشغيل kraken، ويعيد عدد الصفحات المصدرة."""
+    with ExportWriter(target, formats) as writer:
+        for record in records:
+            writer.write(record)
+            if writer.count % 1000 == 0:
+                progress_callback(f"تم تصدير {writer.count} صفحة")
+    return writer.count
+
+# ===================================================================================
+# Headless Entry Point
+# ===================================================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert saved OCR results (JSON lines) to ALTO, PAGE XML, hOCR or JSONL without re-running recognition.")
+    parser.add_argument("sources", nargs="+", help=".jsonl files, GUI .json saves, or directories containing them.")
+    parser.add_argument("-o", "--output", required=True, help="Output directory, or a .zip/.tar/.tar.gz archive.")
+    parser.add_argument("-f", "--format", action="append", choices=EXPORT_FORMATS, help="Export format (repeatable, default: alto).")
+    args = parser.parse_args(argv)
+
+    start_time = time.perf_counter()
+    count = export_records(lambda line: print(line, file=sys.stderr, flush=True), read_records(args.sources),
+                           args.output, args.format or ['alto'])
+    print(f"Exported {count} pages to {args.output} in {time.perf_counter() - start_time:.1f}s.")
+    return 0 if count else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,35 @@
 import sys
 import os
-import subprocess
 import json
+import time
+import heapq
+import itertools
+import threading
 import traceback
-from PIL import Image, ImageDraw
+import functools
 from PySide6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QGridLayout,
     QTabWidget, QLabel, QLineEdit, QPushButton, QTextEdit,
-    QScrollArea, QFileDialog, QMessageBox, QFrame
+    QFileDialog, QMessageBox, QFrame, QSpinBox, QCheckBox,
+    QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView, QListView, QComboBox, QDialog, QListWidget,
+    QListWidgetItem, QInputDialog
 )
-from PySide6.QtCore import Qt, QThread, QObject, Signal
-from PySide6.QtGui import QPixmap, QImage
-
-# --- للمساعدة في تحويل صور Pillow إلى QImage ---
-from PIL.ImageQt import ImageQt
+from PySide6.QtCore import Qt, QThread, QObject, Signal, QEvent, QTimer, QAbstractListModel, QModelIndex
+from PySide6.QtGui import QPixmap, QTextCursor, QColor
+
+# Pillow و numpy (المعاينة، الرسم فوق الصور، تحويل الصور إلى QImage) تُستورد عند أول استخدام
+# داخل الدوال التي تحتاجها، حتى تظهر النافذة قبل تحميلها
+import kraken_batch
+from kraken_document import MULTIPAGE_EXTENSIONS, page_count, page_label, page_stem
+from kraken_segmentation import (plan_incremental_recognition, merge_recognition, nearest_line, nearest_vertex,
+                                 reading_order_index)
+from kraken_engine import KrakenEngine, build_subprocess_env, default_line_workers, missing_kraken_tools, resolve_model_path
+from kraken_cache import ResultCache, CachedEngine
+from kraken_models import ModelRegistry, describe_entry
+from kraken_export import PAGE_FORMATS, page_record, write_page
+import kraken_training
+import kraken_sweep
+from kraken_trace import tracer, format_breakdown, default_trace_dir
 
 # ===================================================================================
 # Worker Class for Threading
@@ -23,7 +39,7 @@ class Worker(QObject):
     ينقل المهام الطويلة (مثل subprocess) إلى خيط منفصل لمنع تجميد الواجهة.
     """
     finished = Signal(dict)  # إشارة عند انتهاء المهمة بنجاح أو بفشل
-    progress = Signal(str)   # إشارة لإرسال تحديثات نصية (مثل سجل التدريب)
+    progress = Signal(object) # إشارة لإرسال تحديثات نصية (مثل سجل التدريب) أو أحداث منظمة (مثل سطر متعرف عليه)
 
     def __init__(self, task_function, *args, **kwargs):
         super().__init__()
@@ -47,6 +63,259 @@ class Worker(QObject):
             error_str = f"{str(e)}\n{traceback.format_exc()}"
             self.finished.emit({'success': False, 'error': error_str})
 
+# ===================================================================================
+# Job Scheduler
+# ===================================================================================
+JOB_PRIORITY_INTERACTIVE = 10 # معاينة الصور والتعرف على الصفحة المعروضة
+JOB_PRIORITY_NORMAL = 0
+JOB_PRIORITY_BACKGROUND = -10 # الدفعات والتدريب الطويل
+
+JOB_STATE_LABELS = {
+    'queued': "في الانتظار",
+    'running': "قيد التشغيل",
+    'cancelling': "جاري الإلغاء",
+    'done': "اكتملت",
+    'failed': "فشلت",
+    'cancelled': "أُلغيت",
+}
+
+class Job:
+    """مهمة واحدة في المجدول: الدالة ومعاملاتها، ومستقبل النتيجة والتقدم الخاص بها، وحالتها."""
+
+    def __init__(self, job_id, name, priority, task_function, args, on_finish_slot, progress_slot, cancellable):
+        self.id = job_id
+        self.name = name
+        self.priority = priority
+        self.task_function = task_function
+        self.args = args
+        self.on_finish_slot = on_finish_slot
+        self.progress_slot = progress_slot
+        self.cancellable = cancellable
+        self.cancel_event = threading.Event()
+        self.state = 'queued'
+        self.thread = None
+        self.worker = None
+        self.relay = None
+        self.started_at = None
+        self.finished_at = None
+
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+class _JobRelay(QObject):
+    """
+    يعيد توجيه إشارة انتهاء العامل إلى المجدول مع المهمة المعنية. الكائن يعيش في الخيط الرئيسي
+    فيُنفذ deliver هناك (الدوال المجهولة المربوطة بالإشارة تُنفذ في خيط العامل).
+    """
+
+    def __init__(self, scheduler, job):
+        super().__init__()
+        self.scheduler = scheduler
+        self.job = job
+
+    def deliver(self, result):
+        self.scheduler._on_job_finished(self.job, result)
+
+class JobScheduler(QObject):
+    """
+    يشغل المهام الطويلة على مجموعة محدودة من الخيوط مع طابور أولويات وإلغاء،
+    ويوجه تقدم كل مهمة إلى المستقبل الخاص بها فقط.
+    المهام القابلة للإلغاء تستقبل المعامل cancel_event (threading.Event) وعليها فحصه دوريًا.
+    """
+    jobs_changed = Signal()
+
+    MAX_FINISHED_HISTORY = 200
+
+    def __init__(self, max_workers=4, parent=None):
+        super().__init__(parent)
+        self.max_workers = max_workers
+        self.jobs = [] # كل المهام (لعرضها في لوحة المهام)
+        self.queue = [] # (-الأولوية، الرقم، المهمة)
+        self.running = {} # job.id -> job
+        self.job_ids = itertools.count(1)
+
+    def submit(self, name, task_function, on_finish_slot, *args, progress_slot=None,
+               priority=JOB_PRIORITY_NORMAL, cancellable=False):
+        job = Job(next(self.job_ids), name, priority, task_function, args,
+                  on_finish_slot, progress_slot, cancellable)
+        heapq.heappush(self.queue, (-priority, job.id, job))
+        self.jobs.append(job)
+        self._trim_history()
+        self._start_ready_jobs()
+        self.jobs_changed.emit()
+        return job
+
+    def set_max_workers(self, max_workers):
+        self.max_workers = max(1, max_workers)
+        self._start_ready_jobs()
+
+    def cancel(self, job):
+        if job.state == 'queued':
+            self.queue = [entry for entry in self.queue if entry[2] is not job]
+            heapq.heapify(self.queue)
+            job.state = 'cancelled'
+            self.jobs_changed.emit()
+            job.on_finish_slot({'success': False, 'cancelled': True, 'error': "تم إلغاء المهمة قبل بدئها."})
+        elif job.state == 'running':
+            # المهام غير القابلة للإلغاء تكمل عملها، لكن نتيجتها تُسلم كمهمة ملغاة
+            job.state = 'cancelling'
+            job.cancel_event.set()
+            self.jobs_changed.emit()
+
+    def shutdown(self, timeout_ms=5000):
+        """يلغي كل المهام وينتظر انتهاء الخيوط الجارية (عند إغلاق التطبيق)."""
+        for _, _, job in list(self.queue):
+            job.state = 'cancelled'
+        self.queue = []
+        for job in list(self.running.values()):
+            job.cancel_event.set()
+        for job in list(self.running.values()):
+            job.thread.quit()
+            job.thread.wait(timeout_ms)
+
+    def _start_ready_jobs(self):
+        while self.queue and len(self.running) < self.max_workers:
+            _, _, job = heapq.heappop(self.queue)
+            self._start_job(job)
+
+    def _start_job(self, job):
+        kwargs = {'cancel_event': job.cancel_event} if job.cancellable else {}
+        job.thread = QThread()
+        job.worker = Worker(job.task_function, *job.args, **kwargs)
+        job.worker.moveToThread(job.thread)
+
+        job.relay = _JobRelay(self, job)
+        job.thread.started.connect(job.worker.run)
+        job.worker.finished.connect(job.relay.deliver)
+        if job.progress_slot is not None:
+            job.worker.progress.connect(job.progress_slot)
+
+        job.worker.finished.connect(job.thread.quit)
+        job.worker.finished.connect(job.worker.deleteLater)
+        job.thread.finished.connect(job.thread.deleteLater)
+
+        job.state = 'running'
+        job.started_at = time.perf_counter()
+        self.running[job.id] = job
+        job.thread.start()
+
+    def _on_job_finished(self, job, result):
+        self.running.pop(job.id, None)
+        job.finished_at = time.perf_counter()
+        if job.cancel_event.is_set():
+            job.state = 'cancelled'
+            result = {'success': False, 'cancelled': True, 'error': "تم إلغاء المهمة."}
+        else:
+            job.state = 'done' if result['success'] else 'failed'
+        # لا نُسقط مراجع job.thread/job.worker هنا: الخيط لم يتوقف بعد، و deleteLater يتكفل بحذفهما
+
+        self._start_ready_jobs()
+        self.jobs_changed.emit()
+        job.on_finish_slot(result)
+
+    def _trim_history(self):
+        finished = [job for job in self.jobs if job.state in ('done', 'failed', 'cancelled')]
+        for job in finished[:max(0, len(finished) - self.MAX_FINISHED_HISTORY)]:
+            self.jobs.remove(job)
+
+# ===================================================================================
+# Training Pairs Model
+# ===================================================================================
+class TrainingPairListModel(QAbstractListModel):
+    """
+    قائمة أزواج التدريب للعرض في QListView: تُخزن المسارات في قائمتين متوازيتين بدلاً من عنصر واجهة لكل زوج،
+    ويرسم العرض الصفوف الظاهرة فقط، فتبقى الإضافة والإزالة والتصفية سريعة مع عشرات الآلاف من الأزواج.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.images = []
+        self.gts = []
+        self.known_images = set() # لتجاهل الأزواج المكررة عند الاستيراد
+        self.filter_text = ""
+        self.rows = None # فهارس الأزواج المطابقة للتصفية، أو None لعرض الكل
+
+    def count(self):
+        return len(self.images)
+
+    def pairs(self):
+        return [{'image': image, 'gt': gt} for image, gt in zip(self.images, self.gts)]
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.images) if self.rows is None else len(self.rows)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        source = index.row() if self.rows is None else self.rows[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return f"صورة: {os.path.basename(self.images[source])}    نص: {os.path.basename(self.gts[source])}"
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return f"{self.images[source]}\n{self.gts[source]}"
+        return None
+
+    def add_pairs(self, pairs):
+        """يضيف الأزواج غير الموجودة مسبقًا ويعيد عدد ما أُضيف."""
+        new_pairs = []
+        for pair in pairs:
+            if pair['image'] not in self.known_images:
+                self.known_images.add(pair['image'])
+                new_pairs.append(pair)
+        if not new_pairs:
+            return 0
+        if self.rows is not None:
+            self.beginResetModel()
+            self._append(new_pairs)
+            self.rows = self._matching_rows()
+            self.endResetModel()
+        else:
+            first = len(self.images)
+            self.beginInsertRows(QModelIndex(), first, first + len(new_pairs) - 1)
+            self._append(new_pairs)
+            self.endInsertRows()
+        return len(new_pairs)
+
+    def _append(self, pairs):
+        self.images.extend(pair['image'] for pair in pairs)
+        self.gts.extend(pair['gt'] for pair in pairs)
+
+    def remove_rows(self, rows):
+        """يزيل صفوف العرض المحددة (بعد التصفية) من القائمة."""
+        removed = {row if self.rows is None else self.rows[row] for row in rows}
+        if not removed:
+            return
+        self.beginResetModel()
+        kept = [i for i in range(len(self.images)) if i not in removed]
+        self.images = [self.images[i] for i in kept]
+        self.gts = [self.gts[i] for i in kept]
+        self.known_images = set(self.images)
+        if self.rows is not None:
+            self.rows = self._matching_rows()
+        self.endResetModel()
+
+    def clear(self):
+        self.beginResetModel()
+        self.images, self.gts, self.known_images = [], [], set()
+        if self.rows is not None:
+            self.rows = []
+        self.endResetModel()
+
+    def set_filter(self, text):
+        """يعرض فقط الأزواج التي يحتوي مسار صورتها أو نصها على text (دون تمييز حالة الأحرف)."""
+        self.beginResetModel()
+        self.filter_text = text.strip().lower()
+        self.rows = self._matching_rows() if self.filter_text else None
+        self.endResetModel()
+
+    def _matching_rows(self):
+        needle = self.filter_text
+        return [i for i, (image, gt) in enumerate(zip(self.images, self.gts))
+                if needle in image.lower() or needle in gt.lower()]
+
 # ===================================================================================
 # Main Application Window
 # ===================================================================================
@@ -64,15 +333,34 @@ class KrakenPySideApp(QWidget):
             self.base_path = os.path.dirname(os.path.abspath(__file__))
 
         # --- Shared Variables ---
-        self.thread = None
-        self.worker = None
+        self.jobs = JobScheduler(max_workers=4, parent=self)
+        self.engine = None
+        self.retired_engines = [] # محركات مسار Kraken السابق التي تُغلق في الخلفية
+        self.model_scan_engine = None # محرك مؤقت لقراءة كتابة النماذج الجديدة
+        self.result_cache = ResultCache()
+        try:
+            tracer.enable() # سجل JSONL دوّار لأزمنة المراحل في مجلد الذاكرة المؤقتة للمستخدم
+        except OSError as e:
+            print(f"Could not open trace file: {e}")
+        self.ocr_trace_records = [] # سجلات مراحل الصفحة الحالية لسطر الحالة
+        self.training_trace_records = []
         self.selected_file_path_ocr = ""
-        self.pil_original_image_ocr = None
+        self.selected_page_ocr = None # رقم الصفحة (من 0) في ملفات TIFF/PDF متعددة الصفحات، وإلا None
+        self.preview_ocr = None # نسخة مصغرة بدقة العرض؛ لا نحتفظ بالصورة الأصلية كاملة في الذاكرة
+        self.ocr_zoom_active = False
+        self.overlay_renderer = None # يعيد استخدام مخزن الرسم وهندسة التجزئة بين تحديثات الإبراز (يُنشأ عند أول رسم)
         self.segmentation_successful_ocr = False
-        self.temp_output_file_ocr = os.path.join(self.base_path, "kraken_temp_ocr_output.txt")
-        self.temp_segmentation_json_ocr = os.path.join(self.base_path, "kraken_temp_segmentation.json")
-        self.training_pairs = []
-        self.training_pair_widgets = [] # لتتبع واجهات أزواج التدريب
+        self.segmentation_data_ocr = None # نتيجة التجزئة تبقى في الذاكرة ولا تُكتب على القرص
+        self.recognized_lines_ocr = []
+        self.ocr_stream_start_time = None
+        self.ocr_edit_drag = None # السحب الجاري في وضع تحرير الخطوط الأساسية
+        self.ocr_incremental_plan = None # (الأسطر، فهارس المعدلة، النصوص المعاد استخدامها) أثناء إعادة التعرف الجزئي
+        self.training_pairs_model = TrainingPairListModel(self)
+        self.training_job = None
+        self.model_registry = ModelRegistry() # يُقرأ الفهرس المحفوظ فورًا، والبحث في المجلدات يجري في الخلفية
+        self.compare_dialog = None
+        self.compare_model_names = [] # أعمدة جدول المقارنة بالترتيب
+        self.compare_results = {} # اسم النموذج -> الأسطر المتعرف عليها
 
         # --- Main Layout ---
         self.main_layout = QVBoxLayout(self)
@@ -84,10 +372,24 @@ class KrakenPySideApp(QWidget):
         config_layout.addWidget(QLabel("مسار مجلد Kraken/Ketos:"))
         self.kraken_path_entry = QLineEdit()
         self.kraken_path_entry.setPlaceholderText("مثال: C:/Users/YourUser/kraken-env/Scripts")
+        self.kraken_path_entry.editingFinished.connect(self.on_kraken_path_edited)
         config_layout.addWidget(self.kraken_path_entry)
         browse_kraken_path_button = QPushButton("تصفح...")
         browse_kraken_path_button.clicked.connect(self.browse_kraken_path)
         config_layout.addWidget(browse_kraken_path_button)
+        self.use_cache_checkbox = QCheckBox("استخدام نتائج محفوظة مسبقًا")
+        self.use_cache_checkbox.setChecked(True)
+        config_layout.addWidget(self.use_cache_checkbox)
+        clear_cache_button = QPushButton("مسح الذاكرة المؤقتة")
+        clear_cache_button.clicked.connect(self.clear_result_cache)
+        config_layout.addWidget(clear_cache_button)
+        self.profile_checkbox = QCheckBox("حفظ ملفات cProfile")
+        self.profile_checkbox.setToolTip(f"تُحفظ في: {os.path.join(default_trace_dir(), 'profiles')}")
+        self.profile_checkbox.toggled.connect(self.toggle_profiling)
+        config_layout.addWidget(self.profile_checkbox)
+        self.engine_status_label = QLabel("")
+        self.engine_status_label.setStyleSheet("color: gray;")
+        config_layout.addWidget(self.engine_status_label)
         self.main_layout.addWidget(config_frame)
 
         # --- TabView ---
@@ -97,32 +399,208 @@ class KrakenPySideApp(QWidget):
         # --- Create Tabs ---
         self.ocr_tab = QWidget()
         self.training_tab = QWidget()
+        self.batch_tab = QWidget()
+        self.sweep_tab = QWidget()
+        self.jobs_tab = QWidget()
 
         self.tab_view.addTab(self.ocr_tab, "التعرف الضوئي (OCR)")
         self.tab_view.addTab(self.training_tab, "تدريب نموذج جديد")
+        self.tab_view.addTab(self.sweep_tab, "بحث المعاملات")
+        self.tab_view.addTab(self.batch_tab, "معالجة دفعة صفحات")
+        self.tab_view.addTab(self.jobs_tab, "المهام")
 
         # --- Populate Tabs ---
+        # تبويب التعرف (المعروض أولاً) وتبويب المهام (يتابع كل المهام) يُنشآن فورًا، والباقي عند أول فتح
         self.create_ocr_tab_widgets()
-        self.create_training_tab_widgets()
+        self.create_jobs_tab_widgets()
+        self.lazy_tabs = {
+            self.training_tab: self.create_training_tab_widgets,
+            self.sweep_tab: self.create_sweep_tab_widgets,
+            self.batch_tab: self.create_batch_tab_widgets,
+        }
+        self.tab_view.currentChanged.connect(lambda index: self.ensure_tab(self.tab_view.widget(index)))
+
+        # تجهيز المحرك بعد ظهور النافذة، فلا يدفع أول نقر على "استخراج النص" ثمن تشغيل kraken/torch
+        QTimer.singleShot(0, self.start_engine_setup)
+
+    def ensure_tab(self, tab):
+        """ينشئ عناصر التبويب عند أول فتح له (لا شيء إن كانت منشأة)."""
+        create = self.lazy_tabs.pop(tab, None)
+        if create is not None:
+            with tracer.span('startup.create_tab', tab=self.tab_view.tabText(self.tab_view.indexOf(tab))):
+                create()
 
     def browse_kraken_path(self):
         """يفتح حوار لاختيار المجلد الذي يحتوي على ملفات kraken و ketos التنفيذية."""
         directory = QFileDialog.getExistingDirectory(self, "اختر مجلد Kraken")
         if directory:
             self.kraken_path_entry.setText(directory)
+            self.start_engine_setup()
 
     def get_subprocess_env(self):
         """يُعد بيئة التشغيل للعمليات الفرعية مع إضافة مسار kraken المحدد."""
-        sub_env = os.environ.copy()
-        sub_env["PYTHONIOENCODING"] = "utf-8"
-        sub_env["PYTHONUTF8"] = "1"
-        
+        return build_subprocess_env(self.kraken_path_entry.text())
+
+    def get_engine(self):
+        """
+        يعيد محرك kraken المقيم، ويعيد إنشاءه إذا تغير مسار Kraken/Ketos.
+        عند تفعيل خيار النتائج المحفوظة يُغلف المحرك بالذاكرة المؤقتة.
+        """
         kraken_dir = self.kraken_path_entry.text()
-        if kraken_dir and os.path.isdir(kraken_dir):
-            # إضافة المسار المحدد إلى بداية متغير PATH
-            sub_env["PATH"] = f"{kraken_dir}{os.pathsep}{sub_env.get('PATH', '')}"
-        
-        return sub_env
+        if self.engine is None or self.engine.kraken_dir != kraken_dir:
+            if self.engine is not None:
+                self.retire_engine(self.engine)
+            # صفحة واحدة في كل مرة، فتُستخدم كل الأنوية للتعرف على أسطرها بالتوازي
+            self.engine = KrakenEngine(kraken_dir, line_workers=default_line_workers())
+        if self.use_cache_checkbox.isChecked():
+            return CachedEngine(self.engine, self.result_cache)
+        return self.engine
+
+    def retire_engine(self, engine):
+        """
+        يغلق المحرك السابق في الخلفية: الإغلاق ينتظر قفل المحرك حتى ينتهي أي طلب جارٍ عليه،
+        فلا يُستدعى من الخيط الرئيسي كي لا تتجمد الواجهة.
+        """
+        self.retired_engines.append(engine)
+        self.jobs.submit("إيقاف محرك Kraken السابق", lambda progress_callback, engine: engine.close(),
+                         functools.partial(self.on_engine_retired, engine), engine,
+                         priority=JOB_PRIORITY_BACKGROUND)
+
+    def on_engine_retired(self, engine, result):
+        if engine in self.retired_engines:
+            self.retired_engines.remove(engine)
+
+    def on_kraken_path_edited(self):
+        if self.kraken_path_entry.isModified():
+            self.kraken_path_entry.setModified(False)
+            self.start_engine_setup()
+
+    def start_engine_setup(self):
+        """عند بدء التطبيق أو تغيير مسار Kraken: تجهيز المحرك ثم تحديث فهرس النماذج، كلاهما في الخلفية."""
+        self.start_warm_up()
+        self.start_model_scan()
+
+    def start_warm_up(self):
+        """
+        في الخلفية: يتحقق من وجود kraken و ketos في المسار المحدد، ثم يشغل المحرك ويحمّل نموذج التجزئة
+        ونموذج التعرف المكتوب في تبويب التعرف. المحرك نفسه يتسلسل بقفل، فأي طلب يصل أثناء التجهيز ينتظر انتهاءه.
+        """
+        kraken_dir = self.kraken_path_entry.text()
+        self.engine_status_label.setText("المحرك: جاري التجهيز...")
+        self.jobs.submit("تجهيز محرك Kraken", self._perform_warm_up_task, self.on_warm_up_finished,
+                         self.get_engine(), kraken_dir, self.selected_ocr_model(),
+                         priority=JOB_PRIORITY_BACKGROUND)
+
+    def _perform_warm_up_task(self, progress_callback, engine, kraken_dir, model_name):
+        missing = missing_kraken_tools(kraken_dir)
+        if missing:
+            raise Exception(f"لم يتم العثور على {' و '.join(missing)} في مسار Kraken/Ketos أو PATH.")
+        # نموذج غير موجود لا يمنع تجهيز التجزئة؛ رسالة الخطأ تظهر عند التعرف كالمعتاد
+        model_name = model_name if model_name and resolve_model_path(model_name) else None
+        with tracer.span('startup.warm_up', model=model_name):
+            engine.warm_up(model_name)
+        return model_name
+
+    def on_warm_up_finished(self, result):
+        if not result['success']:
+            error_lines = [line for line in str(result['error']).splitlines() if line.strip()]
+            self.engine_status_label.setText(f"المحرك: {error_lines[0] if error_lines else 'خطأ'}")
+            self.engine_status_label.setToolTip(result['error'])
+            return
+        model_name = result['result']
+        self.engine_status_label.setText(f"المحرك: جاهز ({os.path.basename(model_name)} محمّل)" if model_name
+                                         else "المحرك: جاهز")
+        self.engine_status_label.setToolTip("")
+
+    # --- Model registry ---
+    def selected_ocr_model(self):
+        """مسار النموذج المختار من القائمة، أو النص المكتوب كما هو (اسم في مجلد بيانات kraken أو مسار)."""
+        text = self.ocr_model_combo.currentText().strip()
+        index = self.ocr_model_combo.findText(text)
+        if index >= 0 and self.ocr_model_combo.itemData(index):
+            return self.ocr_model_combo.itemData(index)
+        if text and resolve_model_path(text) is None:
+            # اسم مجرد لا يجده kraken: أول نموذج بنفس الاسم في المجلدات المسجلة
+            entry = self.model_registry.find(text)
+            if entry is not None:
+                return entry['path']
+        return text
+
+    def populate_model_combo(self, models):
+        current = self.ocr_model_combo.currentText()
+        current_model = self.selected_ocr_model() if self.ocr_model_combo.count() else current
+        self.ocr_model_combo.blockSignals(True)
+        self.ocr_model_combo.clear()
+        for entry in models:
+            self.ocr_model_combo.addItem(describe_entry(entry), entry['path'])
+            self.ocr_model_combo.setItemData(self.ocr_model_combo.count() - 1,
+                                             f"{entry['path']}\nsha256: {entry['hash'][:16]}…",
+                                             Qt.ItemDataRole.ToolTipRole)
+        # وصف النموذج قد يتغير بعد قراءة كتابته، فيُعاد اختياره بمساره لا بنصه
+        index = self.ocr_model_combo.findData(current_model)
+        if index >= 0:
+            self.ocr_model_combo.setCurrentIndex(index)
+        else:
+            self.ocr_model_combo.setEditText(current)
+        self.ocr_model_combo.blockSignals(False)
+
+    def add_model_directory(self):
+        directory = QFileDialog.getExistingDirectory(self, "اختر مجلد نماذج التعرف")
+        if directory:
+            self.model_registry.add_directory(directory)
+            self.start_model_scan()
+
+    def start_model_scan(self):
+        self.jobs.submit("البحث عن نماذج التعرف", self._perform_model_scan_task, self.on_model_scan_finished,
+                         self.kraken_path_entry.text(), priority=JOB_PRIORITY_BACKGROUND)
+
+    def _perform_model_scan_task(self, progress_callback, kraken_dir):
+        self.model_registry.scan(kraken_dir)
+        # قراءة كتابة النماذج الجديدة فقط تحتاج إلى تحميلها، ونتيجتها تُحفظ في الفهرس. تُقرأ بمحرك مؤقت
+        # خاص بالبحث (لا يُشغل إلا إذا وُجدت نماذج جديدة) حتى لا تنتظر طلبات التعرف خلفه على المحرك المشترك
+        engine = self.model_scan_engine = KrakenEngine(kraken_dir)
+        try:
+            return self.model_registry.describe(engine, progress_callback)
+        finally:
+            engine.close()
+
+    def on_model_scan_finished(self, result):
+        if not result['success']:
+            print(f"Model scan failed: {result['error']}")
+            return
+        self.populate_model_combo(result['result'])
+
+    def preload_selected_model(self):
+        """يحمّل النموذج المختار في مجموعة النماذج المقيمة في الخلفية، فيبدأ التعرف به دون انتظار تحميله."""
+        model_name = self.selected_ocr_model()
+        self.engine_status_label.setText(f"المحرك: جاري تحميل {os.path.basename(model_name)}...")
+        self.jobs.submit(f"تحميل النموذج {os.path.basename(model_name)}",
+                         lambda progress_callback, engine: engine.preload_models([model_name]),
+                         self.on_model_preloaded, self.get_engine(), priority=JOB_PRIORITY_BACKGROUND)
+
+    def on_model_preloaded(self, result):
+        if result['success']:
+            self.engine_status_label.setText(f"المحرك: جاهز ({os.path.basename(result['result'][-1])} محمّل)")
+            self.engine_status_label.setToolTip("")
+        else:
+            self.engine_status_label.setText("المحرك: تعذر تحميل النموذج")
+            self.engine_status_label.setToolTip(result['error'])
+
+    def toggle_profiling(self, enabled):
+        tracer.set_profiling(os.path.join(default_trace_dir(), "profiles") if enabled else None)
+
+    def clear_result_cache(self):
+        reply = QMessageBox.question(self, "تأكيد", "هل تريد حذف جميع نتائج التجزئة والتعرف المحفوظة؟", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+        if reply == QMessageBox.StandardButton.Yes:
+            self.result_cache.clear()
+
+    def closeEvent(self, event):
+        # إيقاف عمليات المحركات أولاً دون قفلها، فتفشل طلباتها الجارية فورًا ولا ينتظرها الإغلاق
+        for engine in self.retired_engines + [self.engine, self.model_scan_engine]:
+            if engine is not None:
+                engine.terminate()
+        self.jobs.shutdown()
+        super().closeEvent(event)
 
     # ===================================================================================
     # OCR TAB WIDGETS AND LOGIC
@@ -140,6 +618,17 @@ class KrakenPySideApp(QWidget):
         browse_button = QPushButton("تصفح...")
         browse_button.clicked.connect(self.browse_file_ocr)
         file_layout.addWidget(browse_button)
+        # تظهر عند فتح مستند متعدد الصفحات؛ تُحمّل الصفحة المختارة وحدها
+        self.ocr_page_label = QLabel("الصفحة:")
+        file_layout.addWidget(self.ocr_page_label)
+        self.ocr_page_spinbox = QSpinBox()
+        self.ocr_page_spinbox.setMinimum(1)
+        self.ocr_page_spinbox.setKeyboardTracking(False)
+        self.ocr_page_spinbox.valueChanged.connect(self.select_ocr_page)
+        file_layout.addWidget(self.ocr_page_spinbox)
+        self.ocr_page_count_label = QLabel("")
+        file_layout.addWidget(self.ocr_page_count_label)
+        self.set_ocr_page_count(1)
         layout.addWidget(file_frame, 0, 0)
 
         # --- Controls frame ---
@@ -150,14 +639,48 @@ class KrakenPySideApp(QWidget):
         controls_layout.addWidget(self.ocr_segment_button)
 
         controls_layout.addWidget(QLabel("نموذج التعرف:"))
-        self.ocr_model_name_entry = QLineEdit("arabic_best.mlmodel")
-        controls_layout.addWidget(self.ocr_model_name_entry)
+        self.ocr_model_combo = QComboBox()
+        self.ocr_model_combo.setEditable(True) # يمكن كتابة اسم نموذج في مجلد بيانات kraken مباشرة
+        self.ocr_model_combo.setMinimumContentsLength(24)
+        self.populate_model_combo(self.model_registry.list())
+        self.ocr_model_combo.setEditText("arabic_best.mlmodel")
+        self.ocr_model_combo.activated.connect(self.preload_selected_model)
+        controls_layout.addWidget(self.ocr_model_combo)
+        add_model_dir_button = QPushButton("مجلد نماذج...")
+        add_model_dir_button.setToolTip("إضافة مجلد يُبحث فيه عن ملفات .mlmodel (مع المجلدات الفرعية)")
+        add_model_dir_button.clicked.connect(self.add_model_directory)
+        controls_layout.addWidget(add_model_dir_button)
 
         self.ocr_run_button = QPushButton("2. استخراج النص")
         self.ocr_run_button.setEnabled(False)
         self.ocr_run_button.clicked.connect(self.start_ocr_after_segmentation)
         controls_layout.addWidget(self.ocr_run_button)
+
+        self.ocr_review_baselines_checkbox = QCheckBox("مراجعة الخطوط الأساسية قبل استخراج النص")
+        self.ocr_review_baselines_checkbox.toggled.connect(self.update_segment_button_text)
+        controls_layout.addWidget(self.ocr_review_baselines_checkbox)
+
+        self.ocr_edit_baselines_checkbox = QCheckBox("تحرير الخطوط الأساسية")
+        self.ocr_edit_baselines_checkbox.setToolTip("على الصورة المجزأة: اسحب نقطة لتحريكها، Shift+سحب لرسم خط أساسي جديد، "
+                                                    "والنقر بالزر الأيمن على خط لحذفه")
+        controls_layout.addWidget(self.ocr_edit_baselines_checkbox)
+
+        self.ocr_reocr_button = QPushButton("إعادة التعرف على الأسطر المعدلة")
+        self.ocr_reocr_button.setEnabled(False)
+        self.ocr_reocr_button.clicked.connect(self.start_incremental_ocr)
+        controls_layout.addWidget(self.ocr_reocr_button)
+
+        self.ocr_compare_button = QPushButton("مقارنة النماذج...")
+        self.ocr_compare_button.setEnabled(False)
+        self.ocr_compare_button.clicked.connect(self.open_model_comparison)
+        controls_layout.addWidget(self.ocr_compare_button)
+
+        self.ocr_export_button = QPushButton("حفظ النتائج...")
+        self.ocr_export_button.setEnabled(False)
+        self.ocr_export_button.clicked.connect(self.export_ocr_results)
+        controls_layout.addWidget(self.ocr_export_button)
         layout.addWidget(controls_frame, 1, 0)
+        self.update_segment_button_text()
 
         # --- Image display frame ---
         image_display_frame = QFrame()
@@ -167,13 +690,28 @@ class KrakenPySideApp(QWidget):
         self.ocr_original_image_label.setMinimumSize(250, 250)
         self.ocr_original_image_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.ocr_original_image_label.setFrameShape(QFrame.Shape.StyledPanel)
+        self.ocr_original_image_label.setToolTip("انقر على الصورة لعرض المنطقة بالدقة الكاملة، وانقر مرة أخرى للعودة")
+        self.ocr_original_image_label.installEventFilter(self)
         image_display_layout.addWidget(self.ocr_original_image_label, 1, 0)
 
-        image_display_layout.addWidget(QLabel("الصورة المجزأة:"), 0, 1, Qt.AlignmentFlag.AlignBottom)
+        overlay_layers_frame = QFrame()
+        overlay_layers_layout = QHBoxLayout(overlay_layers_frame)
+        overlay_layers_layout.setContentsMargins(0, 0, 0, 0)
+        overlay_layers_layout.addWidget(QLabel("الصورة المجزأة:"))
+        overlay_layers_layout.addStretch()
+        self.ocr_overlay_layer_checkboxes = {}
+        for layer, title in (('baselines', "الخطوط الأساسية"), ('boundaries', "حدود الأسطر"), ('regions', "المناطق")):
+            checkbox = QCheckBox(title)
+            checkbox.setChecked(layer == 'baselines') # DEFAULT_LAYERS في kraken_overlay
+            checkbox.toggled.connect(lambda _checked: self.show_segmentation_overlay())
+            overlay_layers_layout.addWidget(checkbox)
+            self.ocr_overlay_layer_checkboxes[layer] = checkbox
+        image_display_layout.addWidget(overlay_layers_frame, 0, 1, Qt.AlignmentFlag.AlignBottom)
         self.ocr_segmented_image_label = QLabel("لم يتم إنشاء صورة مجزأة")
         self.ocr_segmented_image_label.setMinimumSize(250, 250)
         self.ocr_segmented_image_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.ocr_segmented_image_label.setFrameShape(QFrame.Shape.StyledPanel)
+        self.ocr_segmented_image_label.installEventFilter(self)
         image_display_layout.addWidget(self.ocr_segmented_image_label, 1, 1)
         layout.addWidget(image_display_frame, 2, 0)
 
@@ -186,163 +724,622 @@ class KrakenPySideApp(QWidget):
         # --- Status label ---
         self.ocr_status_label = QLabel("الحالة: جاهز")
         layout.addWidget(self.ocr_status_label, 5, 0)
+        self.ocr_timing_label = QLabel("")
+        self.ocr_timing_label.setStyleSheet("color: gray;")
+        layout.addWidget(self.ocr_timing_label, 6, 0)
         
         layout.setRowStretch(2, 2) # Image frame
         layout.setRowStretch(4, 1) # Result textbox
 
     def display_image(self, label_widget, pil_image):
+        """يعرض صورة (عادة نسخة المعاينة المصغرة أو الصورة المجزأة المرسومة بحجم العرض) بحجم العنصر."""
         if pil_image is None:
             label_widget.setText("لا توجد صورة")
             label_widget.setPixmap(QPixmap()) # Clear image
             return
 
         try:
-            q_image = ImageQt(pil_image)
-            pixmap = QPixmap.fromImage(q_image)
-            scaled_pixmap = pixmap.scaled(label_widget.size(), Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-            label_widget.setPixmap(scaled_pixmap)
+            with tracer.span('render.display_image', breakdown_key='render', profile=True, size=list(pil_image.size)):
+                from PIL.ImageQt import ImageQt
+                q_image = ImageQt(pil_image)
+                pixmap = QPixmap.fromImage(q_image)
+                if pixmap.size() != pixmap.size().scaled(label_widget.size(), Qt.AspectRatioMode.KeepAspectRatio):
+                    pixmap = pixmap.scaled(label_widget.size(), Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
+                label_widget.setPixmap(pixmap)
         except Exception as e:
             print(f"Error displaying image: {e}")
             label_widget.setText("خطأ في عرض الصورة")
 
+    def eventFilter(self, watched, event):
+        if watched is self.ocr_original_image_label and event.type() == QEvent.Type.MouseButtonPress:
+            self.toggle_ocr_zoom(event.position())
+            return True
+        if event.type() in (QEvent.Type.MouseButtonPress, QEvent.Type.MouseMove, QEvent.Type.MouseButtonRelease) and \
+                watched is self.ocr_segmented_image_label and self.ocr_edit_baselines_checkbox.isChecked():
+            return self.edit_baselines(event)
+        return super().eventFilter(watched, event)
+
+    def toggle_ocr_zoom(self, position):
+        """يبدل بين المعاينة المصغرة ومنطقة بالدقة الكاملة حول نقطة النقر (تُفك بلاطاتها فقط)."""
+        if self.preview_ocr is None:
+            return
+        if self.ocr_zoom_active:
+            self.ocr_zoom_active = False
+            self.display_image(self.ocr_original_image_label, self.preview_ocr.proxy)
+            return
+
+        label = self.ocr_original_image_label
+        pixmap = label.pixmap()
+        if pixmap is None or pixmap.isNull():
+            return
+        # تحويل نقطة النقر من إحداثيات العنصر إلى إحداثيات الصورة الأصلية
+        factor = pixmap.width() / self.preview_ocr.original_size[0]
+        x = (position.x() - (label.width() - pixmap.width()) / 2) / factor
+        y = (position.y() - (label.height() - pixmap.height()) / 2) / factor
+        half_width, half_height = label.width() // 2, label.height() // 2
+        box = (int(x) - half_width, int(y) - half_height, int(x) + half_width, int(y) + half_height)
+
+        try:
+            region = self.preview_ocr.region(box)
+            self.display_image(label, region.convert("RGB"))
+            self.ocr_zoom_active = True
+        except Exception as e:
+            print(f"Error decoding zoom region: {e}")
+
     def browse_file_ocr(self):
-        file_path, _ = QFileDialog.getOpenFileName(self, "اختر ملف صورة للتعرف", "", "ملفات الصور (*.png *.jpg *.jpeg *.bmp *.tiff);;All files (*.*)")
+        file_path, _ = QFileDialog.getOpenFileName(self, "اختر ملف صورة للتعرف", "", "ملفات الصور والمستندات (*.png *.jpg *.jpeg *.bmp *.tif *.tiff *.pdf);;All files (*.*)")
         if file_path:
             self.selected_file_path_ocr = file_path
             self.ocr_file_path_entry.setText(os.path.basename(file_path))
-            
-            self.ocr_result_textbox.clear()
-            self.update_status_ocr("الحالة: جاهز")
-            self.segmentation_successful_ocr = False
-            self.ocr_run_button.setEnabled(False)
+            self.set_ocr_page_count(1)
+            self.load_ocr_page(None)
+
+    def select_ocr_page(self, page_number):
+        if self.selected_file_path_ocr and page_number - 1 != self.selected_page_ocr:
+            self.load_ocr_page(page_number - 1)
+
+    def set_ocr_page_count(self, count):
+        self.ocr_page_spinbox.blockSignals(True)
+        self.ocr_page_spinbox.setMaximum(max(1, count))
+        self.ocr_page_spinbox.setValue((self.selected_page_ocr or 0) + 1)
+        self.ocr_page_spinbox.blockSignals(False)
+        self.ocr_page_count_label.setText(f"من {count}")
+        for widget in (self.ocr_page_label, self.ocr_page_spinbox, self.ocr_page_count_label):
+            widget.setVisible(count > 1)
+
+    def load_ocr_page(self, page):
+        """يعيد ضبط حالة التعرف ويحمّل معاينة صفحة واحدة فقط من الملف المختار (الصفحات الأخرى لا تُفك)."""
+        file_path = self.selected_file_path_ocr
+        self.selected_page_ocr = page
 
-            try:
-                self.pil_original_image_ocr = Image.open(self.selected_file_path_ocr)
-                self.display_image(self.ocr_original_image_label, self.pil_original_image_ocr)
-            except Exception as e:
-                QMessageBox.critical(self, "خطأ في الصورة", f"لا يمكن تحميل الصورة الأصلية: {e}")
-                self.pil_original_image_ocr = None
-                self.display_image(self.ocr_original_image_label, None)
+        self.ocr_result_textbox.clear()
+        self.update_status_ocr("الحالة: جاهز")
+        self.segmentation_successful_ocr = False
+        self.segmentation_data_ocr = None
+        self.recognized_lines_ocr = []
+        self.ocr_run_button.setEnabled(False)
+        self.ocr_compare_button.setEnabled(False)
+        self.ocr_reocr_button.setEnabled(False)
+        self.ocr_export_button.setEnabled(False)
 
-            self.display_image(self.ocr_segmented_image_label, None)
-            self.ocr_segmented_image_label.setText("لم يتم إنشاء صورة مجزأة بعد")
+        self.ocr_zoom_active = False
+        self.preview_ocr = None
+        self.display_image(self.ocr_original_image_label, None)
+        self.ocr_original_image_label.setText("جاري تحميل المعاينة...")
+        self.jobs.submit(f"معاينة {page_label(file_path, page)}", self._perform_preview_task,
+                         self.on_preview_loaded, file_path, page, priority=JOB_PRIORITY_INTERACTIVE)
+
+        self.display_image(self.ocr_segmented_image_label, None)
+        self.ocr_segmented_image_label.setText("لم يتم إنشاء صورة مجزأة بعد")
+
+    def _perform_preview_task(self, progress_callback, image_path, page):
+        from kraken_preview import build_preview
+        pages = page_count(image_path) if image_path.lower().endswith(MULTIPAGE_EXTENSIONS) else 1
+        return build_preview(image_path, page=page), pages
+
+    def on_preview_loaded(self, result):
+        if not result['success']:
+            if not result.get('cancelled'):
+                QMessageBox.critical(self, "خطأ في الصورة", f"لا يمكن تحميل الصورة الأصلية: {result['error']}")
+                self.display_image(self.ocr_original_image_label, None)
+            return
+        preview, pages = result['result']
+        if preview.image_path != self.selected_file_path_ocr or preview.page != self.selected_page_ocr:
+            return # اختار المستخدم صورة أو صفحة أخرى قبل انتهاء التحميل
+        if pages > 1 and self.selected_page_ocr is None:
+            # أول فتح لمستند متعدد الصفحات: الصفحة المعروضة هي الأولى
+            self.selected_page_ocr = preview.page = 0
+        self.set_ocr_page_count(pages)
+        self.preview_ocr = preview
+        self.display_image(self.ocr_original_image_label, preview.proxy)
+        if self.segmentation_data_ocr is not None:
+            self.show_segmentation_overlay()
 
     def update_status_ocr(self, message):
         self.ocr_status_label.setText(message)
 
+    def update_ocr_timings(self):
+        self.ocr_timing_label.setText(format_breakdown(self.ocr_trace_records))
+
+    def _traced_ocr_task(self, progress_callback, stage, image_path, page, function):
+        """
+        يشغل مرحلة OCR داخل span ويرسل كل سجلاتها (بما فيها أزمنة المحرك) إلى الواجهة
+        كحدث {'event': 'trace'} حتى تُعرض في سطر الحالة، حتى عند الفشل.
+        كل حدث يُوسم بالصورة والصفحة اللتين بدأت بهما المهمة، فتهمل الواجهة أحداث صفحة لم تعد معروضة.
+        function تستقبل دالة إرسال الأحداث الموسومة.
+        """
+        def emit(event):
+            progress_callback({**event, 'image_path': image_path, 'page': page})
+
+        with tracer.collect() as records:
+            try:
+                with tracer.span(stage, profile=True, image=os.path.basename(image_path)):
+                    return function(emit)
+            finally:
+                emit({'event': 'trace', 'records': records})
+
+    def is_current_ocr_page(self, image_path, page):
+        """
+        هل ما زالت الصفحة التي بدأت بها المهمة معروضة؟ نتائج صفحة أخرى (اختار المستخدم ملفًا أو صفحة
+        غيرها أثناء انتظار المهمة أو تشغيلها) لا تُرسم على الصورة الحالية ولا تُكتب في حالتها.
+        الصفحة None والصفحة 0 هما نفس الصفحة الأولى (رقم الصفحة يُعرف بعد تحميل المعاينة).
+        """
+        return image_path == self.selected_file_path_ocr and (page or 0) == (self.selected_page_ocr or 0)
+
+    def update_segment_button_text(self):
+        if self.ocr_review_baselines_checkbox.isChecked():
+            self.ocr_segment_button.setText("1. تجزئة الصورة")
+        else:
+            self.ocr_segment_button.setText("1. تجزئة واستخراج النص")
+
     def start_segmentation(self):
         if not self.selected_file_path_ocr:
             QMessageBox.critical(self, "خطأ", "يرجى تحديد ملف صورة أولاً.")
             return
+        review_baselines = self.ocr_review_baselines_checkbox.isChecked()
+        model_name = self.selected_ocr_model()
+        if not review_baselines and not model_name:
+            QMessageBox.critical(self, "خطأ", "يرجى إدخال اسم نموذج التعرف.")
+            return
             
         self.ocr_segment_button.setEnabled(False)
         self.ocr_run_button.setEnabled(False)
-        self.update_status_ocr("الحالة: جاري تجزئة الصورة، يرجى الانتظار...")
+        self.ocr_compare_button.setEnabled(False)
+        self.ocr_reocr_button.setEnabled(False)
+        self.ocr_export_button.setEnabled(False)
         self.ocr_result_textbox.clear()
         self.display_image(self.ocr_segmented_image_label, None)
         self.ocr_segmented_image_label.setText("جاري إنشاء الصورة المجزأة...")
         self.segmentation_successful_ocr = False
-
-        self.run_long_task(self._perform_segmentation_task, self.on_segmentation_finished)
-
-    def _perform_segmentation_task(self, progress_callback):
-        image_path = self.selected_file_path_ocr
-        segment_command = ["kraken", "-i", image_path, self.temp_segmentation_json_ocr, "segment"]
-        
-        process = subprocess.run(segment_command, capture_output=True, text=True, 
-                                 encoding='utf-8', errors='replace', check=False, 
-                                 env=self.get_subprocess_env())
-        
-        if process.returncode != 0:
-            error_message = f"فشل تجزئة OCR:\nCode: {process.returncode}\nStderr:\n{process.stderr}"
-            raise Exception(error_message)
-        
-        return None # لا نحتاج لإعادة قيمة هنا
-
-    def on_segmentation_finished(self, result):
+        self.segmentation_data_ocr = None
+        self.recognized_lines_ocr = []
+        self.ocr_trace_records = []
+        self.update_ocr_timings()
+
+        # الصفحة تُحدد عند الإرسال لا عند تشغيل المهمة، فلا يغيرها اختيار صفحة أخرى أثناء الانتظار
+        image_path, page = self.selected_file_path_ocr, self.selected_page_ocr
+        if review_baselines:
+            self.update_status_ocr("الحالة: جاري تجزئة الصورة، يرجى الانتظار...")
+            self.jobs.submit(f"تجزئة {page_label(image_path, page)}",
+                             self._perform_segmentation_task,
+                             functools.partial(self.on_segmentation_finished, image_path, page), self.get_engine(),
+                             image_path, page, progress_slot=self.on_ocr_progress, priority=JOB_PRIORITY_INTERACTIVE)
+        else:
+            self.update_status_ocr("الحالة: جاري تجزئة الصورة واستخراج النص، يرجى الانتظار...")
+            self.ocr_stream_start_time = time.perf_counter()
+            self.jobs.submit(f"تجزئة وتعرف {page_label(image_path, page)}",
+                             self._perform_segment_and_ocr_task,
+                             functools.partial(self.on_segment_and_ocr_finished, image_path, page),
+                             self.get_engine(), model_name, image_path, page, progress_slot=self.on_ocr_progress,
+                             priority=JOB_PRIORITY_INTERACTIVE)
+
+    def _perform_segmentation_task(self, progress_callback, engine, image_path, page):
+        return self._traced_ocr_task(progress_callback, 'ocr.segmentation_task', image_path, page,
+                                     lambda emit: engine.segment(image_path, page))
+
+    def _perform_segment_and_ocr_task(self, progress_callback, engine, model_name, image_path, page):
+        return self._traced_ocr_task(progress_callback, 'ocr.segment_and_ocr_task', image_path, page,
+                                     lambda emit: engine.segment_and_recognize(image_path, model_name,
+                                                                               on_event=emit, page=page))
+
+    def on_segmentation_finished(self, image_path, page, result):
         self.ocr_segment_button.setEnabled(True)
+        if not self.is_current_ocr_page(image_path, page):
+            return
         if not result['success']:
             self.ocr_result_textbox.setText(result['error'])
             self.update_status_ocr("الحالة: خطأ في تجزئة الصورة.")
             self.segmentation_successful_ocr = False
             return
 
+        self.segmentation_data_ocr = result['result']
         self.segmentation_successful_ocr = True
         self.update_status_ocr("الحالة: اكتملت التجزئة. جاهز لاستخراج النص.")
         self.ocr_run_button.setEnabled(True)
-        
+        self.ocr_compare_button.setEnabled(True)
+        self.show_segmentation_overlay()
+
+    def on_segment_and_ocr_finished(self, image_path, page, result):
+        self.ocr_segment_button.setEnabled(True)
+        if not self.is_current_ocr_page(image_path, page):
+            return
+        if not result['success']:
+            self.ocr_result_textbox.setText(result['error'])
+            self.update_status_ocr("الحالة: خطأ في تجزئة الصورة أو التعرف الضوئي.")
+            self.segmentation_successful_ocr = False
+            return
+
+        self.segmentation_data_ocr = result['result']['segmentation']
+        self.segmentation_successful_ocr = True
+        self.ocr_run_button.setEnabled(True)
+        self.ocr_compare_button.setEnabled(True)
+        self.show_segmentation_overlay()
+        self.show_recognized_lines(result['result']['lines'])
+        self.update_status_ocr("الحالة: اكتمل التعرف الضوئي بنجاح!")
+
+    def show_segmentation_overlay(self, highlight_index=None):
+        """يرسم طبقات التجزئة المختارة، ويبرز حدود السطر highlight_index (آخر سطر متعرف عليه) بالأزرق."""
+        if self.preview_ocr is None:
+            return
         try:
-            with open(self.temp_segmentation_json_ocr, 'r', encoding='utf-8') as f:
-                segmentation_data = json.load(f)
-            
-            image_to_draw_on = self.pil_original_image_ocr.copy().convert("RGB")
-            draw = ImageDraw.Draw(image_to_draw_on)
-            
-            lines_to_draw = segmentation_data.get("lines", [])
-            for line_info in lines_to_draw:
-                polygon = line_info.get("baseline")
-                if polygon and isinstance(polygon, list) and len(polygon) > 1:
-                    flat_polygon = [coord for point in polygon for coord in point]
-                    if len(flat_polygon) >= 4:
-                        draw.polygon(flat_polygon, outline="red", width=2)
-
-            self.display_image(self.ocr_segmented_image_label, image_to_draw_on)
+            with tracer.collect(self.ocr_trace_records):
+                self._draw_segmentation_overlay(highlight_index)
+            self.update_ocr_timings()
         except Exception as e:
             self.update_status_ocr("الحالة: خطأ في رسم الصورة المجزأة.")
             print(f"Error drawing segmented image: {e}")
 
+    def _draw_segmentation_overlay(self, highlight_index):
+        layers = [layer for layer, checkbox in self.ocr_overlay_layer_checkboxes.items() if checkbox.isChecked()]
+        with tracer.span('render.segmentation_overlay', breakdown_key='render', highlight_index=highlight_index,
+                         layers=layers):
+            # الرسم بحجم العنصر مباشرة، فلا يُعاد تحجيم الصورة بعد رسم الخطوط
+            proxy = self.preview_ocr.proxy
+            label = self.ocr_segmented_image_label
+            fit = min(label.width() / proxy.width, label.height() / proxy.height)
+            size = (max(1, round(proxy.width * fit)), max(1, round(proxy.height * fit)))
+            if self.overlay_renderer is None:
+                from kraken_overlay import OverlayRenderer
+                self.overlay_renderer = OverlayRenderer()
+            canvas = self.overlay_renderer.render(proxy, self.segmentation_data_ocr, self.preview_ocr.original_size[0],
+                                                  size, layers, highlight_index)
+            self.display_image(label, canvas)
+
+    def invalidate_overlay(self):
+        """يُستدعى بعد تعديل التجزئة في مكانها حتى يعيد المُرسِم حساب هندستها."""
+        if self.overlay_renderer is not None:
+            self.overlay_renderer.invalidate()
+
+    def on_ocr_progress(self, event):
+        """يستقبل أحداث التعرف المتدفقة: التجزئة أولاً ثم كل سطر فور التعرف عليه، ثم سجلات أزمنة المراحل."""
+        if not self.is_current_ocr_page(event.get('image_path'), event.get('page')):
+            return
+        if event.get('event') == 'trace':
+            self.ocr_trace_records.extend(event['records'])
+            self.update_ocr_timings()
+        elif event.get('event') == 'segmentation':
+            self.segmentation_data_ocr = event['segmentation']
+            self.show_segmentation_overlay()
+            self.update_status_ocr("الحالة: اكتملت التجزئة، جاري التعرف على الأسطر...")
+        elif event.get('event') == 'line':
+            index, total = event['index'], event['total']
+            self.recognized_lines_ocr.append(event['line'])
+            self.ocr_result_textbox.append(event['line']['text'])
+            if self.segmentation_data_ocr is not None:
+                self.show_segmentation_overlay(highlight_index=index)
+            elapsed = time.perf_counter() - self.ocr_stream_start_time
+            rate = (index + 1) / elapsed if elapsed > 0 else 0.0
+            self.update_status_ocr(f"الحالة: تم التعرف على السطر {index + 1} من {total} ({rate:.1f} سطر/ث)")
+
+    def show_recognized_lines(self, lines):
+        self.recognized_lines_ocr = lines
+        text = "\n".join(line['text'] for line in lines)
+        self.ocr_result_textbox.setText(text if text else "لا يوجد إخراج نصي.")
+        self.ocr_export_button.setEnabled(bool(lines))
+
+    # --- Baseline editing ---
+    def _segmented_view_mapping(self):
+        """(المعامل، الإزاحة س، الإزاحة ص) من إحداثيات الصورة الأصلية إلى إحداثيات عنصر الصورة المجزأة."""
+        label = self.ocr_segmented_image_label
+        pixmap = label.pixmap()
+        if self.preview_ocr is None or pixmap is None or pixmap.isNull():
+            return None
+        factor = pixmap.width() / self.preview_ocr.original_size[0]
+        return factor, (label.width() - pixmap.width()) / 2, (label.height() - pixmap.height()) / 2
+
+    def edit_baselines(self, event):
+        """
+        تحرير التجزئة على الصورة المجزأة: سحب نقطة يحركها، Shift+سحب يرسم خطًا أساسيًا جديدًا،
+        والزر الأيمن يحذف أقرب خط. السطر المعدل تُحذف حدوده ليحسبها المحرك من جديد عند إعادة التعرف.
+        """
+        mapping = self._segmented_view_mapping()
+        if mapping is None or self.segmentation_data_ocr is None or not self.ocr_segment_button.isEnabled():
+            return False
+        factor, offset_x, offset_y = mapping
+        position = event.position()
+        point = [round((position.x() - offset_x) / factor), round((position.y() - offset_y) / factor)]
+        tolerance = 8 / factor # 8 بكسل على الشاشة مهما كان تصغير العرض
+        lines = self.segmentation_data_ocr.setdefault('lines', [])
+
+        if event.type() == QEvent.Type.MouseButtonPress:
+            if event.button() == Qt.MouseButton.RightButton:
+                index = nearest_line(lines, point, tolerance)
+                if index is not None:
+                    del lines[index]
+                    self.on_baselines_edited(f"تم حذف السطر {index + 1}.")
+            elif event.modifiers() & Qt.KeyboardModifier.ShiftModifier:
+                self.ocr_edit_drag = ('new', point)
+            else:
+                vertex = nearest_vertex(lines, point, tolerance)
+                self.ocr_edit_drag = ('vertex',) + vertex if vertex is not None else None
+            return True
+
+        if self.ocr_edit_drag is None:
+            return True
+        if self.ocr_edit_drag[0] == 'vertex':
+            _, index, vertex_index = self.ocr_edit_drag
+            lines[index]['baseline'][vertex_index] = point
+            lines[index]['boundary'] = None
+            self.invalidate_overlay()
+            if event.type() == QEvent.Type.MouseButtonRelease:
+                self.ocr_edit_drag = None
+                self.on_baselines_edited(f"تم تعديل الخط الأساسي للسطر {index + 1}.")
+            else:
+                self.show_segmentation_overlay(highlight_index=index)
+        elif event.type() == QEvent.Type.MouseButtonRelease:
+            start = self.ocr_edit_drag[1]
+            self.ocr_edit_drag = None
+            if abs(point[0] - start[0]) + abs(point[1] - start[1]) > tolerance:
+                baseline = [start, point]
+                right_to_left = self.segmentation_data_ocr.get('text_direction', '').endswith('-rl')
+                index = reading_order_index(lines, baseline, right_to_left)
+                lines.insert(index, {'baseline': baseline, 'boundary': None, 'tags': {'type': 'default'}})
+                self.on_baselines_edited(f"تمت إضافة سطر جديد في الموضع {index + 1}.")
+        return True
+
+    def on_baselines_edited(self, message):
+        self.invalidate_overlay() # التجزئة عُدلت في مكانها
+        self.show_segmentation_overlay()
+        self.ocr_reocr_button.setEnabled(bool(self.selected_ocr_model()))
+        changed, _ = plan_incremental_recognition(self.segmentation_data_ocr.get('lines', []), self.recognized_lines_ocr)
+        self.update_status_ocr(f"الحالة: {message} أسطر تحتاج إلى تعرف: {len(changed)}.")
+
+    def start_incremental_ocr(self):
+        """يعيد التعرف على الأسطر المضافة أو المعدلة فقط، ويحتفظ بنص الأسطر التي لم يتغير شكلها."""
+        if self.segmentation_data_ocr is None:
+            return
+        model_name = self.selected_ocr_model()
+        if not model_name:
+            QMessageBox.critical(self, "خطأ", "يرجى إدخال اسم نموذج التعرف.")
+            return
+        lines = self.segmentation_data_ocr.get('lines', [])
+        changed, reused = plan_incremental_recognition(lines, self.recognized_lines_ocr)
+        if not changed:
+            # حذف أسطر فقط: لا حاجة لتشغيل المحرك
+            self.show_recognized_lines(merge_recognition(lines, reused, changed, []))
+            self.ocr_reocr_button.setEnabled(False)
+            self.update_status_ocr("الحالة: تم تحديث النص؛ لا توجد أسطر تحتاج إلى تعرف.")
+            return
+
+        self.ocr_incremental_plan = (lines, changed, reused)
+        self.ocr_segment_button.setEnabled(False)
+        self.ocr_run_button.setEnabled(False)
+        self.ocr_reocr_button.setEnabled(False)
+        self.ocr_trace_records = []
+        self.update_status_ocr(f"الحالة: جاري التعرف على {len(changed)} سطر معدل من {len(lines)}...")
+        subset = {**self.segmentation_data_ocr, 'lines': [lines[index] for index in changed]}
+        image_path, page = self.selected_file_path_ocr, self.selected_page_ocr
+        self.jobs.submit(f"تعرف على {len(changed)} سطر معدل في {page_label(image_path, page)}",
+                         self._perform_ocr_task, functools.partial(self.on_incremental_ocr_finished, image_path, page),
+                         self.get_engine(), subset, model_name, image_path, page,
+                         progress_slot=self.on_incremental_ocr_progress, priority=JOB_PRIORITY_INTERACTIVE)
+
+    def on_incremental_ocr_progress(self, event):
+        if not self.is_current_ocr_page(event.get('image_path'), event.get('page')):
+            return
+        if event.get('event') == 'line' and self.ocr_incremental_plan is not None:
+            _, changed, _ = self.ocr_incremental_plan
+            self.show_segmentation_overlay(highlight_index=changed[event['index']])
+            self.update_status_ocr(f"الحالة: تم التعرف على السطر المعدل {event['index'] + 1} من {event['total']}")
+        elif event.get('event') == 'trace':
+            self.on_ocr_progress(event)
+
+    def on_incremental_ocr_finished(self, image_path, page, result):
+        lines, changed, reused = self.ocr_incremental_plan
+        self.ocr_incremental_plan = None
+        self.ocr_segment_button.setEnabled(True)
+        self.ocr_run_button.setEnabled(self.segmentation_successful_ocr)
+        if not self.is_current_ocr_page(image_path, page):
+            return
+        if not result['success']:
+            self.ocr_reocr_button.setEnabled(True)
+            self.update_status_ocr("الحالة: خطأ في إعادة التعرف على الأسطر المعدلة.")
+            QMessageBox.critical(self, "خطأ", result['error'])
+            return
+        self.show_recognized_lines(merge_recognition(lines, reused, changed, result['result']))
+        self.invalidate_overlay()
+        self.show_segmentation_overlay()
+        self.update_status_ocr(f"الحالة: أعيد التعرف على {len(changed)} سطر من {len(lines)}، ودُمجت في النص.")
+
     def start_ocr_after_segmentation(self):
-        if not self.selected_file_path_ocr or not self.segmentation_successful_ocr or not os.path.exists(self.temp_segmentation_json_ocr):
+        if not self.selected_file_path_ocr or not self.segmentation_successful_ocr or self.segmentation_data_ocr is None:
             QMessageBox.critical(self, "خطأ", "يرجى تحديد صورة وتجزئتها بنجاح أولاً.")
             return
-        model_name = self.ocr_model_name_entry.text()
+        model_name = self.selected_ocr_model()
         if not model_name:
             QMessageBox.critical(self, "خطأ", "يرجى إدخال اسم نموذج التعرف.")
             return
             
         self.ocr_run_button.setEnabled(False)
         self.ocr_segment_button.setEnabled(False)
+        self.ocr_export_button.setEnabled(False)
         self.update_status_ocr("الحالة: جاري استخراج النص (OCR)، يرجى الانتظار...")
         self.ocr_result_textbox.clear()
+        self.recognized_lines_ocr = []
+        self.ocr_stream_start_time = time.perf_counter()
 
-        self.run_long_task(self._perform_ocr_task, self.on_ocr_finished, model_name)
+        image_path, page = self.selected_file_path_ocr, self.selected_page_ocr
+        self.jobs.submit(f"تعرف {page_label(image_path, page)}",
+                         self._perform_ocr_task, functools.partial(self.on_ocr_finished, image_path, page),
+                         self.get_engine(), self.segmentation_data_ocr, model_name, image_path, page,
+                         progress_slot=self.on_ocr_progress, priority=JOB_PRIORITY_INTERACTIVE)
 
-    def _perform_ocr_task(self, progress_callback, model_name):
-        image_path = self.selected_file_path_ocr
-        ocr_command = ["kraken", "-i", image_path, self.temp_output_file_ocr, "ocr", "--model", model_name, "--lines", self.temp_segmentation_json_ocr]
-        
-        process_ocr = subprocess.run(ocr_command, capture_output=True, text=True, 
-                                     encoding='utf-8', errors='replace', check=False, 
-                                     env=self.get_subprocess_env())
-        
-        if process_ocr.returncode != 0:
-            error_message = f"فشل OCR:\nCode: {process_ocr.returncode}\nStderr:\n{process_ocr.stderr}\nStdout:\n{process_ocr.stdout}"
-            raise Exception(error_message)
-        
-        if os.path.exists(self.temp_output_file_ocr):
-            with open(self.temp_output_file_ocr, "r", encoding="utf-8") as f:
-                return f.read()
-        else:
-            return process_ocr.stdout if process_ocr.stdout else "لا يوجد إخراج نصي."
+    def _perform_ocr_task(self, progress_callback, engine, segmentation_data, model_name, image_path, page):
+        return self._traced_ocr_task(progress_callback, 'ocr.recognition_task', image_path, page,
+                                     lambda emit: engine.recognize(image_path, segmentation_data, model_name,
+                                                                   on_event=emit, page=page))
 
-    def on_ocr_finished(self, result):
+    def on_ocr_finished(self, image_path, page, result):
         self.ocr_segment_button.setEnabled(True)
         if self.segmentation_successful_ocr:
             self.ocr_run_button.setEnabled(True)
-        
+        if not self.is_current_ocr_page(image_path, page):
+            return
+
         if not result['success']:
             self.ocr_result_textbox.setText(result['error'])
             self.update_status_ocr("الحالة: خطأ في التعرف الضوئي.")
         else:
-            self.ocr_result_textbox.setText(result.get('result', ''))
+            for line, recognized in zip(self.segmentation_data_ocr.get('lines', []), result['result']):
+                # حدود الأسطر المعدلة يحسبها المحرك، فتُحفظ حتى لا تُعتبر معدلة مرة أخرى
+                if not line.get('boundary'):
+                    line['boundary'] = recognized['boundary']
+            self.invalidate_overlay()
+            self.show_recognized_lines(result['result'])
+            self.ocr_reocr_button.setEnabled(False)
             self.update_status_ocr("الحالة: اكتمل التعرف الضوئي بنجاح!")
-        
-        if os.path.exists(self.temp_output_file_ocr):
-            try:
-                os.remove(self.temp_output_file_ocr)
-            except Exception as e_remove:
-                print(f"Failed to remove temp OCR output: {e_remove}")
-    
+
+    def export_ocr_results(self):
+        """
+        الكتابة على القرص تحدث هنا فقط: نص عادي، أو JSON يضم التجزئة والأسطر المتعرف عليها،
+        أو ALTO / PAGE XML / hOCR بإحداثيات الأسطر (من نفس النتيجة، دون تشغيل kraken مرة أخرى).
+        """
+        default_name = os.path.join(os.path.dirname(self.selected_file_path_ocr),
+                                    page_stem(self.selected_file_path_ocr, self.selected_page_ocr) + ".txt")
+        structured_filters = {"ALTO XML (*.alto.xml)": 'alto', "PAGE XML (*.page.xml)": 'page', "hOCR (*.hocr)": 'hocr'}
+        file_path, selected_filter = QFileDialog.getSaveFileName(
+            self, "حفظ نتائج التعرف", default_name, ";;".join(["ملف نصي (*.txt)", "JSON (*.json)", *structured_filters]))
+        if not file_path:
+            return
+
+        try:
+            format_name = structured_filters.get(selected_filter)
+            if format_name is not None:
+                if not file_path.lower().endswith(PAGE_FORMATS[format_name]):
+                    # الاسم المقترح ينتهي بـ .txt، فيُستبدل بامتداد الصيغة المختارة
+                    file_path = os.path.splitext(file_path)[0] + PAGE_FORMATS[format_name]
+                record = page_record(self.selected_file_path_ocr, self.selected_page_ocr,
+                                     self.segmentation_data_ocr, self.recognized_lines_ocr)
+                write_page(record, file_path, format_name)
+                self.update_status_ocr(f"الحالة: تم حفظ النتائج في {os.path.basename(file_path)}")
+                return
+            with open(file_path, 'w', encoding='utf-8') as f:
+                if file_path.lower().endswith(".json"):
+                    json.dump({'image': self.selected_file_path_ocr,
+                               'page': None if self.selected_page_ocr is None else self.selected_page_ocr + 1,
+                               'segmentation': self.segmentation_data_ocr,
+                               'lines': self.recognized_lines_ocr}, f, ensure_ascii=False, indent=2)
+                else:
+                    f.write("\n".join(line['text'] for line in self.recognized_lines_ocr))
+            self.update_status_ocr(f"الحالة: تم حفظ النتائج في {os.path.basename(file_path)}")
+        except Exception as e:
+            QMessageBox.critical(self, "خطأ في الحفظ", f"تعذر حفظ النتائج: {e}")
+
+    # --- Model comparison ---
+    def create_model_comparison_dialog(self):
+        self.compare_dialog = QDialog(self)
+        self.compare_dialog.setWindowTitle("مقارنة نماذج التعرف")
+        self.compare_dialog.resize(1000, 600)
+        layout = QVBoxLayout(self.compare_dialog)
+        layout.addWidget(QLabel("النماذج المراد مقارنتها على نفس التجزئة:"))
+        self.compare_models_list = QListWidget()
+        self.compare_models_list.setMaximumHeight(150)
+        layout.addWidget(self.compare_models_list)
+        self.compare_run_button = QPushButton("تشغيل المقارنة")
+        self.compare_run_button.clicked.connect(self.start_model_comparison)
+        layout.addWidget(self.compare_run_button)
+        self.compare_table = QTableWidget(0, 0)
+        self.compare_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.compare_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        layout.addWidget(self.compare_table)
+        self.compare_status_label = QLabel("الأسطر المختلفة بين النماذج تظهر بخلفية ملونة.")
+        layout.addWidget(self.compare_status_label)
+
+    def open_model_comparison(self):
+        if self.compare_dialog is None:
+            self.create_model_comparison_dialog()
+        selected = self.selected_ocr_model()
+        self.compare_models_list.clear()
+        candidates = [(describe_entry(entry), entry['path']) for entry in self.model_registry.list()]
+        if all(path != selected for _, path in candidates):
+            candidates.insert(0, (selected, selected))
+        for title, path in candidates:
+            item = QListWidgetItem(title)
+            item.setData(Qt.ItemDataRole.UserRole, path)
+            item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+            item.setCheckState(Qt.CheckState.Checked if path == selected else Qt.CheckState.Unchecked)
+            self.compare_models_list.addItem(item)
+        self.compare_dialog.show()
+        self.compare_dialog.raise_()
+
+    def start_model_comparison(self):
+        if self.segmentation_data_ocr is None:
+            return
+        items = [self.compare_models_list.item(row) for row in range(self.compare_models_list.count())]
+        self.compare_model_names = [item.data(Qt.ItemDataRole.UserRole) for item in items
+                                    if item.checkState() == Qt.CheckState.Checked]
+        if len(self.compare_model_names) < 2:
+            QMessageBox.critical(self.compare_dialog, "خطأ", "يرجى اختيار نموذجين على الأقل.")
+            return
+        lines = self.segmentation_data_ocr.get('lines', [])
+        self.compare_results = {}
+        self.compare_table.clear()
+        self.compare_table.setColumnCount(len(self.compare_model_names))
+        self.compare_table.setRowCount(len(lines))
+        self.compare_table.setHorizontalHeaderLabels([os.path.basename(name) for name in self.compare_model_names])
+        self.compare_run_button.setEnabled(False)
+        self.compare_status_label.setText(f"جاري التعرف بـ {len(self.compare_model_names)} نموذج...")
+        # نسخة من التجزئة حتى لا يغير تحرير الخطوط الأساسية أثناء المقارنة ما يُرسل إلى المحرك
+        segmentation = json.loads(json.dumps(self.segmentation_data_ocr))
+        self.jobs.submit(f"مقارنة {len(self.compare_model_names)} نموذج على {page_label(self.selected_file_path_ocr, self.selected_page_ocr)}",
+                         self._perform_compare_task, self.on_model_comparison_finished, self.get_engine(),
+                         self.selected_file_path_ocr, segmentation, self.compare_model_names, self.selected_page_ocr,
+                         progress_slot=self.on_model_comparison_progress, priority=JOB_PRIORITY_INTERACTIVE)
+
+    def _perform_compare_task(self, progress_callback, engine, image_path, segmentation, model_names, page):
+        return engine.compare_models(image_path, segmentation, model_names, on_event=progress_callback, page=page)
+
+    def on_model_comparison_progress(self, event):
+        """يملأ عمود كل نموذج فور انتهائه، ويلوّن الأسطر التي تختلف نصوصها بين النماذج المكتملة."""
+        if event.get('event') != 'model':
+            return
+        self.compare_results[event['model_name']] = event['lines']
+        column = self.compare_model_names.index(event['model_name'])
+        for row, line in enumerate(event['lines']):
+            self.compare_table.setItem(row, column, QTableWidgetItem(line['text']))
+        for row in range(self.compare_table.rowCount()):
+            texts = {lines[row]['text'] for lines in self.compare_results.values() if row < len(lines)}
+            color = QColor(255, 243, 205) if len(texts) > 1 else QColor(Qt.GlobalColor.transparent)
+            for column in range(self.compare_table.columnCount()):
+                item = self.compare_table.item(row, column)
+                if item is not None:
+                    item.setBackground(color)
+        self.compare_status_label.setText(f"اكتمل {len(self.compare_results)} من {len(self.compare_model_names)} نموذج...")
+
+    def on_model_comparison_finished(self, result):
+        self.compare_run_button.setEnabled(True)
+        if not result['success']:
+            self.compare_status_label.setText("فشلت المقارنة.")
+            QMessageBox.critical(self.compare_dialog, "خطأ", result['error'])
+            return
+        for model_name, lines in result['result'].items():
+            if model_name not in self.compare_results:
+                self.on_model_comparison_progress({'event': 'model', 'model_name': model_name, 'lines': lines})
+        rows = self.compare_table.rowCount()
+        differing = sum(1 for row in range(rows)
+                        if len({lines[row]['text'] for lines in self.compare_results.values() if row < len(lines)}) > 1)
+        self.compare_status_label.setText(f"اكتملت المقارنة: {differing} سطر مختلف من {rows}.")
+
     # ===================================================================================
     # TRAINING TAB WIDGETS AND LOGIC
     # ===================================================================================
@@ -355,10 +1352,15 @@ class KrakenPySideApp(QWidget):
         
         add_pair_button = QPushButton("إضافة زوج (صورة + نص كتابي)")
         add_pair_button.clicked.connect(self.add_training_pair)
-        train_controls_layout.addWidget(add_pair_button, 0, 0, 1, 2)
+        train_controls_layout.addWidget(add_pair_button, 0, 0)
+
+        self.import_pairs_button = QPushButton("استيراد مجلد (صور + ملفات .gt.txt)")
+        self.import_pairs_button.clicked.connect(self.import_training_pairs)
+        train_controls_layout.addWidget(self.import_pairs_button, 0, 1)
         
         train_controls_layout.addWidget(QLabel("اسم النموذج الناتج:"), 1, 0)
         self.train_output_model_name_entry = QLineEdit("my_arabic_model.mlmodel")
+        self.train_output_model_name_entry.textChanged.connect(self.update_resume_button_state)
         train_controls_layout.addWidget(self.train_output_model_name_entry, 1, 1)
         
         train_controls_layout.addWidget(QLabel("عدد الحقب (Epochs):"), 2, 0)
@@ -366,21 +1368,31 @@ class KrakenPySideApp(QWidget):
         train_controls_layout.addWidget(self.train_epochs_entry, 2, 1)
         layout.addWidget(train_controls_frame)
 
-        # --- Scrollable frame for training pairs ---
-        layout.addWidget(QLabel("ملفات التدريب المضافة:"))
-        self.training_pairs_scroll_area = QScrollArea()
-        self.training_pairs_scroll_area.setWidgetResizable(True)
-        self.training_pairs_scroll_area.setFrameShape(QFrame.Shape.StyledPanel)
-        
-        self.scroll_content_widget = QWidget()
-        self.scroll_content_layout = QVBoxLayout(self.scroll_content_widget)
-        self.scroll_content_layout.setAlignment(Qt.AlignmentFlag.AlignTop)
-        self.training_pairs_scroll_area.setWidget(self.scroll_content_widget)
-        layout.addWidget(self.training_pairs_scroll_area)
-
-        # --- Buttons below scrollable frame ---
+        # --- Training pairs list (model/view: only visible rows are drawn) ---
+        pairs_header_frame = QFrame()
+        pairs_header_layout = QHBoxLayout(pairs_header_frame)
+        pairs_header_layout.setContentsMargins(0, 0, 0, 0)
+        self.training_pairs_count_label = QLabel("ملفات التدريب المضافة: 0")
+        pairs_header_layout.addWidget(self.training_pairs_count_label)
+        self.training_pairs_filter_entry = QLineEdit()
+        self.training_pairs_filter_entry.setPlaceholderText("تصفية حسب اسم الملف...")
+        self.training_pairs_filter_entry.textChanged.connect(self.filter_training_pairs)
+        pairs_header_layout.addWidget(self.training_pairs_filter_entry)
+        layout.addWidget(pairs_header_frame)
+
+        self.training_pairs_view = QListView()
+        self.training_pairs_view.setModel(self.training_pairs_model)
+        self.training_pairs_view.setUniformItemSizes(True)
+        self.training_pairs_view.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        layout.addWidget(self.training_pairs_view)
+
+        # --- Buttons below the list ---
         train_action_buttons_frame = QFrame()
         train_action_buttons_layout = QHBoxLayout(train_action_buttons_frame)
+        self.train_remove_selected_button = QPushButton("إزالة المحدد")
+        self.train_remove_selected_button.clicked.connect(self.remove_selected_training_pairs)
+        train_action_buttons_layout.addWidget(self.train_remove_selected_button)
+
         self.train_clear_list_button = QPushButton("مسح القائمة")
         self.train_clear_list_button.clicked.connect(self.clear_training_pairs)
         train_action_buttons_layout.addWidget(self.train_clear_list_button)
@@ -388,6 +1400,15 @@ class KrakenPySideApp(QWidget):
         self.train_start_button = QPushButton("بدء التدريب")
         self.train_start_button.clicked.connect(self.start_training)
         train_action_buttons_layout.addWidget(self.train_start_button)
+
+        self.train_resume_button = QPushButton("استئناف من نقطة الحفظ")
+        self.train_resume_button.clicked.connect(self.resume_training)
+        train_action_buttons_layout.addWidget(self.train_resume_button)
+
+        self.train_stop_button = QPushButton("إيقاف التدريب")
+        self.train_stop_button.clicked.connect(self.stop_training)
+        self.train_stop_button.setEnabled(False)
+        train_action_buttons_layout.addWidget(self.train_stop_button)
         layout.addWidget(train_action_buttons_frame)
         
         # --- Training Log Textbox ---
@@ -398,9 +1419,13 @@ class KrakenPySideApp(QWidget):
         
         self.training_status_label = QLabel("الحالة: جاهز لإضافة ملفات التدريب.")
         layout.addWidget(self.training_status_label)
+        self.training_timing_label = QLabel("")
+        self.training_timing_label.setStyleSheet("color: gray;")
+        layout.addWidget(self.training_timing_label)
+        self.update_resume_button_state()
 
-        layout.setStretch(1, 1) # Scroll area
-        layout.setStretch(4, 2) # Log textbox
+        layout.setStretch(2, 1) # Pairs list
+        layout.setStretch(5, 2) # Log textbox
 
     def add_training_pair(self):
         image_path, _ = QFileDialog.getOpenFileName(self, "اختر صورة المخطوطة للتدريب", "", "ملفات الصور (*.png *.jpg *.jpeg *.tif *.tiff);;All files (*.*)")
@@ -409,45 +1434,57 @@ class KrakenPySideApp(QWidget):
         gt_path, _ = QFileDialog.getOpenFileName(self, f"اختر ملف النص الكتابي (Ground Truth) للصورة: {os.path.basename(image_path)}", "", "ملفات نصية (*.txt *.gt.txt);;All files (*.*)")
         if not gt_path: return
 
-        self.training_pairs.append({'image': image_path, 'gt': gt_path})
-        self.update_training_pairs_display()
-        self.update_status_training(f"تمت إضافة {len(self.training_pairs)} زوج تدريب.")
+        self.training_pairs_model.add_pairs([{'image': image_path, 'gt': gt_path}])
+        self.update_training_pairs_count()
+        self.update_status_training(f"تمت إضافة {self.training_pairs_model.count()} زوج تدريب.")
 
-    def update_training_pairs_display(self):
-        for widget in self.training_pair_widgets:
-            widget.deleteLater()
-        self.training_pair_widgets = []
+    def import_training_pairs(self):
+        directory = QFileDialog.getExistingDirectory(self, "اختر مجلد صور الأسطر وملفات .gt.txt")
+        if not directory: return
 
-        for i, pair in enumerate(self.training_pairs):
-            pair_frame = QFrame()
-            pair_frame.setFrameShape(QFrame.Shape.StyledPanel)
-            pair_layout = QHBoxLayout(pair_frame)
-            
-            img_name = os.path.basename(pair['image'])
-            gt_name = os.path.basename(pair['gt'])
-            
-            pair_layout.addWidget(QLabel(f"صورة: {img_name}"))
-            pair_layout.addWidget(QLabel(f"نص: {gt_name}"))
-            pair_layout.addStretch()
-            
-            remove_button = QPushButton("إزالة")
-            remove_button.clicked.connect(lambda checked=False, idx=i: self.remove_training_pair(idx))
-            pair_layout.addWidget(remove_button)
-            
-            self.scroll_content_layout.addWidget(pair_frame)
-            self.training_pair_widgets.append(pair_frame)
+        # مسح المجلدات الكبيرة يتم في الخلفية، والإضافة إلى القائمة دفعة واحدة عند الانتهاء
+        self.import_pairs_button.setEnabled(False)
+        self.update_status_training(f"جاري البحث عن أزواج التدريب في: {directory}")
+        self.jobs.submit(f"استيراد أزواج {os.path.basename(directory)}", self._perform_import_pairs_task,
+                         self.on_import_pairs_finished, directory, priority=JOB_PRIORITY_INTERACTIVE)
+
+    def _perform_import_pairs_task(self, progress_callback, directory):
+        return kraken_training.find_training_pairs(directory)
 
-    def remove_training_pair(self, index):
-        if 0 <= index < len(self.training_pairs):
-            del self.training_pairs[index]
-            self.update_training_pairs_display()
-            self.update_status_training(f"تمت إزالة زوج. المجموع: {len(self.training_pairs)}.")
+    def on_import_pairs_finished(self, result):
+        self.import_pairs_button.setEnabled(True)
+        if not result['success']:
+            self.update_status_training(f"فشل الاستيراد: {result['error']}")
+            return
+        found = result['result']
+        added = self.training_pairs_model.add_pairs(found)
+        self.update_training_pairs_count()
+        skipped = f"، وتجاهل {len(found) - added} مكرر" if len(found) > added else ""
+        self.update_status_training(f"تم استيراد {added} زوج تدريب{skipped}. المجموع: {self.training_pairs_model.count()}.")
+
+    def update_training_pairs_count(self):
+        total = self.training_pairs_model.count()
+        shown = self.training_pairs_model.rowCount()
+        text = f"ملفات التدريب المضافة: {total}"
+        self.training_pairs_count_label.setText(text if shown == total else f"{text} (المعروض: {shown})")
+
+    def filter_training_pairs(self, text):
+        self.training_pairs_model.set_filter(text)
+        self.update_training_pairs_count()
+
+    def remove_selected_training_pairs(self):
+        rows = [index.row() for index in self.training_pairs_view.selectionModel().selectedRows()]
+        if not rows:
+            return
+        self.training_pairs_model.remove_rows(rows)
+        self.update_training_pairs_count()
+        self.update_status_training(f"تمت إزالة {len(rows)} زوج. المجموع: {self.training_pairs_model.count()}.")
 
     def clear_training_pairs(self):
         reply = QMessageBox.question(self, "تأكيد", "هل أنت متأكد أنك تريد مسح جميع أزواج ملفات التدريب؟", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
         if reply == QMessageBox.StandardButton.Yes:
-            self.training_pairs = []
-            self.update_training_pairs_display()
+            self.training_pairs_model.clear()
+            self.update_training_pairs_count()
             self.update_status_training("تم مسح قائمة ملفات التدريب.")
 
     def update_status_training(self, message):
@@ -457,15 +1494,16 @@ class KrakenPySideApp(QWidget):
         self.training_log_textbox.append(text)
         self.training_log_textbox.verticalScrollBar().setValue(self.training_log_textbox.verticalScrollBar().maximum())
 
-    def start_training(self):
-        if not self.training_pairs:
+    def _validated_training_settings(self):
+        """يتحقق من مدخلات التدريب ويعيد (اسم النموذج الناتج، عدد الحقب) أو None."""
+        if not self.training_pairs_model.count():
             QMessageBox.critical(self, "خطأ في التدريب", "يرجى إضافة ملفات تدريب (صور ونصوصها الكتابية) أولاً.")
-            return
+            return None
 
         output_model_name = self.train_output_model_name_entry.text()
         if not output_model_name:
             QMessageBox.critical(self, "خطأ في التدريب", "يرجى تحديد اسم للنموذج الناتج.")
-            return
+            return None
         if not output_model_name.endswith(".mlmodel"):
             output_model_name += ".mlmodel"
             self.train_output_model_name_entry.setText(output_model_name)
@@ -475,40 +1513,93 @@ class KrakenPySideApp(QWidget):
             if epochs <= 0: raise ValueError
         except ValueError:
             QMessageBox.critical(self, "خطأ في التدريب", "يرجى إدخال عدد صحيح موجب لعدد الحقب (Epochs).")
+            return None
+
+        return output_model_name, epochs
+
+    def start_training(self):
+        settings = self._validated_training_settings()
+        if settings is None:
             return
+        output_model_name, epochs = settings
+
+        # نقاط حفظ من أكثر من تشغيل تعني وجود ما يُستأنف، ويُطلب اختيار إحداها في resume_training
+        found = kraken_training.find_checkpoints(output_model_name)
+        if len(found['runs']) > 1 or kraken_training.resume_plan(output_model_name, epochs) is not None:
+            reply = QMessageBox.question(self, "نقطة حفظ موجودة",
+                                         "توجد نقطة حفظ من تدريب سابق بنفس الاسم.\n"
+                                         "هل تريد استئناف التدريب منها بدلاً من البدء من جديد؟",
+                                         QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+            if reply == QMessageBox.StandardButton.Yes:
+                self.resume_training()
+                return
 
-        self.set_training_buttons_state(False)
-        self.update_status_training(f"بدء التدريب لنموذج '{output_model_name}'...")
         self.training_log_textbox.clear()
         self.append_to_training_log(f"Starting training for model: {output_model_name} with {epochs} epochs.\n")
-        self.append_to_training_log(f"Using {len(self.training_pairs)} training pairs.\n\n")
+        self._submit_training(output_model_name, epochs)
 
-        self.run_long_task(self._perform_training_task, self.on_training_finished, output_model_name, epochs)
-
-    def _perform_training_task(self, progress_callback, output_model_name, epochs):
-        command = ["ketos", "train", "-o", output_model_name, "--epochs", str(epochs), "-f", "text"]
-        for pair in self.training_pairs:
-            command.append(pair['image'])
-            command.append(pair['gt'])
-            
-        progress_callback(f"Executing command: {' '.join(command)}\n\n")
-
-        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, 
-                                   text=True, encoding='utf-8', errors='replace', 
-                                   env=self.get_subprocess_env(), bufsize=1)
+    def resume_training(self):
+        settings = self._validated_training_settings()
+        if settings is None:
+            return
+        output_model_name, epochs = settings
+
+        runs = kraken_training.find_checkpoints(output_model_name)['runs']
+        checkpoint_path = None
+        if len(runs) > 1:
+            # لا نخمن أحدث ملف: قد يكون من تشغيل آخر بإعدادات مختلفة
+            labels = [f"{path} (الحقبة {epoch + 1})" for epoch, path in runs]
+            label, accepted = QInputDialog.getItem(self, "اختيار نقطة الحفظ",
+                                                   "توجد نقاط حفظ من أكثر من تشغيل بنفس الاسم. اختر نقطة الاستئناف:",
+                                                   labels, 0, False)
+            if not accepted:
+                return
+            checkpoint_path = runs[labels.index(label)][1]
+
+        plan = kraken_training.resume_plan(output_model_name, epochs, checkpoint_path)
+        if plan is None:
+            QMessageBox.warning(self, "لا توجد نقطة حفظ",
+                                f"لم يتم العثور على نقطة حفظ قابلة للاستئناف للنموذج '{output_model_name}'.")
+            self.update_resume_button_state()
+            return
+        resume_args, remaining_epochs, description = plan
 
-        for line in iter(process.stdout.readline, ''):
-            progress_callback(line)
-        
-        process.stdout.close()
-        return_code = process.wait()
+        self.append_to_training_log(f"\n{description}\n")
+        self._submit_training(output_model_name, remaining_epochs, resume_args)
 
-        if return_code != 0:
-            raise Exception(f"فشل التدريب. كود الخطأ: {return_code}")
+    def _submit_training(self, output_model_name, epochs, resume_args=()):
+        self.set_training_buttons_state(False)
+        self.update_status_training(f"بدء التدريب لنموذج '{output_model_name}'...")
+        self.training_timing_label.clear()
+        self.training_trace_records = []
+        self.append_to_training_log(f"Using {self.training_pairs_model.count()} training pairs.\n\n")
+
+        self.training_job = self.jobs.submit(f"تدريب {output_model_name}", self._perform_training_task,
+                                             self.on_training_finished, self.training_pairs_model.pairs(),
+                                             output_model_name, epochs, resume_args, self.kraken_path_entry.text(),
+                                             self.training_trace_records, progress_slot=self.append_to_training_log,
+                                             priority=JOB_PRIORITY_BACKGROUND, cancellable=True)
+
+    def _perform_training_task(self, progress_callback, training_pairs, output_model_name, epochs, resume_args,
+                               kraken_dir, trace_records, cancel_event=None):
+        with tracer.collect(trace_records):
+            return kraken_training.run_training(progress_callback, training_pairs, output_model_name, epochs,
+                                                resume_args, kraken_dir, cancel_event)
+
+    def stop_training(self):
+        if self.training_job is not None:
+            self.jobs.cancel(self.training_job)
+            self.train_stop_button.setEnabled(False)
+            self.update_status_training("جاري إيقاف التدريب وحفظ نقطة الحفظ الحالية...")
 
     def on_training_finished(self, result):
+        self.training_job = None
         self.set_training_buttons_state(True)
-        if result['success']:
+        self.training_timing_label.setText(format_breakdown(self.training_trace_records))
+        if result.get('cancelled'):
+            self.append_to_training_log("\n\nتم إيقاف التدريب. يمكنك متابعته لاحقًا بزر 'استئناف من نقطة الحفظ'.")
+            self.update_status_training("تم إيقاف التدريب.")
+        elif result['success']:
             output_model_name = self.train_output_model_name_entry.text()
             self.append_to_training_log(f"\n\nالتدريب اكتمل بنجاح! النموذج المحفوظ: {output_model_name}")
             self.update_status_training(f"اكتمل التدريب. النموذج: {output_model_name}")
@@ -520,24 +1611,426 @@ class KrakenPySideApp(QWidget):
     def set_training_buttons_state(self, enabled):
         self.train_start_button.setEnabled(enabled)
         self.train_clear_list_button.setEnabled(enabled)
+        self.train_remove_selected_button.setEnabled(enabled)
+        self.train_stop_button.setEnabled(not enabled)
+        if enabled:
+            self.update_resume_button_state()
+        else:
+            self.train_resume_button.setEnabled(False)
+
+    def update_resume_button_state(self):
+        """يفعّل زر الاستئناف فقط عند وجود نقطة حفظ لاسم النموذج الحالي."""
+        if self.training_job is not None:
+            return
+        output_model_name = self.train_output_model_name_entry.text()
+        found = kraken_training.find_checkpoints(output_model_name) if output_model_name else {}
+        self.train_resume_button.setEnabled(any(found.values()))
 
     # ===================================================================================
-    # Generic Long Task Runner
+    # SWEEP TAB WIDGETS AND LOGIC
     # ===================================================================================
-    def run_long_task(self, task_function, on_finish_slot, *args):
-        self.thread = QThread()
-        self.worker = Worker(task_function, *args)
-        self.worker.moveToThread(self.thread)
-
-        self.thread.started.connect(self.worker.run)
-        self.worker.finished.connect(on_finish_slot)
-        self.worker.progress.connect(self.append_to_training_log) # يرسل سجل التدريب
-        
-        self.worker.finished.connect(self.thread.quit)
-        self.worker.finished.connect(self.worker.deleteLater)
-        self.thread.finished.connect(self.thread.deleteLater)
+    def create_sweep_tab_widgets(self):
+        layout = QGridLayout(self.sweep_tab)
+
+        layout.addWidget(QLabel("عدد الحقب (Epochs):"), 0, 0)
+        self.sweep_epochs_entry = QLineEdit("50, 100")
+        layout.addWidget(self.sweep_epochs_entry, 0, 1, 1, 3)
+
+        layout.addWidget(QLabel("معدل التعلم:"), 1, 0)
+        self.sweep_lrate_entry = QLineEdit("0.001, 0.0001")
+        layout.addWidget(self.sweep_lrate_entry, 1, 1, 1, 3)
+
+        layout.addWidget(QLabel("حجم الدفعة (Batch size):"), 2, 0)
+        self.sweep_batch_size_entry = QLineEdit("1")
+        layout.addWidget(self.sweep_batch_size_entry, 2, 1, 1, 3)
+
+        layout.addWidget(QLabel("توسيع البيانات (Augmentation):"), 3, 0)
+        self.sweep_augment_off_checkbox = QCheckBox("بدون")
+        self.sweep_augment_off_checkbox.setChecked(True)
+        layout.addWidget(self.sweep_augment_off_checkbox, 3, 1)
+        self.sweep_augment_on_checkbox = QCheckBox("مع")
+        layout.addWidget(self.sweep_augment_on_checkbox, 3, 2)
+
+        self.sweep_random_checkbox = QCheckBox("بحث عشوائي بعدد تشغيلات:")
+        layout.addWidget(self.sweep_random_checkbox, 4, 0)
+        self.sweep_random_count_spinbox = QSpinBox()
+        self.sweep_random_count_spinbox.setRange(1, 1000)
+        self.sweep_random_count_spinbox.setValue(8)
+        layout.addWidget(self.sweep_random_count_spinbox, 4, 1)
+
+        # ميزانية المعالج: عدد التشغيلات المتزامنة × خيوط كل تشغيل
+        layout.addWidget(QLabel("التشغيلات المتوازية:"), 5, 0)
+        self.sweep_parallel_spinbox = QSpinBox()
+        self.sweep_parallel_spinbox.setRange(1, max(1, os.cpu_count() or 1))
+        self.sweep_parallel_spinbox.setValue(min(2, os.cpu_count() or 1))
+        layout.addWidget(self.sweep_parallel_spinbox, 5, 1)
+        layout.addWidget(QLabel("خيوط لكل تشغيل:"), 5, 2)
+        self.sweep_threads_spinbox = QSpinBox()
+        self.sweep_threads_spinbox.setRange(1, max(1, os.cpu_count() or 1))
+        self.sweep_threads_spinbox.setValue(max(1, (os.cpu_count() or 2) // 2))
+        layout.addWidget(self.sweep_threads_spinbox, 5, 3)
+
+        layout.addWidget(QLabel("مجلد النماذج والسجلات:"), 6, 0)
+        self.sweep_output_entry = QLineEdit("sweeps")
+        layout.addWidget(self.sweep_output_entry, 6, 1, 1, 3)
+
+        self.sweep_start_button = QPushButton("بدء البحث (على ملفات تبويب التدريب)")
+        self.sweep_start_button.clicked.connect(self.start_sweep)
+        layout.addWidget(self.sweep_start_button, 7, 0, 1, 3)
+        self.sweep_stop_button = QPushButton("إيقاف")
+        self.sweep_stop_button.setEnabled(False)
+        self.sweep_stop_button.clicked.connect(self.stop_sweep)
+        layout.addWidget(self.sweep_stop_button, 7, 3)
+        self.sweep_job = None
+        self.sweep_runs = []
+
+        self.sweep_table = QTableWidget(0, 5)
+        self.sweep_table.setHorizontalHeaderLabels(["#", "المعاملات", "الحالة", "أفضل دقة تحقق", "النموذج"])
+        self.sweep_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        self.sweep_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.sweep_table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.sweep_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.sweep_table.itemSelectionChanged.connect(self.show_selected_sweep_log)
+        layout.addWidget(self.sweep_table, 8, 0, 1, 4)
+
+        layout.addWidget(QLabel("سجل التشغيل المحدد:"), 9, 0, 1, 4)
+        self.sweep_log_textbox = QTextEdit()
+        self.sweep_log_textbox.setReadOnly(True)
+        layout.addWidget(self.sweep_log_textbox, 10, 0, 1, 4)
+
+        self.sweep_status_label = QLabel("الحالة: جاهز")
+        layout.addWidget(self.sweep_status_label, 11, 0, 1, 4)
+
+        layout.setColumnStretch(1, 1)
+        layout.setRowStretch(8, 2)
+        layout.setRowStretch(10, 1)
+
+    def _parse_sweep_values(self, entry, cast):
+        return [cast(value) for value in entry.text().replace("،", ",").split(",") if value.strip()]
+
+    def start_sweep(self):
+        if not self.training_pairs_model.count():
+            QMessageBox.critical(self, "خطأ", "يرجى إضافة ملفات تدريب في تبويب التدريب أولاً.")
+            return
+        try:
+            space = {
+                'epochs': self._parse_sweep_values(self.sweep_epochs_entry, int),
+                'lrate': self._parse_sweep_values(self.sweep_lrate_entry, float),
+                'batch_size': self._parse_sweep_values(self.sweep_batch_size_entry, int),
+                'augment': [value for value, checkbox in ((False, self.sweep_augment_off_checkbox),
+                                                          (True, self.sweep_augment_on_checkbox))
+                            if checkbox.isChecked()],
+            }
+        except ValueError:
+            QMessageBox.critical(self, "خطأ", "يرجى إدخال قيم رقمية مفصولة بفواصل.")
+            return
+        if not space['epochs'] or any(value <= 0 for value in space['epochs']):
+            QMessageBox.critical(self, "خطأ", "يرجى إدخال عدد حقب صحيح موجب واحد على الأقل.")
+            return
+
+        if self.sweep_random_checkbox.isChecked():
+            configs = kraken_sweep.random_configs(space, self.sweep_random_count_spinbox.value())
+        else:
+            configs = kraken_sweep.grid_configs(space)
+
+        self.sweep_runs = [{'config': config, 'state': 'queued', 'accuracy': None, 'model': None, 'log': []}
+                           for config in configs]
+        self.sweep_log_textbox.clear()
+        self.refresh_sweep_table()
+        self.set_sweep_running(True)
+        self.sweep_status_label.setText(f"الحالة: جاري تشغيل {len(configs)} تجربة تدريب...")
+
+        self.sweep_job = self.jobs.submit(f"بحث معاملات ({len(configs)} تشغيل)", kraken_sweep.run_sweep,
+                                          self.on_sweep_finished, self.training_pairs_model.pairs(), configs,
+                                          self.sweep_output_entry.text() or "sweeps", space['epochs'][0],
+                                          self.sweep_parallel_spinbox.value(), self.sweep_threads_spinbox.value(),
+                                          self.kraken_path_entry.text(),
+                                          progress_slot=self.on_sweep_progress,
+                                          priority=JOB_PRIORITY_BACKGROUND, cancellable=True)
+
+    def on_sweep_progress(self, event):
+        if event['event'] == 'log':
+            self.sweep_status_label.setText(f"الحالة: {event['text'].strip()}")
+            return
+
+        run = self.sweep_runs[event['run']]
+        if event['event'] == 'run_started':
+            run['state'] = 'running'
+        elif event['event'] == 'run_output':
+            run['log'].append(event['text'])
+            if self.selected_sweep_run() is run:
+                self.sweep_log_textbox.moveCursor(QTextCursor.MoveOperation.End)
+                self.sweep_log_textbox.insertPlainText(event['text'])
+            if event['accuracy'] == run['accuracy']:
+                return # لا تغيير في الجدول
+            run['accuracy'] = event['accuracy']
+        elif event['event'] == 'run_finished':
+            run.update(state=event['state'], accuracy=event['accuracy'], model=event['model'])
+        self.refresh_sweep_table()
+
+    def refresh_sweep_table(self):
+        """الجدول مرتب تنازليًا حسب أفضل دقة تحقق، فيظهر أفضل نموذج حتى الآن في الصف الأول."""
+        selected_run = self.selected_sweep_run()
+        ranked = sorted(range(len(self.sweep_runs)),
+                        key=lambda index: -1.0 if self.sweep_runs[index]['accuracy'] is None
+                        else self.sweep_runs[index]['accuracy'], reverse=True)
+        self.sweep_table.blockSignals(True)
+        self.sweep_table.setRowCount(len(ranked))
+        for row, index in enumerate(ranked):
+            run = self.sweep_runs[index]
+            accuracy = "-" if run['accuracy'] is None else f"{run['accuracy']:.4f}"
+            values = [str(index), kraken_sweep.describe_config(run['config']), JOB_STATE_LABELS[run['state']],
+                      accuracy, run['model'] or ""]
+            for column, value in enumerate(values):
+                item = self.sweep_table.item(row, column)
+                if item is None:
+                    item = QTableWidgetItem()
+                    self.sweep_table.setItem(row, column, item)
+                item.setText(value)
+                item.setData(Qt.ItemDataRole.UserRole, index)
+            if run is selected_run:
+                self.sweep_table.selectRow(row)
+        self.sweep_table.blockSignals(False)
+
+    def selected_sweep_run(self):
+        selected = self.sweep_table.selectedItems()
+        if not selected or not self.sweep_runs:
+            return None
+        return self.sweep_runs[selected[0].data(Qt.ItemDataRole.UserRole)]
+
+    def show_selected_sweep_log(self):
+        run = self.selected_sweep_run()
+        self.sweep_log_textbox.setPlainText("".join(run['log']) if run else "")
+
+    def stop_sweep(self):
+        if self.sweep_job is not None:
+            self.jobs.cancel(self.sweep_job)
+            self.sweep_status_label.setText("الحالة: جاري إيقاف التشغيلات...")
+
+    def on_sweep_finished(self, result):
+        self.set_sweep_running(False)
+        self.sweep_job = None
+        if result.get('cancelled'):
+            self.sweep_status_label.setText("الحالة: تم إيقاف البحث.")
+            return
+        if not result['success']:
+            self.sweep_log_textbox.append(f"\nفشل البحث.\n{result['error']}")
+            self.sweep_status_label.setText("الحالة: فشل البحث.")
+            return
+
+        ranked = [run for run in result['result'] if run['accuracy'] is not None]
+        if ranked:
+            best = ranked[0]
+            self.sweep_status_label.setText(
+                f"الحالة: اكتمل البحث. أفضل نموذج: {best['model']} "
+                f"(دقة {best['accuracy']:.4f}، {kraken_sweep.describe_config(best['config'])})")
+        else:
+            self.sweep_status_label.setText("الحالة: اكتمل البحث دون قراءة دقة تحقق من مخرجات ketos.")
+
+    def set_sweep_running(self, running):
+        self.sweep_start_button.setEnabled(not running)
+        self.sweep_stop_button.setEnabled(running)
+
+    # ===================================================================================
+    # BATCH TAB WIDGETS AND LOGIC
+    # ===================================================================================
+    def create_batch_tab_widgets(self):
+        layout = QGridLayout(self.batch_tab)
+
+        layout.addWidget(QLabel("مجلد الصور أو نمط (glob):"), 0, 0)
+        self.batch_source_entry = QLineEdit()
+        self.batch_source_entry.setPlaceholderText("مثال: D:/codex أو D:/codex/*.tif")
+        layout.addWidget(self.batch_source_entry, 0, 1)
+        browse_source_button = QPushButton("تصفح...")
+        browse_source_button.clicked.connect(self.browse_batch_source)
+        layout.addWidget(browse_source_button, 0, 2)
+
+        layout.addWidget(QLabel("مجلد الإخراج:"), 1, 0)
+        self.batch_output_entry = QLineEdit()
+        layout.addWidget(self.batch_output_entry, 1, 1)
+        browse_output_button = QPushButton("تصفح...")
+        browse_output_button.clicked.connect(self.browse_batch_output)
+        layout.addWidget(browse_output_button, 1, 2)
+
+        layout.addWidget(QLabel("نموذج التعرف:"), 2, 0)
+        self.batch_model_name_entry = QLineEdit("arabic_best.mlmodel")
+        layout.addWidget(self.batch_model_name_entry, 2, 1, 1, 2)
+
+        layout.addWidget(QLabel("عدد العمليات المتوازية:"), 3, 0)
+        self.batch_workers_spinbox = QSpinBox()
+        self.batch_workers_spinbox.setRange(1, max(1, (os.cpu_count() or 1) * 2))
+        self.batch_workers_spinbox.setValue(os.cpu_count() or 1)
+        layout.addWidget(self.batch_workers_spinbox, 3, 1, 1, 2)
+
+        self.batch_thumbnails_checkbox = QCheckBox("حفظ صورة مصغرة بطبقات التجزئة لكل صفحة (<الاسم>.overlay.jpg)")
+        layout.addWidget(self.batch_thumbnails_checkbox, 4, 0, 1, 3)
+
+        # التصدير المنظم يُكتب من نفس نتيجة التعرف، فلا يحتاج الأرشيف إلى تشغيل kraken مرة ثانية
+        export_frame = QWidget()
+        export_layout = QHBoxLayout(export_frame)
+        export_layout.setContentsMargins(0, 0, 0, 0)
+        export_layout.addWidget(QLabel("تصدير:"))
+        self.batch_export_checkboxes = {}
+        for format_name, title in (('alto', "ALTO"), ('page', "PAGE XML"), ('hocr', "hOCR"), ('jsonl', "JSONL")):
+            checkbox = QCheckBox(title)
+            self.batch_export_checkboxes[format_name] = checkbox
+            export_layout.addWidget(checkbox)
+        self.batch_export_zip_checkbox = QCheckBox("في أرشيف export.zip")
+        export_layout.addWidget(self.batch_export_zip_checkbox)
+        export_layout.addStretch()
+        layout.addWidget(export_frame, 5, 0, 1, 3)
+
+        self.batch_start_button = QPushButton("بدء معالجة الدفعة")
+        self.batch_start_button.clicked.connect(self.start_batch)
+        layout.addWidget(self.batch_start_button, 6, 0, 1, 2)
+        self.batch_stop_button = QPushButton("إيقاف")
+        self.batch_stop_button.setEnabled(False)
+        self.batch_stop_button.clicked.connect(self.stop_batch)
+        layout.addWidget(self.batch_stop_button, 6, 2)
+        self.batch_job = None
+
+        layout.addWidget(QLabel("حالة الصفحات:"), 7, 0, 1, 3)
+        self.batch_log_textbox = QTextEdit()
+        self.batch_log_textbox.setReadOnly(True)
+        layout.addWidget(self.batch_log_textbox, 8, 0, 1, 3)
+
+        self.batch_status_label = QLabel("الحالة: جاهز")
+        layout.addWidget(self.batch_status_label, 9, 0, 1, 3)
+
+        layout.setColumnStretch(1, 1)
+        layout.setRowStretch(7, 1)
+
+    def browse_batch_source(self):
+        directory = QFileDialog.getExistingDirectory(self, "اختر مجلد صور الصفحات")
+        if directory:
+            self.batch_source_entry.setText(directory)
+            if not self.batch_output_entry.text():
+                self.batch_output_entry.setText(os.path.join(directory, "ocr_output"))
 
-        self.thread.start()
+    def browse_batch_output(self):
+        directory = QFileDialog.getExistingDirectory(self, "اختر مجلد الإخراج")
+        if directory:
+            self.batch_output_entry.setText(directory)
+
+    def append_to_batch_log(self, text):
+        self.batch_log_textbox.append(text)
+        self.batch_status_label.setText(f"الحالة: {text}")
+
+    def start_batch(self):
+        image_paths = kraken_batch.collect_images(self.batch_source_entry.text())
+        if not image_paths:
+            QMessageBox.critical(self, "خطأ", "لم يتم العثور على صور في المجلد أو النمط المحدد.")
+            return
+        output_dir = self.batch_output_entry.text()
+        if not output_dir:
+            QMessageBox.critical(self, "خطأ", "يرجى تحديد مجلد الإخراج.")
+            return
+        model_name = self.batch_model_name_entry.text()
+        if not model_name:
+            QMessageBox.critical(self, "خطأ", "يرجى إدخال اسم نموذج التعرف.")
+            return
+
+        self.set_batch_running(True)
+        self.batch_log_textbox.clear()
+        self.batch_status_label.setText(f"الحالة: جاري معالجة {len(image_paths)} صفحة...")
+
+        exports = [format_name for format_name, checkbox in self.batch_export_checkboxes.items() if checkbox.isChecked()]
+        export_target = os.path.join(output_dir, "export.zip") if self.batch_export_zip_checkbox.isChecked() else output_dir
+
+        self.batch_job = self.jobs.submit(f"دفعة {len(image_paths)} صفحة", self._perform_batch_task, self.on_batch_finished,
+                                          image_paths, output_dir, model_name,
+                                          self.batch_workers_spinbox.value(), self.kraken_path_entry.text(),
+                                          self.result_cache if self.use_cache_checkbox.isChecked() else None,
+                                          self.batch_thumbnails_checkbox.isChecked(), exports, export_target,
+                                          progress_slot=self.append_to_batch_log,
+                                          priority=JOB_PRIORITY_BACKGROUND, cancellable=True)
+
+    def _perform_batch_task(self, progress_callback, image_paths, output_dir, model_name, workers, kraken_dir, cache,
+                            thumbnails, exports, export_target, cancel_event=None):
+        return kraken_batch.run_batch(progress_callback, image_paths, output_dir, model_name, workers, kraken_dir, cache,
+                                      thumbnails, cancel_event, exports, export_target)
+
+    def stop_batch(self):
+        if self.batch_job is not None:
+            self.jobs.cancel(self.batch_job)
+            self.batch_status_label.setText("الحالة: جاري إيقاف الدفعة بعد الصفحات الجارية...")
+
+    def on_batch_finished(self, result):
+        self.set_batch_running(False)
+        self.batch_job = None
+        if result.get('cancelled'):
+            self.batch_status_label.setText("الحالة: تم إيقاف الدفعة.")
+            return
+        if not result['success']:
+            self.batch_log_textbox.append(f"\nفشلت معالجة الدفعة.\n{result['error']}")
+            self.batch_status_label.setText("الحالة: فشلت معالجة الدفعة.")
+            return
+
+        summary = result['result']
+        self.batch_status_label.setText(
+            f"الحالة: اكتملت {summary['total']} صفحة في {summary['elapsed']:.1f} ث "
+            f"({summary['pages_per_second']:.2f} صفحة/ث)، فشل منها {len(summary['failed'])}.")
+
+    def set_batch_running(self, running):
+        self.batch_start_button.setEnabled(not running)
+        self.batch_stop_button.setEnabled(running)
+
+    # ===================================================================================
+    # JOBS TAB WIDGETS AND LOGIC
+    # ===================================================================================
+    def create_jobs_tab_widgets(self):
+        layout = QVBoxLayout(self.jobs_tab)
+
+        controls_frame = QFrame()
+        controls_layout = QHBoxLayout(controls_frame)
+        controls_layout.addWidget(QLabel("الحد الأقصى للمهام المتزامنة:"))
+        self.jobs_max_workers_spinbox = QSpinBox()
+        self.jobs_max_workers_spinbox.setRange(1, 32)
+        self.jobs_max_workers_spinbox.setValue(self.jobs.max_workers)
+        self.jobs_max_workers_spinbox.valueChanged.connect(self.jobs.set_max_workers)
+        controls_layout.addWidget(self.jobs_max_workers_spinbox)
+        controls_layout.addStretch()
+        cancel_job_button = QPushButton("إلغاء المهمة المحددة")
+        cancel_job_button.clicked.connect(self.cancel_selected_job)
+        controls_layout.addWidget(cancel_job_button)
+        layout.addWidget(controls_frame)
+
+        self.jobs_table = QTableWidget(0, 5)
+        self.jobs_table.setHorizontalHeaderLabels(["#", "المهمة", "الأولوية", "الحالة", "المدة (ث)"])
+        self.jobs_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        self.jobs_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.jobs_table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.jobs_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        layout.addWidget(self.jobs_table)
+
+        self.jobs.jobs_changed.connect(self.refresh_jobs_table)
+        # تحديث مدة المهام الجارية كل ثانية
+        self.jobs_refresh_timer = QTimer(self)
+        self.jobs_refresh_timer.timeout.connect(self.refresh_jobs_table)
+        self.jobs_refresh_timer.start(1000)
+
+    def refresh_jobs_table(self):
+        jobs = list(reversed(self.jobs.jobs)) # الأحدث أولاً
+        self.jobs_table.setRowCount(len(jobs))
+        for row, job in enumerate(jobs):
+            values = [str(job.id), job.name, str(job.priority), JOB_STATE_LABELS[job.state], f"{job.elapsed():.1f}"]
+            for column, value in enumerate(values):
+                item = self.jobs_table.item(row, column)
+                if item is None:
+                    item = QTableWidgetItem()
+                    self.jobs_table.setItem(row, column, item)
+                item.setText(value)
+                item.setData(Qt.ItemDataRole.UserRole, job.id)
+
+    def cancel_selected_job(self):
+        selected = self.jobs_table.selectedItems()
+        if not selected:
+            return
+        job_id = selected[0].data(Qt.ItemDataRole.UserRole)
+        for job in self.jobs.jobs:
+            if job.id == job_id:
+                self.jobs.cancel(job)
+                break
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
@@ -0,0 +1,188 @@
+import sys
+import os
+import json
+import argparse
+import tempfile
+import threading
+
+from kraken_cache import default_cache_dir, file_hash
+from kraken_engine import KrakenEngine, kraken_app_dirs
+
+MODEL_EXTENSIONS = ('.mlmodel',)
+
+def default_registry_dir():
+    # ملفات .jsonl و .txt لا تعدها الذاكرة المؤقتة للنتائج (ملفات .json) ضمن مدخلاتها، فلا يحذفها مسحها
+    return os.path.join(default_cache_dir(), "models")
+
+def _write_atomic(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+# ===================================================================================
+# Model Registry
+# ===================================================================================
+class ModelRegistry:
+    """
+    فهرس نماذج التعرف (.mlmodel) في المجلدات المحددة ومجلدات بيانات kraken، مع بيانات كل نموذج:
+    الاسم، والمسار، والحجم، والبصمة، والكتابة (Arabic، Latin، ...) وحجم الأبجدية.
+    البيانات تُحفظ على القرص وتُعاد استخدامها ما دام حجم الملف ووقت تعديله كما هما، فلا يُعاد حساب
+    بصمة نموذج كبير ولا تحميله لمعرفة كتابته إلا عند تغيره.
+    """
+
+    def __init__(self, registry_dir=None):
+        self.registry_dir = registry_dir or default_registry_dir()
+        self.models_path = os.path.join(self.registry_dir, "registry.jsonl")
+        self.directories_path = os.path.join(self.registry_dir, "directories.txt")
+        self.lock = threading.Lock()
+        self.directories = []
+        self.models = {} # المسار المطلق -> بيانات النموذج
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.directories_path, 'r', encoding='utf-8') as f:
+                self.directories = [line.strip() for line in f if line.strip()]
+        except OSError:
+            pass
+        try:
+            with open(self.models_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self.models[entry['path']] = entry
+                    except (ValueError, KeyError):
+                        continue # سطر تالف لا يُبطل باقي الفهرس
+        except OSError:
+            pass
+
+    def save(self):
+        with self.lock:
+            models = sorted(self.models.values(), key=lambda entry: entry['path'])
+            directories = list(self.directories)
+        _write_atomic(self.models_path, "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in models))
+        _write_atomic(self.directories_path, "".join(directory + "\n" for directory in directories))
+
+    def add_directory(self, directory):
+        directory = os.path.abspath(directory)
+        with self.lock:
+            if directory not in self.directories:
+                self.directories.append(directory)
+        self.save()
+
+    def remove_directory(self, directory):
+        with self.lock:
+            self.directories = [entry for entry in self.directories if entry != os.path.abspath(directory)]
+        self.save()
+
+    def search_directories(self, kraken_dir=None):
+        """المجلدات المحددة، ثم مجلدات بيانات kraken (حيث يبحث 'kraken ocr --model')، ثم مجلد kraken نفسه."""
+        directories = list(self.directories) + list(kraken_app_dirs())
+        if kraken_dir:
+            directories.append(os.path.abspath(kraken_dir))
+        return [directory for index, directory in enumerate(directories)
+                if os.path.isdir(directory) and directory not in directories[:index]]
+
+    def scan(self, kraken_dir=None):
+        """يبحث عن النماذج (مع المجلدات الفرعية) ويحدّث الفهرس: يضيف الجديد، ويحذف المفقود، ويعيد قراءة المتغير."""
+        found = {}
+        for directory in self.search_directories(kraken_dir):
+            for root, _, names in os.walk(directory):
+                for name in names:
+                    if not name.lower().endswith(MODEL_EXTENSIONS):
+                        continue
+                    path = os.path.abspath(os.path.join(root, name))
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entry = self.models.get(path)
+                    if entry is None or entry['size'] != stat.st_size or entry['mtime_ns'] != stat.st_mtime_ns:
+                        entry = {'name': name, 'path': path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                                 'hash': file_hash(path), 'script': None, 'alphabet_size': None}
+                    found[path] = entry
+        with self.lock:
+            self.models = found
+        self._share_descriptions()
+        self.save()
+        return self.list()
+
+    def _share_descriptions(self):
+        # نسخ نفس النموذج في مجلدات مختلفة لها نفس البصمة، فتكفي قراءة كتابته مرة واحدة
+        with self.lock:
+            described = {entry['hash']: entry for entry in self.models.values() if entry.get('script') is not None}
+            for entry in self.models.values():
+                source = described.get(entry['hash'])
+                if entry.get('script') is None and source is not None:
+                    entry['script'], entry['alphabet_size'] = source['script'], source['alphabet_size']
+
+    def describe(self, engine, progress_callback=None):
+        """
+        يملأ الكتابة وحجم الأبجدية للنماذج التي لم تُقرأ بعد، بتحميل كل منها في المحرك مرة واحدة.
+        النموذج الذي يتعذر تحميله يُسجل بكتابة فارغة حتى لا يُعاد تحميله في كل بحث.
+        """
+        for entry in self.list():
+            if entry.get('script') is not None:
+                continue
+            try:
+                info = engine.describe_model(entry['path'])
+                entry['script'], entry['alphabet_size'] = info['script'] or "", info['alphabet_size']
+            except Exception as e:
+                entry['script'] = ""
+                if progress_callback is not None:
+                    progress_callback(f"تعذر قراءة النموذج {entry['name']}: {str(e).splitlines()[0] if str(e) else e}")
+            self._share_descriptions()
+        self.save()
+        return self.list()
+
+    def list(self):
+        with self.lock:
+            return sorted(self.models.values(), key=lambda entry: (entry['name'].lower(), entry['path']))
+
+    def find(self, model_name):
+        """بيانات النموذج بالمسار أو بالاسم (أول تطابق)، أو None."""
+        path = os.path.abspath(model_name)
+        with self.lock:
+            if path in self.models:
+                return self.models[path]
+        return next((entry for entry in self.list() if entry['name'] == model_name), None)
+
+def describe_entry(entry):
+    """وصف قصير للقائمة المنسدلة: 'arabic_best.mlmodel — Arabic — 15.2MB'."""
+    parts = [entry['name']]
+    if entry.get('script'):
+        parts.append(entry['script'])
+    parts.append(f"{entry['size'] / (1024 * 1024):.1f}MB")
+    return " — ".join(parts)
+
+# ===================================================================================
+# Headless Entry Point
+# ===================================================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="List recognition models found in the registry directories, one JSON object per line.")
+    parser.add_argument("--add-dir", action="append", default=[], help="Add a directory to scan (remembered for later runs).")
+    parser.add_argument("--remove-dir", action="append", default=[], help="Stop scanning a directory.")
+    parser.add_argument("--describe", action="store_true", help="Load new models in the kraken engine to record their script.")
+    parser.add_argument("--kraken-path", default="", help="Directory containing the kraken environment's python.")
+    args = parser.parse_args(argv)
+
+    registry = ModelRegistry()
+    for directory in args.add_dir:
+        registry.add_directory(directory)
+    for directory in args.remove_dir:
+        registry.remove_directory(directory)
+    models = registry.scan(args.kraken_path)
+    if args.describe and models:
+        engine = KrakenEngine(args.kraken_path)
+        try:
+            models = registry.describe(engine, lambda line: print(line, file=sys.stderr))
+        finally:
+            engine.close()
+    for entry in models:
+        print(json.dumps(entry, ensure_ascii=False))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+import itertools
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+# الطبقات بترتيب الرسم: (اللون، عرض الخط، مغلق؟)
+LAYER_STYLES = {
+    'regions': ((0, 160, 0), 2, True),
+    'boundaries': ((255, 140, 0), 1, True),
+    'baselines': ((220, 0, 0), 2, False),
+}
+LAYERS = tuple(LAYER_STYLES)
+DEFAULT_LAYERS = ('baselines',)
+HIGHLIGHT_STYLE = ((0, 0, 255), 3)
+
+# ===================================================================================
+# Packed Geometry
+# ===================================================================================
+def _pack(polygons):
+    """
+    يجمع كل المضلعات في مصفوفة نقاط واحدة (N×2) مع مصفوفة بدايات لكل مضلع،
+    فتُحوّل الإحداثيات كلها إلى مقياس العرض بعملية واحدة بدلاً من حلقة لكل سطر.
+    """
+    counts = np.fromiter((len(polygon) for polygon in polygons), dtype=np.int64, count=len(polygons))
+    offsets = np.zeros(len(polygons) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    flat = np.fromiter(itertools.chain.from_iterable(itertools.chain.from_iterable(polygons)),
+                       dtype=np.float32, count=int(offsets[-1]) * 2)
+    return flat.reshape(-1, 2), offsets
+
+def _region_polygons(regions):
+    """المناطق: قاموس نوع -> قائمة، وكل منطقة مضلع (kraken 4) أو قاموس فيه 'boundary' (kraken 5)."""
+    polygons = []
+    for items in (regions or {}).values():
+        for region in items:
+            boundary = region.get('boundary') if isinstance(region, dict) else region
+            if boundary and len(boundary) > 2:
+                polygons.append(boundary)
+    return polygons
+
+class OverlayGeometry:
+    """إحداثيات طبقات التجزئة (الخطوط الأساسية، حدود الأسطر، المناطق) بصيغة مضغوطة جاهزة للتحجيم."""
+
+    def __init__(self, segmentation):
+        lines = segmentation.get('lines', [])
+        baselines = [line.get('baseline') or [] for line in lines]
+        boundaries = [line.get('boundary') or [] for line in lines]
+        # يحتفظ كل سطر بموقعه حتى لو كان خطه أو حدوده ناقصة، فيبقى فهرس الإبراز صحيحًا
+        self.layers = {
+            'baselines': _pack(baselines),
+            'boundaries': _pack(boundaries),
+            'regions': _pack(_region_polygons(segmentation.get('regions'))),
+        }
+
+    def scaled(self, layer, factor):
+        """قائمة المضلعات بإحداثيات العرض، كل مضلع قائمة مسطحة [x0, y0, x1, y1, ...]."""
+        points, offsets = self.layers[layer]
+        flat = (points * factor).ravel().tolist()
+        return [flat[2 * start:2 * end] for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+# ===================================================================================
+# Renderer
+# ===================================================================================
+class OverlayRenderer:
+    """
+    يرسم طبقات التجزئة فوق صورة بحجم العرض مباشرة (لا على نسخة بالدقة الكاملة).
+    يعيد استخدام الصورة المصغرة ومخزن الرسم بين الاستدعاءات، فتحديث الإبراز أثناء التعرف المتدفق
+    لا يكلف إلا نسخ المخزن ورسم الخطوط. الهندسة تُحسب مرة لكل تجزئة حتى تُستدعى invalidate.
+    """
+
+    def __init__(self):
+        self.base_source = None
+        self.base = None
+        self.buffer = None
+        self.geometry_source = None
+        self.geometry = None
+
+    def invalidate(self):
+        """يُستدعى بعد تعديل التجزئة في مكانها (تحرير الخطوط الأساسية)."""
+        self.geometry_source = None
+        self.geometry = None
+
+    def _geometry(self, segmentation):
+        if self.geometry is None or self.geometry_source is not segmentation:
+            self.geometry = OverlayGeometry(segmentation)
+            self.geometry_source = segmentation
+        return self.geometry
+
+    def _base(self, image, size):
+        if self.base_source is not image or self.base.size != size:
+            self.base = image.convert('RGB')
+            if image.size != size:
+                self.base = self.base.resize(size, Image.Resampling.BILINEAR)
+            self.base_source = image
+        if self.buffer is None or self.buffer.size != size:
+            self.buffer = Image.new('RGB', size)
+        self.buffer.paste(self.base)
+        return self.buffer
+
+    def render(self, image, segmentation, original_width, size=None, layers=DEFAULT_LAYERS, highlight_index=None):
+        """
+        image: صورة الصفحة بأي دقة (عادة المعاينة المصغرة)، original_width: عرض الصورة الأصلية
+        التي تشير إليها إحداثيات التجزئة، size: حجم الإخراج (افتراضيًا حجم image).
+        يعيد صورة RGB يجب نسخها إن احتاجها المستدعي بعد الاستدعاء التالي.
+        """
+        size = size or image.size
+        canvas = self._base(image, size)
+        geometry = self._geometry(segmentation)
+        factor = size[0] / original_width
+        draw = ImageDraw.Draw(canvas)
+
+        for layer in LAYERS:
+            if layer not in layers:
+                continue
+            color, width, closed = LAYER_STYLES[layer]
+            for polygon in geometry.scaled(layer, factor):
+                if closed and len(polygon) >= 6:
+                    draw.polygon(polygon, outline=color, width=width)
+                elif not closed and len(polygon) >= 4:
+                    draw.line(polygon, fill=color, width=width)
+
+        if highlight_index is not None:
+            boundaries = geometry.layers['boundaries'][1]
+            if 0 <= highlight_index < len(boundaries) - 1:
+                start, end = int(boundaries[highlight_index]), int(boundaries[highlight_index + 1])
+                if end - start > 2:
+                    points = (geometry.layers['boundaries'][0][start:end] * factor).ravel().tolist()
+                    color, width = HIGHLIGHT_STYLE
+                    draw.polygon(points, outline=color, width=width)
+        return canvas
+
+def render_thumbnail(image_path, segmentation, output_path, max_size=(1024, 1024), layers=LAYERS, page=None,
+                     renderer=None):
+    """يحفظ صورة مصغرة للصفحة مع طبقات التجزئة (لمراجعة نتائج الدفعات بسرعة)."""
+    from kraken_preview import build_preview
+    preview = build_preview(image_path, max_size, page)
+    renderer = renderer or OverlayRenderer()
+    canvas = renderer.render(preview.proxy, segmentation, preview.original_size[0], layers=layers)
+    canvas.save(output_path)
+    renderer.invalidate() # كل صفحة لها تجزئة جديدة
+    return output_path
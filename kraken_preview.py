@@ -0,0 +1,137 @@
+import math
+
+from PIL import Image
+
+from kraken_trace import tracer
+from kraken_document import open_page, is_pdf, pdf_page_size, render_pdf_page
+
+PREVIEW_MAX_SIZE = (2048, 2048)
+BAND_ROWS = 1024 # عدد صفوف الصورة الأصلية التي تُفك في كل شريحة عند بناء المعاينة
+
+# عدد البتات لكل بكسل في أوضاع raw الشائعة، لحساب موضع أي صف داخل ملف TIFF غير مضغوط
+_RAW_BITS_PER_PIXEL = {
+    '1': 1, '1;I': 1, 'L': 8, 'L;I': 8, 'P': 8, 'LA': 16,
+    'I;16': 16, 'I;16B': 16, 'I;16L': 16,
+    'RGB': 24, 'BGR': 24, 'RGBA': 32, 'RGBX': 32, 'CMYK': 32,
+}
+
+# ===================================================================================
+# Region Decoding
+# ===================================================================================
+def _intersects(extents, box):
+    return extents[0] < box[2] and box[0] < extents[2] and extents[1] < box[3] and box[1] < extents[3]
+
+def _raw_tiles(im, box):
+    """
+    البلاطات أو الشرائط غير المضغوطة المتقاطعة مع box: [(الحدود، موضعها في الملف، rawmode، طول الصف بالبايت)]،
+    أو None إذا كان الملف لا يسمح بقراءة جزء منه (مثل PNG أو TIFF مضغوط يفكه libtiff كاملاً).
+    """
+    tiles = []
+    for codec, extents, offset, args in im.tile:
+        if codec != 'raw' or not isinstance(args, tuple) or len(args) < 3:
+            return None
+        rawmode, stride, orientation = args[0], args[1], args[2]
+        if orientation != 1 or rawmode not in _RAW_BITS_PER_PIXEL:
+            return None
+        if _intersects(extents, box):
+            stride = stride or ((extents[2] - extents[0]) * _RAW_BITS_PER_PIXEL[rawmode] + 7) // 8
+            tiles.append((tuple(extents), offset, rawmode, stride))
+    return tiles or None
+
+def can_decode_regions(image_path, page=None):
+    if is_pdf(image_path):
+        return True
+    with open_page(image_path, page) as im:
+        return _raw_tiles(im, (0, 0, 1, 1)) is not None
+
+def _read_region(image_path, im, box, tiles):
+    """
+    يبني المنطقة box من الصفوف المتقاطعة معها في كل بلاطة: الصفوف غير المضغوطة متتالية في الملف،
+    فيُقفز مباشرة إلى أول صف مطلوب ويُقرأ ما يلزم فقط.
+    """
+    region = Image.new(im.mode, (box[2] - box[0], box[3] - box[1]))
+    if im.mode == 'P':
+        region.putpalette(im.getpalette())
+    with open(image_path, 'rb') as f:
+        for (x0, y0, x1, y1), offset, rawmode, stride in tiles:
+            top, bottom = max(y0, box[1]), min(y1, box[3])
+            f.seek(offset + (top - y0) * stride)
+            rows = Image.frombytes(im.mode, (x1 - x0, bottom - top), f.read((bottom - top) * stride),
+                                   'raw', rawmode, stride)
+            region.paste(rows, (x0 - box[0], top - box[1]))
+    return region
+
+def decode_region(image_path, box, page=None):
+    """
+    يفك منطقة box = (x0, y0, x1, y1) بالدقة الكاملة، ويقرأ من الملف البلاطات المتقاطعة معها فقط عند الإمكان.
+    page يحدد إطار TIFF أو صفحة PDF في المستندات متعددة الصفحات.
+    """
+    if is_pdf(image_path):
+        return render_pdf_page(image_path, page, box=box)
+    with open_page(image_path, page) as im:
+        box = (max(0, box[0]), max(0, box[1]), min(im.width, box[2]), min(im.height, box[3]))
+        tiles = _raw_tiles(im, box)
+        if tiles is not None:
+            try:
+                return _read_region(image_path, im, box, tiles)
+            except (OSError, ValueError) as e:
+                # ملف مقطوع أو بيانات لا تطابق رأسه: الفك الكامل يستهلك ذاكرة الصفحة كلها، فيُسجل ذلك
+                tracer.record('preview.full_decode_fallback', image=image_path, page=page, error=str(e))
+        im.load()
+        return im.crop(box)
+
+# ===================================================================================
+# Display Proxy
+# ===================================================================================
+def _reduce(image, factor):
+    if image.mode not in ('L', 'LA', 'RGB', 'RGBA', 'RGBX', 'CMYK', 'I', 'F'):
+        image = image.convert('RGB' if image.mode == 'P' else 'L')
+    return image.reduce(factor) if factor > 1 else image
+
+class PagePreview:
+    """
+    نسخة مصغرة بدقة العرض من صفحة كبيرة تُبنى مرة واحدة، مع معامل التحويل من إحداثيات الصورة الأصلية.
+    لا تبقى الصورة الأصلية في الذاكرة؛ تُفك مناطقها بالدقة الكاملة عند التكبير فقط.
+    """
+
+    def __init__(self, image_path, original_size, proxy, page=None):
+        self.image_path = image_path
+        self.page = page
+        self.original_size = original_size
+        self.proxy = proxy
+        self.scale = proxy.width / original_size[0]
+
+    def region(self, box):
+        return decode_region(self.image_path, box, self.page)
+
+def build_preview(image_path, max_size=PREVIEW_MAX_SIZE, page=None):
+    if is_pdf(image_path):
+        # صفحة PDF تُرسم مباشرة بحجم العرض، لا بالدقة الكاملة ثم تصغيرها
+        return PagePreview(image_path, pdf_page_size(image_path, page),
+                           render_pdf_page(image_path, page, max_size=max_size), page)
+
+    with open_page(image_path, page) as im:
+        original_size = im.size
+        factor = max(1, math.ceil(max(im.width / max_size[0], im.height / max_size[1])))
+
+        if im.format == 'JPEG':
+            # فك JPEG مصغرًا مباشرة في مجال DCT (حتى 1/8) بدلاً من فك الدقة الكاملة
+            im.draft(None, (math.ceil(im.width / factor), math.ceil(im.height / factor)))
+            proxy = im.convert('RGB')
+        elif factor > 1 and _raw_tiles(im, (0, 0, 1, 1)) is not None:
+            proxy = None
+        else:
+            im.load()
+            proxy = _reduce(im, factor).convert('RGB')
+
+    if proxy is None:
+        # فك الصورة شريحة بعد شريحة وتصغير كل شريحة، فلا تتجاوز الذاكرة حجم شريحة واحدة
+        width, height = original_size
+        band_height = factor * max(1, BAND_ROWS // factor)
+        proxy = Image.new('RGB', (math.ceil(width / factor), math.ceil(height / factor)), 'white')
+        for top in range(0, height, band_height):
+            band = decode_region(image_path, (0, top, width, min(height, top + band_height)), page)
+            proxy.paste(_reduce(band, factor).convert('RGB'), (0, top // factor))
+
+    proxy.thumbnail(max_size, Image.Resampling.LANCZOS)
+    return PagePreview(image_path, original_size, proxy, page)
@@ -0,0 +1,94 @@
+import json
+import math
+
+# ===================================================================================
+# Line Identity
+# ===================================================================================
+def line_key(line):
+    """
+    هوية السطر الهندسية: خطه الأساسي وحدوده. السطر الذي لم يتغير شكله يحتفظ بنصه المتعرف عليه،
+    وأي تعديل على الخط الأساسي (أو حذف حدوده لإعادة حسابها) يجعله سطرًا جديدًا يحتاج إلى تعرف.
+    """
+    return json.dumps([line.get('baseline'), line.get('boundary')])
+
+def plan_incremental_recognition(lines, recognized_lines):
+    """
+    يقارن أسطر التجزئة الحالية بالأسطر المتعرف عليها سابقًا، ويعيد:
+    (فهارس الأسطر التي تحتاج إلى تعرف، {فهرس السطر: النص المعاد استخدامه}).
+    """
+    previous = {}
+    for line in recognized_lines:
+        previous.setdefault(line_key(line), []).append(line['text'])
+
+    changed, reused = [], {}
+    for index, line in enumerate(lines):
+        texts = previous.get(line_key(line))
+        if texts:
+            reused[index] = texts.pop(0)
+        else:
+            changed.append(index)
+    return changed, reused
+
+def merge_recognition(lines, reused, changed, recognized):
+    """
+    يدمج نتائج التعرف الجزئي (recognized بترتيب changed) مع النصوص المعاد استخدامها، بترتيب القراءة.
+    يُحدّث أيضًا حدود الأسطر التي حسبها المحرك للخطوط الأساسية المعدلة أو المضافة.
+    """
+    by_index = dict(zip(changed, recognized))
+    merged = []
+    for index, line in enumerate(lines):
+        if index in by_index:
+            result = by_index[index]
+            line['boundary'] = result.get('boundary') or line.get('boundary')
+            text = result['text']
+        else:
+            text = reused.get(index, "")
+        merged.append({'text': text, 'baseline': line.get('baseline'), 'boundary': line.get('boundary')})
+    return merged
+
+# ===================================================================================
+# Editing Helpers
+# ===================================================================================
+def _segment_distance(point, start, end):
+    (px, py), (ax, ay), (bx, by) = point, start, end
+    dx, dy = bx - ax, by - ay
+    length_squared = dx * dx + dy * dy
+    t = 0.0 if length_squared == 0 else max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / length_squared))
+    return math.hypot(px - (ax + t * dx), py - (ay + t * dy))
+
+def nearest_line(lines, point, max_distance):
+    """فهرس السطر الذي يمر خطه الأساسي على بعد max_distance من النقطة، أو None."""
+    best, best_distance = None, max_distance
+    for index, line in enumerate(lines):
+        baseline = line.get('baseline') or []
+        for start, end in zip(baseline, baseline[1:]):
+            distance = _segment_distance(point, start, end)
+            if distance <= best_distance:
+                best, best_distance = index, distance
+    return best
+
+def nearest_vertex(lines, point, max_distance):
+    """(فهرس السطر، فهرس النقطة) لأقرب نقطة من خط أساسي ضمن max_distance، أو None."""
+    best, best_distance = None, max_distance
+    for index, line in enumerate(lines):
+        for vertex_index, (x, y) in enumerate(line.get('baseline') or []):
+            distance = math.hypot(point[0] - x, point[1] - y)
+            if distance <= best_distance:
+                best, best_distance = (index, vertex_index), distance
+    return best
+
+def reading_order_index(lines, baseline, right_to_left=True):
+    """
+    موضع إدراج خط أساسي جديد بين الأسطر الحالية: من الأعلى إلى الأسفل حسب منتصف الخط،
+    ثم حسب اتجاه الكتابة للأسطر المتجاورة على نفس الارتفاع.
+    """
+    def position(points):
+        x = sum(point[0] for point in points) / len(points)
+        y = sum(point[1] for point in points) / len(points)
+        return y, -x if right_to_left else x
+
+    new_position = position(baseline)
+    for index, line in enumerate(lines):
+        if line.get('baseline') and position(line['baseline']) > new_position:
+            return index
+    return len(lines)
@@ -0,0 +1,267 @@
+import sys
+import os
+import json
+import asyncio
+import argparse
+import tempfile
+from urllib.parse import urlsplit, parse_qs
+from concurrent.futures import ThreadPoolExecutor
+
+from kraken_batch import EnginePool
+from kraken_cache import ResultCache, DEFAULT_CACHE_SIZE_BYTES
+from kraken_trace import tracer
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_MAX_BODY_BYTES = 256 * 1024 * 1024 # أكبر صورة مقبولة في طلب واحد
+EXPORT_CONTENT_TYPES = {
+    'alto': "application/xml; charset=utf-8",
+    'page': "application/xml; charset=utf-8",
+    'hocr': "text/html; charset=utf-8",
+}
+
+_STATUS_REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    411: "Length Required", 413: "Payload Too Large", 500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+class _HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+# ===================================================================================
+# OCR Service
+# ===================================================================================
+class OcrService:
+    """
+    خدمة HTTP محلية صغيرة فوق مجموعة محركات kraken مقيمة (النماذج تبقى محمّلة بين الطلبات).
+    max_concurrency: عدد الصفحات المعالجة في نفس الوقت (= عدد المحركات).
+    max_pending: عدد الطلبات المنتظرة المسموح به قبل الرد بـ 503 بدلاً من تكديس الطلبات في الذاكرة.
+
+    POST /ocr?model=<النموذج>&format=json|text|alto|page|hocr&page=<رقم>&name=<اسم الصورة في XML>
+                                                           جسم الطلب: ملف الصورة أو PDF/TIFF متعدد الصفحات
+    POST /segment?page=<رقم>                               جسم الطلب: ملف الصورة
+    GET  /health
+    """
+
+    def __init__(self, pool, default_model, max_concurrency, max_pending=64, max_body_bytes=DEFAULT_MAX_BODY_BYTES):
+        self.pool = pool
+        self.default_model = default_model
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.max_body_bytes = max_body_bytes
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self.semaphore = None # يُنشأ داخل حلقة asyncio في start
+        self.active = 0
+        self.pending = 0
+        self.server = None
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT, warm_up=True):
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        if warm_up:
+            await asyncio.get_running_loop().run_in_executor(self.executor, self.pool.warm_up, self.default_model)
+        self.server = await asyncio.start_server(self.handle_connection, host, port)
+        return self.server
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        self.executor.shutdown(wait=True)
+        self.pool.close()
+
+    # --- HTTP ---
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except _HttpError as e:
+                    await self._respond(writer, e.status, {'error': str(e)}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, path, query, headers, body = request
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                try:
+                    status, payload = await self._dispatch(method, path, query, body)
+                except _HttpError as e:
+                    status, payload = e.status, {'error': str(e)}
+                except Exception as e:
+                    status, payload = 500, {'error': str(e)}
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            return None # أغلق العميل الاتصال بين الطلبات
+        except asyncio.LimitOverrunError:
+            raise _HttpError(400, "Request header too large")
+
+        lines = head.decode('latin-1').split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise _HttpError(400, "Malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+
+        body = b""
+        if method == "POST":
+            if 'content-length' not in headers:
+                raise _HttpError(411, "Content-Length is required")
+            try:
+                length = int(headers['content-length'])
+            except ValueError:
+                raise _HttpError(400, "Invalid Content-Length")
+            if length > self.max_body_bytes:
+                raise _HttpError(413, f"Image larger than {self.max_body_bytes} bytes")
+            body = await reader.readexactly(length)
+
+        url = urlsplit(target)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        return method, url.path, query, headers, body
+
+    async def _respond(self, writer, status, payload, keep_alive):
+        if isinstance(payload, tuple):
+            body, content_type = payload[0].encode('utf-8'), payload[1]
+        elif isinstance(payload, str):
+            body, content_type = payload.encode('utf-8'), "text/plain; charset=utf-8"
+        else:
+            body, content_type = json.dumps(payload, ensure_ascii=False).encode('utf-8'), "application/json; charset=utf-8"
+        head = [f"HTTP/1.1 {status} {_STATUS_REASONS.get(status, '')}",
+                f"Content-Type: {content_type}",
+                f"Content-Length: {len(body)}",
+                f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        if status == 503:
+            head.append("Retry-After: 1")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + body)
+        await writer.drain()
+
+    # --- Routes ---
+    async def _dispatch(self, method, path, query, body):
+        if path == "/health":
+            if method != "GET":
+                raise _HttpError(405, "Use GET")
+            return 200, {'ok': True, 'engines': len(self.pool.engines), 'active': self.active,
+                         'pending': self.pending, 'default_model': self.default_model}
+        if path not in ("/ocr", "/segment"):
+            raise _HttpError(404, f"Unknown path: {path}")
+        if method != "POST":
+            raise _HttpError(405, "Use POST with the image file as the request body")
+        if not body:
+            raise _HttpError(400, "Empty request body")
+        page = None
+        if 'page' in query:
+            # رقم الصفحة يبدأ من 1 في الطلب ومن 0 في المحرك
+            if not query['page'].isdigit() or int(query['page']) < 1:
+                raise _HttpError(400, "page must be a positive integer")
+            page = int(query['page']) - 1
+
+        if path == "/segment":
+            segmentation = await self._run_with_engine(lambda engine, image_path: engine.segment(image_path, page), body)
+            return 200, segmentation
+
+        model_name = query.get('model', self.default_model)
+        format_name = query.get('format', 'json')
+        if format_name not in ('json', 'text') + tuple(EXPORT_CONTENT_TYPES):
+            raise _HttpError(400, f"Unknown format: {format_name} (use json, text, {', '.join(EXPORT_CONTENT_TYPES)})")
+        if format_name in EXPORT_CONTENT_TYPES:
+            from kraken_export import SERIALIZERS, page_record
+            # حجم الصفحة يُقرأ من الملف المؤقت قبل حذفه، واسمه لا يظهر في المخرجات
+            def recognize_page(engine, image_path):
+                result = engine.segment_and_recognize(image_path, model_name, page=page)
+                return page_record(image_path, page, result['segmentation'], result['lines'])
+
+            record = await self._run_with_engine(recognize_page, body)
+            record['image'] = query.get('name', "page")
+            return 200, (SERIALIZERS[format_name](record), EXPORT_CONTENT_TYPES[format_name])
+        result = await self._run_with_engine(
+            lambda engine, image_path: engine.segment_and_recognize(image_path, model_name, page=page), body)
+        text = "\n".join(line['text'] for line in result['lines'])
+        if format_name == 'text':
+            return 200, text
+        return 200, {'model': model_name, 'text': text, **result}
+
+    async def _run_with_engine(self, function, image_bytes):
+        if self.pending >= self.max_pending:
+            raise _HttpError(503, "Too many pending requests")
+        self.pending += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.pending -= 1
+
+        self.active += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, self._run_on_file,
+                                                                    function, image_bytes)
+        finally:
+            self.active -= 1
+            self.semaphore.release()
+
+    def _run_on_file(self, function, image_bytes):
+        # المحرك يقرأ الصورة من ملف، فتُكتب الصورة المرفوعة في ملف مؤقت يُحذف بعد المعالجة
+        fd, image_path = tempfile.mkstemp(prefix="kraken_service_")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(image_bytes)
+            with self.pool.engine() as engine:
+                return function(engine, image_path)
+        finally:
+            os.remove(image_path)
+
+# ===================================================================================
+# Entry Point
+# ===================================================================================
+async def serve(host, port, default_model, workers, kraken_dir="", cache=None, max_pending=64, warm_up=True):
+    service = OcrService(EnginePool(workers, kraken_dir, cache), default_model, workers, max_pending)
+    server = await service.start(host, port, warm_up)
+    print(f"Kraken OCR service listening on http://{host}:{port} ({workers} engines)", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
+
+def add_arguments(parser):
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Address to bind (default: localhost only).")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on.")
+    parser.add_argument("-m", "--model", default="arabic_best.mlmodel", help="Default recognition model (kept loaded).")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="Concurrent pages (resident engine processes).")
+    parser.add_argument("--max-pending", type=int, default=64, help="Queued requests allowed before answering 503.")
+    parser.add_argument("--kraken-path", default="", help="Directory containing the kraken environment's python.")
+    parser.add_argument("--cache-dir", default=None, help="Result cache directory (default: per-user cache directory).")
+    parser.add_argument("--cache-size-mb", type=int, default=DEFAULT_CACHE_SIZE_BYTES // (1024 * 1024), help="Result cache size cap in MB.")
+    parser.add_argument("--no-cache", action="store_true", help="Always re-run segmentation and recognition.")
+    parser.add_argument("--no-warm-up", action="store_true", help="Load models on the first request instead of at startup.")
+
+def run(args):
+    tracer.enable_from_environment()
+    cache = None if args.no_cache else ResultCache(args.cache_dir, args.cache_size_mb * 1024 * 1024)
+    try:
+        asyncio.run(serve(args.host, args.port, args.model, max(1, args.workers), args.kraken_path, cache,
+                          args.max_pending, not args.no_warm_up))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve Kraken segmentation + OCR over HTTP on localhost.")
+    add_arguments(parser)
+    return run(parser.parse_args(argv))
+
+if __name__ == "__main__":
+    sys.exit(main())
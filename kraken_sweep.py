@@ -0,0 +1,182 @@
+import sys
+import os
+import re
+import glob
+import random
+import argparse
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from kraken_engine import build_subprocess_env
+from kraken_training import compile_dataset, build_train_command, run_ketos, collect_training_pairs
+
+# معاملات البحث وكيف يُمرر كل منها إلى 'ketos train'
+SWEEP_PARAMETERS = ('epochs', 'lrate', 'batch_size', 'augment')
+
+_ACCURACY_PATTERNS = (
+    re.compile(r"val_accuracy[\s:=]+([0-9]*\.?[0-9]+)"),           # kraken 4/5 (lightning)
+    re.compile(r"Accuracy report \(\d+\)\s+([0-9]*\.?[0-9]+)"),    # kraken 2/3
+)
+
+# ===================================================================================
+# Search Space
+# ===================================================================================
+def grid_configs(space):
+    """كل التركيبات الممكنة من قيم المعاملات: space = {'epochs': [50, 100], 'lrate': [...], ...}."""
+    names = [name for name in SWEEP_PARAMETERS if space.get(name)]
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+def random_configs(space, count, seed=None):
+    """count تركيبة مختلفة مختارة عشوائيًا من الشبكة (أو كل الشبكة إن كانت أصغر)."""
+    configs = grid_configs(space)
+    if count >= len(configs):
+        return configs
+    return random.Random(seed).sample(configs, count)
+
+def config_arguments(config):
+    arguments = []
+    if 'lrate' in config:
+        arguments += ["-r", str(config['lrate'])]
+    if 'batch_size' in config:
+        arguments += ["-B", str(config['batch_size'])]
+    if 'augment' in config:
+        arguments.append("--augment" if config['augment'] else "--no-augment")
+    return arguments
+
+def describe_config(config):
+    return ", ".join(f"{name}={config[name]}" for name in SWEEP_PARAMETERS if name in config)
+
+def parse_accuracy(line):
+    """يستخرج دقة التحقق من سطر من مخرجات ketos، أو None."""
+    for pattern in _ACCURACY_PATTERNS:
+        match = pattern.search(line)
+        if match:
+            return float(match.group(1))
+    return None
+
+# ===================================================================================
+# Sweep Runner
+# ===================================================================================
+def _best_model_path(output_prefix):
+    """ketos يحفظ أفضل نموذج باسم <البادئة>_best.mlmodel، وإلا نأخذ آخر نموذج حقبة."""
+    best = f"{output_prefix}_best.mlmodel"
+    if os.path.exists(best):
+        return best
+    epoch_models = sorted(glob.glob(f"{glob.escape(output_prefix)}_*.mlmodel"), key=os.path.getmtime)
+    return epoch_models[-1] if epoch_models else None
+
+def run_sweep(progress_callback, training_pairs, configs, output_dir, default_epochs=50, parallel_runs=2,
+              threads_per_run=1, kraken_dir="", cancel_event=None, dataset_dir=None):
+    """
+    يدرّب نموذجًا لكل تركيبة معاملات بالتوازي ضمن ميزانية المعالج (parallel_runs × threads_per_run).
+    تُجمّع مجموعة البيانات مرة واحدة وتتشاركها كل التشغيلات، ولكل تشغيل ملف سجل خاص به في output_dir.
+    يرسل إلى progress_callback أحداثًا منظمة:
+    {'event': 'run_started' | 'run_output' | 'run_finished', 'run': رقم التشغيل, ...}
+    ويعيد قائمة النتائج مرتبة تنازليًا حسب أفضل دقة تحقق.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    dataset_path = compile_dataset(lambda line: progress_callback({'event': 'log', 'text': line}),
+                                   training_pairs, kraken_dir, dataset_dir, cancel_event)
+    if dataset_path is None:
+        return []
+
+    # تقييد خيوط torch لكل تشغيل حتى لا تتنافس التشغيلات المتوازية على كل الأنوية
+    env = build_subprocess_env(kraken_dir)
+    env["OMP_NUM_THREADS"] = env["MKL_NUM_THREADS"] = str(threads_per_run)
+
+    results = [{'run': index, 'config': config, 'state': 'queued', 'accuracy': None, 'model': None,
+                # مجلد لكل تشغيل حتى لا تتداخل نقاط الحفظ التي يكتبها ketos بجانب النموذج
+                'output_prefix': os.path.join(output_dir, f"run{index:02d}", "model"),
+                'log_path': os.path.join(output_dir, f"run{index:02d}.log")}
+               for index, config in enumerate(configs)]
+    results_lock = threading.Lock()
+
+    def train_one(result):
+        if cancel_event is not None and cancel_event.is_set():
+            result['state'] = 'cancelled'
+            return result
+        result['state'] = 'running'
+        os.makedirs(os.path.dirname(result['output_prefix']), exist_ok=True)
+        progress_callback({'event': 'run_started', 'run': result['run']})
+        config = result['config']
+        command = build_train_command(result['output_prefix'], config.get('epochs', default_epochs), dataset_path,
+                                      config_arguments(config))
+
+        with open(result['log_path'], 'w', encoding='utf-8') as log_file:
+            def on_output(line):
+                log_file.write(line)
+                accuracy = parse_accuracy(line)
+                if accuracy is not None:
+                    with results_lock:
+                        if result['accuracy'] is None or accuracy > result['accuracy']:
+                            result['accuracy'] = accuracy
+                progress_callback({'event': 'run_output', 'run': result['run'], 'text': line,
+                                   'accuracy': result['accuracy']})
+            try:
+                outcome = run_ketos(on_output, command, env, cancel_event)
+                result['state'] = 'cancelled' if outcome['cancelled'] else 'done'
+            except Exception as e:
+                log_file.write(f"\n{e}\n")
+                result['state'] = 'failed'
+
+        result['model'] = _best_model_path(result['output_prefix'])
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, parallel_runs)) as executor:
+        futures = [executor.submit(train_one, result) for result in results]
+        for future in as_completed(futures):
+            result = future.result()
+            progress_callback({'event': 'run_finished', 'run': result['run'], 'state': result['state'],
+                               'accuracy': result['accuracy'], 'model': result['model']})
+
+    return sorted(results, key=lambda result: -1.0 if result['accuracy'] is None else result['accuracy'],
+                  reverse=True)
+
+# ===================================================================================
+# Headless Entry Point
+# ===================================================================================
+def _parse_bool(value):
+    return value.lower() in ("1", "true", "yes", "on")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a hyperparameter sweep of 'ketos train' over line images with .gt.txt transcriptions.")
+    parser.add_argument("source", help="Glob of line images; each needs a <image>.gt.txt next to it.")
+    parser.add_argument("-o", "--output-dir", required=True, help="Directory for per-run models and logs.")
+    parser.add_argument("--epochs", type=int, nargs="+", default=[50], help="Epoch counts to try.")
+    parser.add_argument("--lrate", type=float, nargs="+", default=[], help="Learning rates to try.")
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[], help="Batch sizes to try.")
+    parser.add_argument("--augment", type=_parse_bool, nargs="+", default=[], help="Augmentation settings to try (on/off).")
+    parser.add_argument("--random", type=int, default=0, help="Sample this many configurations instead of the full grid.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for --random.")
+    parser.add_argument("-j", "--parallel-runs", type=int, default=2, help="Number of concurrent training runs.")
+    parser.add_argument("--threads-per-run", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="CPU threads per run.")
+    parser.add_argument("--kraken-path", default="", help="Directory containing the ketos executable.")
+    args = parser.parse_args(argv)
+
+    training_pairs = collect_training_pairs(args.source)
+    if not training_pairs:
+        print(f"No image/.gt.txt pairs found for: {args.source}", file=sys.stderr)
+        return 2
+
+    space = {'epochs': args.epochs, 'lrate': args.lrate, 'batch_size': args.batch_size, 'augment': args.augment}
+    configs = random_configs(space, args.random, args.seed) if args.random else grid_configs(space)
+
+    def report(event):
+        if event['event'] == 'log':
+            print(event['text'], end='', flush=True)
+        elif event['event'] == 'run_started':
+            print(f"[run {event['run']:02d}] started: {describe_config(configs[event['run']])}", flush=True)
+        elif event['event'] == 'run_finished':
+            print(f"[run {event['run']:02d}] {event['state']}, best val accuracy: {event['accuracy']}", flush=True)
+
+    results = run_sweep(report, training_pairs, configs, args.output_dir, args.epochs[0], args.parallel_runs,
+                        args.threads_per_run, args.kraken_path)
+    print("\nrank  run  val_acc  config")
+    for rank, result in enumerate(results, 1):
+        accuracy = "-" if result['accuracy'] is None else f"{result['accuracy']:.4f}"
+        print(f"{rank:>4}  {result['run']:>3}  {accuracy:>7}  {describe_config(result['config'])}  {result['model'] or ''}")
+    return 0 if any(result['state'] == 'done' for result in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+import sys
+import os
+import json
+import time
+import logging
+import cProfile
+import threading
+import contextlib
+from logging.handlers import RotatingFileHandler
+
+TRACE_ENV_VAR = "KRAKEN_GUI_TRACE" # مسار ملف التتبع لتفعيله في الأدوات بدون واجهة
+DEFAULT_TRACE_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_TRACE_BACKUPS = 5
+
+# ترتيب المراحل وأسماؤها في سطر الحالة
+BREAKDOWN_LABELS = (
+    ('startup', "تشغيل المحرك"),
+    ('model_load', "تحميل النموذج"),
+    ('decode', "فك الصورة"),
+    ('segment', "التجزئة"),
+    ('recognize', "التعرف"),
+    ('ipc', "النقل"),
+    ('compile_dataset', "تجميع البيانات"),
+    ('train', "التدريب"),
+    ('render', "العرض"),
+)
+
+def default_trace_dir():
+    from kraken_cache import default_cache_dir
+    return os.path.join(default_cache_dir(), "trace")
+
+# ===================================================================================
+# Resource Snapshots
+# ===================================================================================
+def _proc_io():
+    """البايتات المقروءة والمكتوبة من العملية (Linux فقط: /proc/self/io)."""
+    try:
+        with open("/proc/self/io", 'r') as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        return int(fields['rchar']), int(fields['wchar'])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+def resource_snapshot():
+    snapshot = {'cpu_seconds': time.process_time()}
+    snapshot['read_bytes'], snapshot['write_bytes'] = _proc_io()
+    try:
+        import resource
+        unit = 1 if sys.platform == "darwin" else 1024
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        snapshot['max_rss_bytes'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit
+        snapshot['children_cpu_seconds'] = children.ru_utime + children.ru_stime
+        snapshot['children_max_rss_bytes'] = children.ru_maxrss * unit
+    except ImportError:
+        pass
+    return snapshot
+
+def resource_delta(before, after):
+    """الفرق بين لقطتين؛ قيم الذروة (max_rss) تؤخذ كما هي من اللقطة الأخيرة."""
+    delta = {}
+    for key, value in after.items():
+        if value is None or before.get(key) is None:
+            continue
+        delta[key] = value if key.endswith("max_rss_bytes") else value - before[key]
+    return delta
+
+# ===================================================================================
+# Tracer
+# ===================================================================================
+class Tracer:
+    """
+    يسجل سجلًا منظمًا (dict) لكل مرحلة: الزمن، والمعالج، والذاكرة، والبايتات المقروءة/المكتوبة.
+    السجلات تُكتب في ملف JSONL دوّار عند التفعيل، وتُجمع أيضًا لأي مُجمِّع نشط في نفس الخيط
+    (collect) حتى تعرض الواجهة تفصيل أزمنة الصفحة الحالية.
+    """
+
+    def __init__(self):
+        self.logger = None
+        self.trace_path = None
+        self.profile_dir = None
+        self.local = threading.local()
+
+    def enable(self, trace_path=None, max_bytes=DEFAULT_TRACE_MAX_BYTES, backups=DEFAULT_TRACE_BACKUPS):
+        self.disable()
+        self.trace_path = trace_path or os.path.join(default_trace_dir(), "trace.jsonl")
+        os.makedirs(os.path.dirname(os.path.abspath(self.trace_path)), exist_ok=True)
+        handler = RotatingFileHandler(self.trace_path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self.logger = logging.getLogger(f"kraken_trace.{id(self)}")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self.logger.addHandler(handler)
+
+    def disable(self):
+        if self.logger is not None:
+            for handler in list(self.logger.handlers):
+                self.logger.removeHandler(handler)
+                handler.close()
+        self.logger = None
+
+    def enable_from_environment(self):
+        if os.environ.get(TRACE_ENV_VAR):
+            self.enable(os.environ[TRACE_ENV_VAR])
+
+    def set_profiling(self, profile_dir):
+        """عند تحديد مجلد تُحفظ نتيجة cProfile لكل مرحلة تُفتح بـ span(..., profile=True)."""
+        self.profile_dir = profile_dir
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+
+    def _collectors(self):
+        if not hasattr(self.local, 'collectors'):
+            self.local.collectors = []
+        return self.local.collectors
+
+    @contextlib.contextmanager
+    def collect(self, records=None):
+        """يجمع كل السجلات المسجلة في هذا الخيط داخل الكتلة في records (قائمة جديدة إن لم تُمرر)."""
+        records = [] if records is None else records
+        self._collectors().append(records)
+        try:
+            yield records
+        finally:
+            self._collectors().remove(records)
+
+    def record(self, stage, **fields):
+        entry = {'ts': time.time(), 'stage': stage, 'thread': threading.current_thread().name, **fields}
+        for records in self._collectors():
+            records.append(entry)
+        if self.logger is not None:
+            self.logger.info(json.dumps(entry, ensure_ascii=False, default=str))
+        return entry
+
+    @contextlib.contextmanager
+    def span(self, stage, breakdown_key=None, profile=False, **fields):
+        """
+        يقيس الكتلة ويسجلها: الزمن الفعلي، وزمن المعالج للخيط، وفروق موارد العملية.
+        breakdown_key يحدد خانة سطر الحالة التي يُحسب فيها الزمن. يمكن إضافة حقول إلى القاموس المُعاد.
+        """
+        extra = {}
+        profiler = None
+        if profile and self.profile_dir:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        before = resource_snapshot()
+        thread_cpu = time.thread_time()
+        start = time.perf_counter()
+        error = None
+        try:
+            yield extra
+        except BaseException as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+                extra['profile'] = os.path.join(self.profile_dir, f"{stage}_{time.strftime('%Y%m%d-%H%M%S')}_{os.getpid()}.prof")
+                profiler.dump_stats(extra['profile'])
+            breakdown = extra.pop('breakdown', {})
+            if breakdown_key:
+                breakdown[breakdown_key] = breakdown.get(breakdown_key, 0.0) + seconds
+            self.record(stage, seconds=seconds, thread_cpu_seconds=time.thread_time() - thread_cpu,
+                        resources=resource_delta(before, resource_snapshot()), breakdown=breakdown,
+                        error=error, **fields, **extra)
+
+tracer = Tracer()
+
+# ===================================================================================
+# Status Line
+# ===================================================================================
+def breakdown_totals(records):
+    totals = {}
+    for entry in records:
+        for key, seconds in (entry.get('breakdown') or {}).items():
+            totals[key] = totals.get(key, 0.0) + seconds
+    return totals
+
+def format_breakdown(records):
+    """ملخص قصير لسطر الحالة: 'تحميل النموذج 3.10ث · التجزئة 0.82ث · ... · قراءة 12.4MB'."""
+    totals = breakdown_totals(records)
+    parts = [f"{label} {totals[key]:.2f}ث" for key, label in BREAKDOWN_LABELS if totals.get(key, 0.0) >= 0.005]
+
+    read_bytes = sum((entry.get('resources') or {}).get('read_bytes', 0) for entry in records)
+    read_bytes += sum((entry.get('engine') or {}).get('read_bytes', 0) for entry in records)
+    if read_bytes >= 0.1 * 1024 * 1024:
+        parts.append(f"قراءة {read_bytes / (1024 * 1024):.1f}MB")
+    engine_rss = max(((entry.get('engine') or {}).get('max_rss_bytes', 0) for entry in records), default=0)
+    if engine_rss:
+        parts.append(f"ذاكرة المحرك {engine_rss / (1024 * 1024):.0f}MB")
+    return " · ".join(parts)
@@ -0,0 +1,274 @@
+import os
+import re
+import glob
+import shutil
+import signal
+import tempfile
+import threading
+import subprocess
+
+from kraken_engine import build_subprocess_env, installed_kraken_version
+from kraken_batch import IMAGE_EXTENSIONS
+from kraken_cache import default_cache_dir, file_hash, data_hash
+from kraken_trace import tracer
+
+DEFAULT_STOP_TIMEOUT = 30 # ثوانٍ ننتظرها بعد طلب الإيقاف قبل قتل ketos
+
+_EPOCH_MODEL_PATTERN = re.compile(r"_(\d+)\.mlmodel$")
+_CHECKPOINT_EPOCH_PATTERN = re.compile(r"(?:epoch=|checkpoint_)(\d+)")
+
+# ===================================================================================
+# Command Building
+# ===================================================================================
+def build_train_command(output_model_name, epochs, dataset_path, resume_args=()):
+    """يبني أمر 'ketos train' على مجموعة بيانات مُجمّعة (compile_dataset) مع وسائط الاستئناف إن وجدت."""
+    command = ["ketos", "train", "-o", output_model_name, "--epochs", str(epochs), "-f", "binary"]
+    command.extend(resume_args)
+    command.append(dataset_path)
+    return command
+
+def collect_training_pairs(source):
+    """أزواج {'image', 'gt'} من نمط glob لصور أسطر، لكل صورة ملف <الصورة>.gt.txt بجانبها."""
+    pairs = []
+    for path in sorted(glob.glob(source, recursive=True)):
+        gt_path = f"{os.path.splitext(path)[0]}.gt.txt"
+        if not path.endswith(".gt.txt") and os.path.isfile(path) and os.path.exists(gt_path):
+            pairs.append({'image': path, 'gt': gt_path})
+    return pairs
+
+def find_training_pairs(directory, extensions=IMAGE_EXTENSIONS):
+    """
+    أزواج {'image', 'gt'} من مجلد وكل مجلداته الفرعية: كل صورة بجانبها <الاسم>.gt.txt.
+    المطابقة تتم على أسماء الملفات من قراءة واحدة لكل مجلد، دون استدعاء stat لكل ملف.
+    """
+    pairs = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        names = set(files)
+        for name in sorted(files):
+            stem, extension = os.path.splitext(name)
+            if extension.lower() in extensions and f"{stem}.gt.txt" in names:
+                pairs.append({'image': os.path.join(root, name), 'gt': os.path.join(root, f"{stem}.gt.txt")})
+    return pairs
+
+# ===================================================================================
+# Compiled Datasets
+# ===================================================================================
+def default_dataset_dir():
+    return os.path.join(default_cache_dir(), "datasets")
+
+def dataset_key(training_pairs, kraken_version):
+    """بصمة محتوى الأزواج بترتيبها مع إصدار kraken (صيغة الملف المجمّع قد تتغير بين الإصدارات)."""
+    return data_hash({'pairs': [[file_hash(pair['image']), file_hash(pair['gt'])] for pair in training_pairs],
+                      'kraken': kraken_version})
+
+def _link_or_copy(source, destination):
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+def compile_dataset(progress_callback, training_pairs, kraken_dir="", dataset_dir=None, cancel_event=None):
+    """
+    يجمّع أزواج {'image', 'gt'} في ملف بيانات ثنائي واحد عبر 'ketos compile' ويعيد مساره.
+    تُفك الصور وتُطبّع مرة واحدة فقط: الملف يُحفظ باسم بصمة المحتوى ويُعاد استخدامه ما دامت الأزواج لم تتغير.
+    يعيد None إذا أُلغي التجميع.
+    """
+    dataset_dir = dataset_dir or default_dataset_dir()
+    os.makedirs(dataset_dir, exist_ok=True)
+    progress_callback(f"Hashing {len(training_pairs)} training pairs...\n")
+    key = dataset_key(training_pairs, installed_kraken_version(kraken_dir))
+    dataset_path = os.path.join(dataset_dir, f"{key}.arrow")
+    if os.path.exists(dataset_path):
+        progress_callback(f"Reusing compiled dataset: {dataset_path}\n")
+        return dataset_path
+
+    with tempfile.TemporaryDirectory(dir=dataset_dir) as staging_dir:
+        # 'ketos compile -f path' يتوقع النص بجانب الصورة باسم <الصورة>.gt.txt، فنرتب الأزواج بهذه الأسماء
+        manifest_path = os.path.join(staging_dir, "manifest.txt")
+        with open(manifest_path, 'w', encoding='utf-8') as manifest:
+            for index, pair in enumerate(training_pairs):
+                image_name = f"{index:07d}{os.path.splitext(pair['image'])[1].lower()}"
+                _link_or_copy(pair['image'], os.path.join(staging_dir, image_name))
+                _link_or_copy(pair['gt'], os.path.join(staging_dir, f"{index:07d}.gt.txt"))
+                manifest.write(os.path.join(staging_dir, image_name) + "\n")
+
+        # قائمة الملفات تُمرر عبر ملف (-F) وليس سطر الأوامر، فلا يحد طول argv حجم المدونة
+        partial_path = os.path.join(staging_dir, "dataset.arrow")
+        command = ["ketos", "compile", "-o", partial_path, "-f", "path",
+                   "--workers", str(os.cpu_count() or 1), "-F", manifest_path]
+        result = run_ketos(progress_callback, command, build_subprocess_env(kraken_dir), cancel_event,
+                           failure_message="فشل تجميع مجموعة بيانات التدريب")
+        if result['cancelled']:
+            return None
+        os.replace(partial_path, dataset_path)
+
+    progress_callback(f"Compiled dataset: {dataset_path}\n\n")
+    return dataset_path
+
+# ===================================================================================
+# Checkpoint Detection
+# ===================================================================================
+def _output_prefixes(output_model_name):
+    """ketos يستخدم قيمة -o كبادئة لأسماء الملفات، فنبحث بالاسم كما هو وبدون الامتداد .mlmodel."""
+    prefixes = [output_model_name]
+    if output_model_name.endswith(".mlmodel"):
+        prefixes.append(output_model_name[:-len(".mlmodel")])
+    return prefixes
+
+def _checkpoint_runs(output_model_name):
+    """
+    نقاط الحفظ التي تخص هذا الاسم فقط، مجمعة حسب التشغيل: {مجلد التشغيل: [(الحقبة، وقت التعديل، المسار)]}.
+    - ملفات بجانب الإخراج مشتقة من البادئة نفسها (<الاسم>_5.ckpt، <الاسم>-epoch=5.ckpt)
+    - ملفات داخل مجلد يحمل اسم البادئة (ketos يستخدمه كمجلد للتشغيل)، كل مجلد فرعي تشغيل مستقل
+    ملفات .ckpt الأخرى في نفس المجلد (غالبًا مجلد العمل) قد تكون لنموذج أو تشغيل آخر فلا تُعتبر.
+    """
+    runs = {}
+    for prefix in _output_prefixes(output_model_name):
+        prefix_path = os.path.abspath(prefix)
+        derived = re.compile(rf"^{re.escape(os.path.basename(prefix_path))}[_-](?:epoch=|checkpoint_)?(\d+)")
+        for path in glob.glob(f"{glob.escape(prefix_path)}*.ckpt"):
+            match = derived.match(os.path.basename(path))
+            if match:
+                runs.setdefault(os.path.dirname(path), set()).add((int(match.group(1)), os.path.getmtime(path), path))
+        if os.path.isdir(prefix_path):
+            for path in glob.glob(os.path.join(glob.escape(prefix_path), "**", "*.ckpt"), recursive=True):
+                match = _CHECKPOINT_EPOCH_PATTERN.search(os.path.basename(path))
+                epoch = int(match.group(1)) if match else -1
+                runs.setdefault(os.path.dirname(path), set()).add((epoch, os.path.getmtime(path), path))
+    return {directory: sorted(checkpoints) for directory, checkpoints in runs.items()}
+
+def find_checkpoints(output_model_name):
+    """
+    يبحث عن نقاط الحفظ التي تركها تدريب سابق بنفس اسم الإخراج:
+    - 'checkpoint': آخر ملف .ckpt للتشغيل (حالة المدرب الكاملة، يُستأنف منه بـ --resume)،
+      أو None إذا وُجدت نقاط حفظ من أكثر من تشغيل (يختار المستخدم واحدة منها)
+    - 'epoch_model': آخر نموذج حقبة <الاسم>_<رقم>.mlmodel (يُحمّل بـ --load)
+    - 'runs': آخر نقطة حفظ لكل تشغيل، مرتبة من الأحدث
+    كل قيمة (رقم الحقبة، المسار) أو None.
+    """
+    epoch_models = []
+    for prefix in _output_prefixes(output_model_name):
+        for path in glob.glob(f"{glob.escape(prefix)}_*.mlmodel"):
+            match = _EPOCH_MODEL_PATTERN.search(path)
+            if match and os.path.basename(path[:match.start()]) == os.path.basename(prefix):
+                epoch_models.append((int(match.group(1)), path))
+
+    runs = sorted((checkpoints[-1] for checkpoints in _checkpoint_runs(output_model_name).values()),
+                  key=lambda checkpoint: checkpoint[1], reverse=True)
+    return {
+        'checkpoint': (runs[0][0], runs[0][2]) if len(runs) == 1 else None,
+        'epoch_model': max(epoch_models) if epoch_models else None,
+        'runs': [(epoch, path) for epoch, _, path in runs],
+    }
+
+def resume_plan(output_model_name, epochs, checkpoint_path=None):
+    """
+    يحدد كيف يُستأنف التدريب بأقل فقد: يعيد (وسائط ketos الإضافية، عدد الحقب المطلوب، وصف) أو None.
+    ملف .ckpt يحفظ رقم الحقبة وحالة المحسّن، فيبقى عدد الحقب الكلي كما هو ويكمل ketos من حيث توقف.
+    نموذج الحقبة يبدأ العد من الصفر، فنطلب الحقب المتبقية فقط.
+    checkpoint_path يحدد نقطة الحفظ صراحة؛ بدونه ترفض الدالة التخمين إذا وُجد أكثر من تشغيل.
+    """
+    found = find_checkpoints(output_model_name)
+    checkpoint = found['checkpoint']
+    if checkpoint_path is not None:
+        match = _CHECKPOINT_EPOCH_PATTERN.search(os.path.basename(checkpoint_path))
+        epoch = next((epoch for epoch, path in found['runs'] if os.path.abspath(path) == os.path.abspath(checkpoint_path)),
+                     int(match.group(1)) if match else -1)
+        checkpoint = (epoch, checkpoint_path)
+    elif len(found['runs']) > 1:
+        candidates = "\n".join(f"  {path}" for _, path in found['runs'])
+        raise Exception(f"توجد نقاط حفظ من أكثر من تشغيل للنموذج '{output_model_name}'، حدد نقطة الحفظ المطلوبة:\n{candidates}")
+
+    if checkpoint is not None:
+        epoch, path = checkpoint
+        if epoch + 1 >= epochs:
+            return None # التدريب السابق اكتمل ولا يبقى ما يُستأنف
+        return ["--resume", path], epochs, f"استئناف من نقطة الحفظ {os.path.basename(path)}"
+    if found['epoch_model'] is not None:
+        epoch, path = found['epoch_model']
+        remaining = epochs - (epoch + 1)
+        if remaining <= 0:
+            return None
+        return ["--load", path], remaining, f"متابعة من نموذج الحقبة {epoch + 1} ({remaining} حقبة متبقية)"
+    return None
+
+# ===================================================================================
+# Running ketos
+# ===================================================================================
+def _popen_group_kwargs():
+    # مجموعة عمليات مستقلة حتى يصل طلب الإيقاف إلى ketos وحده وليس إلى الواجهة
+    if os.name == 'nt':
+        return {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {'start_new_session': True}
+
+def stop_process(process, timeout=DEFAULT_STOP_TIMEOUT):
+    """
+    إيقاف لطيف ثم قسري: ketos يعامل المقاطعة (Ctrl+C) كطلب إنهاء فيحفظ نقطة الحفظ الحالية ويخرج.
+    إن لم يخرج خلال timeout ثانية تُقتل العملية.
+    """
+    if process.poll() is not None:
+        return
+    try:
+        if os.name == 'nt':
+            process.send_signal(signal.CTRL_BREAK_EVENT)
+        else:
+            os.killpg(process.pid, signal.SIGINT)
+    except OSError:
+        process.terminate()
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+def run_ketos(progress_callback, command, env=None, cancel_event=None, stop_timeout=DEFAULT_STOP_TIMEOUT,
+              failure_message="فشل التدريب"):
+    """
+    يشغل أمر ketos ويرسل مخرجاته سطرًا بسطر إلى progress_callback.
+    عند ضبط cancel_event يُوقف ketos (stop_process) ويعيد {'cancelled': True}.
+    """
+    progress_callback(f"Executing command: {' '.join(command)}\n\n")
+
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                               text=True, encoding='utf-8', errors='replace',
+                               env=env, bufsize=1, **_popen_group_kwargs())
+
+    watcher = None
+    if cancel_event is not None:
+        # قراءة المخرجات تحجب الخيط، فيراقب خيط منفصل طلب الإلغاء
+        def watch_cancel():
+            while process.poll() is None:
+                if cancel_event.wait(0.5):
+                    progress_callback("\nStopping ketos...\n")
+                    stop_process(process, stop_timeout)
+                    return
+        watcher = threading.Thread(target=watch_cancel, daemon=True)
+        watcher.start()
+
+    for line in iter(process.stdout.readline, ''):
+        progress_callback(line)
+
+    process.stdout.close()
+    return_code = process.wait()
+    if watcher is not None:
+        watcher.join()
+
+    if cancel_event is not None and cancel_event.is_set():
+        return {'cancelled': True, 'return_code': return_code}
+    if return_code != 0:
+        raise Exception(f"{failure_message}. كود الخطأ: {return_code}")
+    return {'cancelled': False, 'return_code': return_code}
+
+def run_training(progress_callback, training_pairs, output_model_name, epochs, resume_args=(), kraken_dir="",
+                 cancel_event=None, dataset_dir=None):
+    """يجمّع مجموعة البيانات (أو يعيد استخدام المحفوظة) ثم يشغل 'ketos train' عليها."""
+    with tracer.span('training.compile_dataset', breakdown_key='compile_dataset', pairs=len(training_pairs)):
+        dataset_path = compile_dataset(progress_callback, training_pairs, kraken_dir, dataset_dir, cancel_event)
+    if dataset_path is None:
+        return {'cancelled': True, 'return_code': None}
+    command = build_train_command(output_model_name, epochs, dataset_path, resume_args)
+    with tracer.span('training.ketos_train', breakdown_key='train', epochs=epochs, resumed=bool(resume_args)) as extra:
+        outcome = run_ketos(progress_callback, command, build_subprocess_env(kraken_dir), cancel_event)
+        extra['cancelled'] = outcome['cancelled']
+    return outcome
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# الوحدات مسطحة في جذر المستودع، فتُضاف إلى المسار لتُستورد في الاختبارات
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
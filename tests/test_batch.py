@@ -0,0 +1,32 @@
+import os
+
+import kraken_batch
+
+
+def fake_process_page(engine, image_path, output_dir, model_name, page=None, overlay_renderer=None, exporter=None):
+    text_path = os.path.join(output_dir, kraken_batch.page_stem(image_path, page) + ".txt")
+    with open(text_path, 'w', encoding='utf-8') as f:
+        f.write("نص")
+    return text_path
+
+
+def test_corrupt_file_fails_alone(tmp_path, monkeypatch):
+    from PIL import Image
+    source = tmp_path / "pages"
+    source.mkdir()
+    Image.new('L', (20, 10), 255).save(source / "a.png")
+    (source / "b.tif").write_bytes(b"not a tiff at all")
+    Image.new('L', (20, 10), 255).save(source / "c.png")
+    output = tmp_path / "out"
+    monkeypatch.setattr(kraken_batch, 'process_page', fake_process_page)
+
+    messages = []
+    summary = kraken_batch.run_batch(messages.append, kraken_batch.collect_images(str(source)), str(output),
+                                     "model.mlmodel", workers=2)
+
+    assert summary['total'] == 3
+    assert summary['done'] == 3
+    assert summary['failed'] == [str(source / "b.tif")]
+    assert sorted(os.listdir(output)) == ["a.txt", "c.txt"]
+    assert len(messages) == 3
+    assert any(message.startswith("[1/3] b.tif: فشل: ") for message in messages)
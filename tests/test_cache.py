@@ -0,0 +1,37 @@
+import os
+
+import kraken_cache
+from kraken_cache import ResultCache, file_hash
+
+
+def test_eviction_leaves_room_below_the_limit(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path), max_bytes=10 * 1000)
+    value = "x" * 990 # حوالي 1000 بايت لكل مدخل بعد الترميز
+    for index in range(10):
+        cache.put(f"{index:064x}", value)
+        os.utime(cache._entry_path(f"{index:064x}"), (index, index)) # ترتيب LRU ثابت
+    scans = []
+    entries = cache._entries
+    monkeypatch.setattr(cache, '_entries', lambda: scans.append(1) or entries())
+
+    cache.put(f"{10:064x}", value)
+    assert len(scans) == 1
+    assert cache.total_bytes <= cache.max_bytes * kraken_cache.CACHE_LOW_WATER_FRACTION
+    assert cache.get(f"{0:064x}") is None and cache.get(f"{10:064x}") == value
+
+    # الكتابة التالية تتسع تحت الحد دون فحص المجلد مرة أخرى
+    cache.put(f"{11:064x}", value)
+    assert len(scans) == 1
+
+
+def test_file_hash_memo_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(kraken_cache, 'FILE_HASH_MEMO_SIZE', 3)
+    monkeypatch.setattr(kraken_cache, '_file_hash_memo', kraken_cache.OrderedDict())
+    paths = []
+    for index in range(5):
+        path = tmp_path / f"upload_{index}.png"
+        path.write_bytes(bytes([index]))
+        paths.append(str(path))
+        file_hash(str(path))
+
+    assert [key[0] for key in kraken_cache._file_hash_memo] == [os.path.abspath(path) for path in paths[2:]]
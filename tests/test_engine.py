@@ -0,0 +1,101 @@
+import sys
+import types
+import time
+import threading
+import subprocess
+
+import pytest
+
+from kraken_engine import KrakenEngine, _EngineState
+
+# خادم مزيف: مكتبة أصلية تكتب إلى stdout قبل الرد، ثم تبقى العملية حية
+NOISY_SERVER = """
+import sys, time, json
+sys.stdin.readline()
+sys.stdout.write("OMP: Info #276: omp_set_nested routine deprecated\\n")
+sys.stdout.write(json.dumps({'ok': True, 'result': 'late'}) + "\\n")
+sys.stdout.flush()
+time.sleep(60)
+"""
+
+
+class NoisyEngine(KrakenEngine):
+    def start(self):
+        if self.process is not None and self.process.poll() is None:
+            return
+        self.process = subprocess.Popen([sys.executable, "-c", NOISY_SERVER], stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, bufsize=1)
+        self.stderr_thread = threading.Thread(target=self._drain_stderr, args=(self.process,), daemon=True)
+        self.stderr_thread.start()
+
+
+def test_unparsable_reply_resets_the_engine():
+    engine = NoisyEngine()
+    engine.start()
+    process = engine.process
+
+    with pytest.raises(Exception, match="توقف محرك Kraken"):
+        engine.request('segment', image_path="page.png")
+
+    assert engine.process is None
+    assert process.poll() is not None
+
+
+def test_edited_line_is_bounded_by_untouched_neighbours(monkeypatch):
+    calls = []
+
+    def calculate_polygonal_environment(im, baselines, suppl_obj=None, **kwargs):
+        calls.append((baselines, suppl_obj))
+        return [[(0, 0), (10, 0), (10, 5), (0, 5)] for _ in baselines]
+
+    segmentation_module = types.ModuleType('kraken.lib.segmentation')
+    segmentation_module.calculate_polygonal_environment = calculate_polygonal_environment
+    monkeypatch.setitem(sys.modules, 'kraken', types.ModuleType('kraken'))
+    monkeypatch.setitem(sys.modules, 'kraken.lib', types.ModuleType('kraken.lib'))
+    monkeypatch.setitem(sys.modules, 'kraken.lib.segmentation', segmentation_module)
+
+    above = {'baseline': [[0, 10], [100, 10]], 'boundary': [[0, 0], [100, 0], [100, 12], [0, 12]]}
+    edited = {'baseline': [[0, 30], [100, 32]]}
+    below = {'baseline': [[0, 50], [100, 50]], 'boundary': [[0, 40], [100, 40], [100, 52], [0, 52]]}
+    state = _EngineState(emit=lambda event: None)
+
+    result = state._with_boundaries(object(), {'lines': [above, edited, below]})
+
+    assert calls == [([edited['baseline']], [above['baseline'], below['baseline']])]
+    assert result['lines'][0] is above and result['lines'][2] is below
+    assert result['lines'][1]['boundary'] == [[0, 0], [10, 0], [10, 5], [0, 5]]
+
+
+def test_sharded_recognition_keeps_reading_order(monkeypatch):
+    class FakeRecognizer:
+        def __init__(self):
+            self.nn = object()
+            self.outputs = None
+
+    shared = FakeRecognizer()
+    used = []
+
+    def fake_rpred(net, im, segmentation):
+        used.append(net)
+        lines = segmentation['lines']
+        # المجموعات الأولى تنتهي آخرًا، فيظهر أي خلل في ترتيب الإعادة
+        time.sleep(0.02 * (40 - lines[0]['baseline'][0][1]) / 40)
+        for line in lines:
+            net.outputs = line['id']
+            time.sleep(0.001)
+            yield types.SimpleNamespace(prediction=net.outputs)
+
+    kraken_module = types.ModuleType('kraken')
+    kraken_module.rpred = types.SimpleNamespace(rpred=fake_rpred)
+    monkeypatch.setitem(sys.modules, 'kraken', kraken_module)
+
+    lines = [{'id': f"line_{index}", 'baseline': [[0, index], [10, index]], 'boundary': [[0, 0], [1, 1]]}
+             for index in range(40)]
+    state = _EngineState(emit=lambda event: None, line_workers=4)
+    monkeypatch.setattr(state, '_recognition_network', lambda model_name: shared)
+
+    result = state._recognize_image(None, "page.png", {'lines': lines}, "model.mlmodel")
+
+    assert [line['text'] for line in result] == [line['id'] for line in lines]
+    assert len(used) > 1 and shared not in used
+    assert all(net.nn is shared.nn for net in used)
@@ -0,0 +1,74 @@
+import os
+import json
+import tarfile
+import zipfile
+from xml.dom import minidom
+
+import pytest
+
+from kraken_export import SERIALIZERS, ExportWriter, read_records
+
+
+def record(text="سطر\x01 <أول> & \"ثاني\"", page=None, image="/scans/folio\x02.png"):
+    lines = [
+        {'text': text, 'baseline': [[10, 40], [190, 40]], 'boundary': [[10, 20], [190, 20], [190, 45], [10, 45]]},
+        {'text': "second line", 'baseline': [[10, 90], [190, 90]], 'boundary': [[10, 70], [190, 70], [190, 95], [10, 95]]},
+    ]
+    result = {'image': image, 'width': 200, 'height': 120,
+              'text': "\n".join(line['text'] for line in lines), 'segmentation': {'lines': lines}, 'lines': lines}
+    if page is not None:
+        result['page'] = page
+    return result
+
+
+def texts(document, tag, attribute=None):
+    nodes = document.getElementsByTagName(tag)
+    if attribute:
+        return [node.getAttribute(attribute) for node in nodes]
+    return ["".join(child.data for child in node.childNodes if child.nodeType == child.TEXT_NODE) for node in nodes]
+
+
+@pytest.mark.parametrize('format_name, tag, attribute', [
+    ('alto', 'String', 'CONTENT'),
+    ('page', 'Unicode', None),
+    ('hocr', 'span', None),
+])
+def test_serializers_parse_back_without_control_characters(format_name, tag, attribute):
+    document = minidom.parseString(SERIALIZERS[format_name](record()).encode('utf-8'))
+
+    assert texts(document, tag, attribute) == ["سطر <أول> & \"ثاني\"", "second line"]
+
+
+def test_jsonl_round_trip(tmp_path):
+    path = tmp_path / "results.jsonl"
+    path.write_text(SERIALIZERS['jsonl'](record(page=3)), encoding='utf-8')
+
+    assert list(read_records([str(path)])) == [json.loads(json.dumps(record(page=3)))]
+
+
+def read_members(target):
+    if target.endswith(".zip"):
+        with zipfile.ZipFile(target) as archive:
+            return {name: archive.read(name) for name in archive.namelist()}
+    if target.endswith(".tar.gz"):
+        with tarfile.open(target) as archive:
+            return {member.name: archive.extractfile(member).read() for member in archive.getmembers()}
+    return {name: open(os.path.join(target, name), 'rb').read() for name in os.listdir(target)}
+
+
+@pytest.mark.parametrize('target_name', ["export", "export.zip", "export.tar.gz"])
+def test_export_writer_targets(tmp_path, target_name):
+    target = str(tmp_path / target_name)
+    with ExportWriter(target, ('alto', 'page', 'hocr', 'jsonl'), flush_bytes=1) as writer:
+        writer.write(record(page=1, image="/scans/folio.png"))
+        writer.write(record(page=2, image="/scans/folio.png"))
+
+    members = read_members(target)
+    stems = ["folio_p0001", "folio_p0002"]
+    assert sorted(members) == sorted([stem + suffix for stem in stems for suffix in (".alto.xml", ".page.xml", ".hocr")]
+                                     + ["results.jsonl"])
+    for name, data in members.items():
+        if name == "results.jsonl":
+            assert [json.loads(line)['page'] for line in data.decode('utf-8').splitlines()] == [1, 2]
+        else:
+            minidom.parseString(data)
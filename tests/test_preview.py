@@ -0,0 +1,48 @@
+import os
+
+import pytest
+from PIL import Image, ImageDraw
+
+from kraken_trace import tracer
+from kraken_preview import decode_region, can_decode_regions
+
+BOX = (37, 1021, 613, 1795)
+
+
+def page(mode, seed=0):
+    im = Image.new('RGB', (640, 2400), 'white')
+    draw = ImageDraw.Draw(im)
+    for index in range(0, 2400, 40):
+        draw.line([(0, index), (640, index + seed * 7)], fill=(index % 256, 80, 200 - index % 200), width=9)
+    return im.convert(mode)
+
+
+@pytest.mark.parametrize('mode', ['1', 'L', 'P', 'RGB', 'RGBA'])
+def test_raw_strips_match_full_decode(tmp_path, mode):
+    path = str(tmp_path / f"{mode}.tif")
+    page(mode).save(path, tiffinfo={278: 64}) # 64 صفًا في كل شريط
+
+    assert can_decode_regions(path)
+    with Image.open(path) as im:
+        expected = im.crop(BOX)
+    assert decode_region(path, BOX).tobytes() == expected.tobytes()
+
+
+def test_region_of_a_later_tiff_page(tmp_path):
+    path = str(tmp_path / "document.tif")
+    pages = [page('L', seed) for seed in range(3)]
+    pages[0].save(path, save_all=True, append_images=pages[1:])
+
+    assert decode_region(path, BOX, page=2).tobytes() == pages[2].crop(BOX).tobytes()
+
+
+def test_truncated_file_falls_back_with_a_trace_event(tmp_path):
+    path = str(tmp_path / "truncated.tif")
+    page('L').save(path)
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) // 2)
+
+    with tracer.collect() as records:
+        with pytest.raises((OSError, ValueError)):
+            decode_region(path, (0, 2000, 640, 2100)) # الفك الكامل نفسه يفشل في ملف مقطوع
+    assert [record['stage'] for record in records] == ['preview.full_decode_fallback']
@@ -0,0 +1,73 @@
+import copy
+
+from kraken_segmentation import plan_incremental_recognition, merge_recognition
+
+
+def line(y, text=None):
+    result = {'baseline': [[10, y], [200, y]], 'boundary': [[10, y - 15], [200, y - 15], [200, y + 5], [10, y + 5]]}
+    if text is not None:
+        result['text'] = text
+    return result
+
+
+def page():
+    recognized = [line(40, "الأول"), line(80, "الثاني"), line(120, "الثالث")]
+    lines = [{key: value for key, value in recognized_line.items() if key != 'text'} for recognized_line in recognized]
+    return lines, recognized
+
+
+def test_unchanged_page_reuses_everything():
+    lines, recognized = page()
+
+    assert plan_incremental_recognition(lines, recognized) == ([], {0: "الأول", 1: "الثاني", 2: "الثالث"})
+
+
+def test_moved_vertex_is_recognized_again():
+    lines, recognized = page()
+    lines[1]['baseline'][1] = [200, 84]
+    del lines[1]['boundary'] # الواجهة تحذف الحدود لتُحسب من جديد
+
+    assert plan_incremental_recognition(lines, recognized) == ([1], {0: "الأول", 2: "الثالث"})
+
+
+def test_added_line_is_the_only_one_recognized():
+    lines, recognized = page()
+    lines.insert(2, {'baseline': [[10, 100], [200, 100]]})
+
+    assert plan_incremental_recognition(lines, recognized) == ([2], {0: "الأول", 1: "الثاني", 3: "الثالث"})
+
+
+def test_deleted_line_drops_its_text():
+    lines, recognized = page()
+    del lines[1]
+
+    assert plan_incremental_recognition(lines, recognized) == ([], {0: "الأول", 1: "الثالث"})
+
+
+def test_duplicate_geometry_keeps_each_text_once_in_order():
+    recognized = [line(40, "نسخة أولى"), line(40, "نسخة ثانية"), line(80, "آخر")]
+    lines = [line(40), line(40), line(40), line(80)]
+
+    assert plan_incremental_recognition(lines, recognized) == ([2], {0: "نسخة أولى", 1: "نسخة ثانية", 3: "آخر"})
+
+
+def test_merge_keeps_reading_order_and_updates_boundaries():
+    lines, recognized = page()
+    lines.insert(1, {'baseline': [[10, 60], [200, 60]]})
+    lines[3]['baseline'][0] = [12, 121]
+    del lines[3]['boundary']
+    changed, reused = plan_incremental_recognition(lines, recognized)
+    assert changed == [1, 3]
+    new_boundary = [[10, 50], [200, 50], [200, 62], [10, 62]]
+    edited_boundary = [[12, 105], [200, 105], [200, 125], [12, 125]]
+    original = copy.deepcopy(lines)
+
+    merged = merge_recognition(lines, reused, changed, [{'text': "مضاف", 'boundary': new_boundary},
+                                                        {'text': "معدل", 'boundary': edited_boundary}])
+
+    assert [entry['text'] for entry in merged] == ["الأول", "مضاف", "الثاني", "معدل"]
+    assert [entry['baseline'] for entry in merged] == [entry['baseline'] for entry in original]
+    assert merged[1]['boundary'] == new_boundary and merged[3]['boundary'] == edited_boundary
+    assert merged[0]['boundary'] == original[0]['boundary']
+    # الحدود المحسوبة تُحفظ في التجزئة نفسها حتى لا تُعاد في التعديل التالي
+    assert lines[1]['boundary'] == new_boundary and lines[3]['boundary'] == edited_boundary
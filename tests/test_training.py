@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+from kraken_training import find_checkpoints, resume_plan
+
+
+def touch(path, mtime=None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb'):
+        pass
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_checkpoint_resumes_with_the_full_epoch_count(tmp_path):
+    output = str(tmp_path / "arabic.mlmodel")
+    touch(str(tmp_path / "arabic_2.ckpt"), 100)
+    latest = touch(str(tmp_path / "arabic_4.ckpt"), 200)
+    touch(str(tmp_path / "other_9.ckpt"), 300) # نموذج آخر في نفس المجلد
+
+    assert resume_plan(output, 10) == (["--resume", latest], 10, "استئناف من نقطة الحفظ arabic_4.ckpt")
+
+
+def test_epoch_model_loads_with_the_remaining_epochs(tmp_path):
+    output = str(tmp_path / "arabic.mlmodel")
+    touch(str(tmp_path / "arabic_1.mlmodel"))
+    latest = touch(str(tmp_path / "arabic_3.mlmodel"))
+
+    args, epochs, _ = resume_plan(output, 10)
+    assert (args, epochs) == (["--load", latest], 6)
+
+
+def test_completed_run_has_nothing_to_resume(tmp_path):
+    output = str(tmp_path / "arabic.mlmodel")
+    touch(str(tmp_path / "arabic_9.ckpt"))
+    assert resume_plan(output, 10) is None
+
+    os.remove(str(tmp_path / "arabic_9.ckpt"))
+    touch(str(tmp_path / "arabic_9.mlmodel"))
+    assert resume_plan(output, 10) is None
+
+
+def test_several_runs_need_an_explicit_checkpoint(tmp_path):
+    output = str(tmp_path / "arabic")
+    first = touch(str(tmp_path / "arabic" / "run_a" / "epoch=2-step=100.ckpt"), 100)
+    second = touch(str(tmp_path / "arabic" / "run_b" / "epoch=5-step=250.ckpt"), 200)
+
+    found = find_checkpoints(output)
+    assert found['checkpoint'] is None
+    assert found['runs'] == [(5, second), (2, first)]
+    with pytest.raises(Exception, match="أكثر من تشغيل"):
+        resume_plan(output, 10)
+
+    assert resume_plan(output, 10, checkpoint_path=first)[:2] == (["--resume", first], 10)